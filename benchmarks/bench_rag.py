@@ -0,0 +1,279 @@
+"""
+Offline benchmarks for the RAG agent.
+
+Runs routing, hashing, registry I/O, upload listing, indexing and search against
+`FakeGenAIClient`, so no API key or network is needed. Results are printed as a
+table and written as JSON for regression tracking.
+
+Usage:
+    python -m benchmarks.bench_rag --output bench_results.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+_workdir = tempfile.mkdtemp(prefix="rag_bench_")
+os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+os.environ.setdefault("STORE_NAME", "bench-store")
+os.environ["REGISTRY_PATH"] = os.path.join(_workdir, "registry.db")
+os.environ["SPOOL_DIR"] = os.path.join(_workdir, "spool")
+os.environ["BLOB_DIR"] = os.path.join(_workdir, "blobs")
+os.environ.pop("ANSWER_CACHE_DIR", None)
+# Payloads are random bytes labelled application/pdf: skip preprocessing and near-duplicate
+# signatures, which would only time pypdf rejecting them
+os.environ["PREPROCESS_POLICY"] = ""
+os.environ["NEAR_DUP_POLICY"] = "off"
+
+from benchmarks.fake_genai import FakeGenAIClient, FakeLatencies  # noqa: E402
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--file-sizes-kb", type=int, nargs="+", default=[16, 1024, 8192])
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--request-latency", type=float, default=0.02)
+    parser.add_argument("--upload-latency", type=float, default=0.05)
+    parser.add_argument("--operation-duration", type=float, default=0.2)
+    parser.add_argument("--generate-latency", type=float, default=0.4)
+    parser.add_argument("--first-chunk-latency", type=float, default=0.15)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--answer-chars", type=int, default=600)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--only", nargs="*", help="run only benchmarks whose name starts with one of these")
+    return parser.parse_args(argv)
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.results = []
+
+    def enabled(self, name: str) -> bool:
+        return not self.args.only or any(name.startswith(prefix) for prefix in self.args.only)
+
+    async def measure(self, name: str, params: dict, fn, setup=None, iterations=None):
+        """Times `await fn(setup_value)`; `setup` runs outside the timed region"""
+        if not self.enabled(name):
+            return
+        iterations = iterations or self.args.iterations
+        samples = []
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for i in range(self.args.warmup + iterations):
+                value = await setup() if setup else None
+                started = time.perf_counter()
+                await fn(value)
+                elapsed = time.perf_counter() - started
+                if i >= self.args.warmup:
+                    samples.append(elapsed)
+        result = {"benchmark": name, "params": params, **_summary(samples)}
+        self.results.append(result)
+        print(f"{name:<32} {json.dumps(params):<44} p50={result['p50_ms']:9.3f}ms "
+              f"p95={result['p95_ms']:9.3f}ms mean={result['mean_ms']:9.3f}ms")
+
+
+async def run(args):
+    import rag_agent.tools as tools
+
+    fake = FakeGenAIClient(
+        latencies=FakeLatencies(
+            request=args.request_latency,
+            upload=args.upload_latency,
+            operation_duration=args.operation_duration,
+            generate=args.generate_latency,
+            first_chunk=args.first_chunk_latency,
+        ),
+        answer_chars=args.answer_chars,
+    )
+    tools.set_client(fake)
+
+    import rag_agent.tools.retrieval as retrieval
+    retrieval.UPLOAD_POLL_INTERVAL = args.poll_interval
+
+    from google.adk.agents import LlmAgent
+    from google.adk.agents.invocation_context import InvocationContext
+    from google.adk.artifacts import InMemoryArtifactService
+    from google.adk.events import Event
+    from google.adk.sessions import InMemorySessionService, Session
+    from google.adk.tools import ToolContext
+    from google.genai import types
+
+    from rag_agent.orchestrator import RAGOrchestrator
+    from rag_agent.tools.answer_cache import answer_cache
+    from rag_agent.tools.file_uploader_tools import (
+        generate_filename_from_content, index_uploaded_file, uploaded_file_list,
+    )
+    from rag_agent.tools.index_jobs import index_workers
+    from rag_agent.tools.registry import registry
+    from rag_agent.tools.search_file import search_documents
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    class StubAgent(LlmAgent):
+        """Sub-agent that answers immediately, so only orchestration is measured"""
+
+        async def _run_async_impl(self, ctx):
+            yield Event(invocation_id=ctx.invocation_id, author=self.name,
+                        content=types.Content(role="model", parts=[types.Part(text="ok")]))
+
+    orchestrator = RAGOrchestrator(
+        name="BenchOrchestrator",
+        file_manager=StubAgent(name="FileManager"),
+        search_assistant=StubAgent(name="SearchAgent"),
+    )
+    session_service = InMemorySessionService()
+    artifact_service = InMemoryArtifactService()
+
+    def make_context(events, state=None):
+        session = Session(id=f"s{time.perf_counter_ns()}", app_name="bench", user_id="u",
+                          events=list(events), state=dict(state or {}))
+        return InvocationContext(session_service=session_service, artifact_service=artifact_service,
+                                 invocation_id=f"i{time.perf_counter_ns()}", agent=orchestrator,
+                                 session=session)
+
+    def user_event(text=None, payload=None, mime_type="application/pdf"):
+        parts = []
+        if text:
+            parts.append(types.Part(text=text))
+        if payload is not None:
+            parts.append(types.Part(inline_data=types.Blob(data=payload, mime_type=mime_type)))
+        return Event(author="user", content=types.Content(role="user", parts=parts))
+
+    def payload(size_kb: int) -> bytes:
+        return os.urandom(size_kb * 1024)
+
+    bench = Bench(args)
+
+    # Hashing / naming
+    for size_kb in args.file_sizes_kb:
+        data = payload(size_kb)
+
+        async def hash_once(_, data=data):
+            generate_filename_from_content(data, "application/pdf")
+
+        await bench.measure("generate_filename_from_content", {"size_kb": size_kb}, hash_once)
+
+    # Routing
+    async def route(ctx):
+        async for _ in orchestrator._run_async_impl(ctx):
+            pass
+
+    async def question_ctx():
+        return make_context([user_event("Quais são as principais conclusões do relatório?")])
+
+    async def file_query_ctx():
+        return make_context([user_event("liste os arquivos que eu enviei")])
+
+    await bench.measure("orchestrator.route", {"kind": "question"}, route, question_ctx)
+    await bench.measure("orchestrator.route", {"kind": "file_query"}, route, file_query_ctx)
+    for size_kb in args.file_sizes_kb:
+        data = payload(size_kb)
+
+        async def upload_ctx(data=data):
+            return make_context([user_event("segue o arquivo", data)])
+
+        await bench.measure("orchestrator.route", {"kind": "upload", "size_kb": size_kb}, route, upload_ctx)
+
+    # Registry I/O and session scans, growing the corpus between runs
+    indexed = 0
+    for corpus_size in sorted(args.corpus_sizes):
+        while indexed < corpus_size:
+            registry.add_document(f"doc_{indexed:012x}.pdf", mime_type="application/pdf",
+                                  size_bytes=1024, store_name="fileSearchStores/bench")
+            indexed += 1
+
+        async def registry_lookup(_):
+            registry.is_indexed("doc_ffffffffffff.pdf")
+            registry.list_filenames()
+
+        await bench.measure("registry.lookup", {"corpus": corpus_size}, registry_lookup)
+
+        for size_kb in args.file_sizes_kb:
+            data = payload(size_kb)
+
+            async def list_ctx(data=data):
+                ctx = make_context([user_event("segue o arquivo", data)])
+                return ToolContext(ctx)
+
+            await bench.measure("uploaded_file_list", {"corpus": corpus_size, "size_kb": size_kb},
+                                uploaded_file_list, list_ctx)
+
+    # Indexing (unique payload per iteration so dedup never short-circuits)
+    for size_kb in args.file_sizes_kb:
+        async def index_ctx(size_kb=size_kb):
+            ctx = make_context([user_event("segue o arquivo", payload(size_kb))])
+            return ToolContext(ctx)
+
+        async def index_once(tool_context):
+            # From enqueueing until the job finishes (upload + polling by the workers)
+            result = await index_uploaded_file("upload.pdf", tool_context)
+            assert result["status"] == "queued", result
+            job = await index_workers.wait(result["job_id"])
+            assert job["status"] == "success", job
+
+        await bench.measure("index_uploaded_file", {"size_kb": size_kb, "corpus": indexed},
+                            index_once, index_ctx, iterations=max(3, args.iterations // 4))
+
+    # Search, cold (cache cleared) and warm
+    async def search_ctx():
+        return ToolContext(make_context([user_event("Quais são as principais conclusões?")]))
+
+    async def cold_search_ctx():
+        answer_cache.invalidate()
+        return await search_ctx()
+
+    async def search_once(tool_context):
+        result = await search_documents("Quais são as principais conclusões?", tool_context)
+        assert result["status"] == "success", result
+
+    await bench.measure("search_documents", {"cache": "cold", "corpus": indexed}, search_once, cold_search_ctx)
+    await bench.measure("search_documents", {"cache": "warm", "corpus": indexed}, search_once, search_ctx)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "latencies": asdict(fake.state.latencies),
+            "poll_interval": args.poll_interval,
+            "answer_chars": args.answer_chars,
+            "iterations": args.iterations,
+            "api_calls": fake.state.calls,
+        },
+        "results": bench.results,
+    }
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    report = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(report['results'])} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Local stand-in for `google.genai.Client`, used to benchmark the RAG tools offline.
+
+Only the calls made by `rag_agent.tools` are implemented (file search stores and
+their documents, operations and grounded `generate_content`), both sync and `aio`. Latencies,
+upload operation durations and response sizes are configurable.
+"""
+
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from google.genai import types
+
+
+@dataclass
+class FakeLatencies:
+    """Simulated latencies, in seconds"""
+    request: float = 0.02           # any metadata call (list/get/create/operations.get)
+    upload: float = 0.05            # upload_to_file_search_store request
+    operation_duration: float = 0.2  # time until an upload operation reports done
+    generate: float = 0.4           # full generate_content call
+    first_chunk: float = 0.15       # generate_content_stream time to first chunk
+
+
+@dataclass
+class FakeStore:
+    name: str
+    display_name: str
+    active_documents_count: int = 0
+
+
+@dataclass
+class FakeOperation:
+    name: str
+    done_at: float
+    document_name: Optional[str] = None
+    done: bool = False
+
+    @property
+    def response(self):
+        return types.UploadToFileSearchStoreResponse(document_name=self.document_name) if self.done else None
+
+
+@dataclass
+class FakeState:
+    latencies: FakeLatencies
+    answer_chars: int = 600
+    sources_per_answer: int = 3
+    stream_chunks: int = 8
+    stores: List[FakeStore] = field(default_factory=list)
+    documents: List[str] = field(default_factory=list)
+    operations: dict = field(default_factory=dict)
+    calls: dict = field(default_factory=dict)
+    _ids: itertools.count = field(default_factory=itertools.count)
+
+    def count(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def response(self, text: str) -> types.GenerateContentResponse:
+        titles = self.documents[-self.sources_per_answer:] or ["doc_000000000000.pdf"]
+        return types.GenerateContentResponse(candidates=[types.Candidate(
+            content=types.Content(role="model", parts=[types.Part(text=text)]),
+            grounding_metadata=types.GroundingMetadata(grounding_chunks=[
+                types.GroundingChunk(retrieved_context=types.GroundingChunkRetrievedContext(title=title))
+                for title in titles
+            ]),
+        )])
+
+    def answer_text(self) -> str:
+        sentence = "De acordo com o documento, a receita cresceu no trimestre. "
+        return (sentence * (self.answer_chars // len(sentence) + 1))[:self.answer_chars]
+
+
+def _read_upload(file) -> int:
+    if hasattr(file, "read"):
+        return len(file.read())
+    with open(file, "rb") as f:
+        return len(f.read())
+
+
+class _AsyncPager:
+    def __init__(self, items):
+        self._items = list(items)
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for item in self._items:
+            yield item
+
+
+class _AsyncDocuments:
+    def __init__(self, state: FakeState):
+        self._state = state
+
+    async def list(self, parent: str, **kwargs):
+        self._state.count("file_search_stores.documents.list")
+        await asyncio.sleep(self._state.latencies.request)
+        # Documents are not tracked per store: every store lists all of them
+        return _AsyncPager(types.Document(name=f"{parent}/documents/{title}", display_name=title)
+                           for title in self._state.documents)
+
+    async def delete(self, name: str, **kwargs):
+        self._state.count("file_search_stores.documents.delete")
+        await asyncio.sleep(self._state.latencies.request)
+        self._state.documents.remove(name.rsplit("/", 1)[-1])
+
+
+class _AsyncFileSearchStores:
+    def __init__(self, state: FakeState):
+        self._state = state
+        self.documents = _AsyncDocuments(state)
+
+    async def list(self, **kwargs):
+        self._state.count("file_search_stores.list")
+        await asyncio.sleep(self._state.latencies.request)
+        return _AsyncPager(self._state.stores)
+
+    async def get(self, name: str, **kwargs):
+        self._state.count("file_search_stores.get")
+        await asyncio.sleep(self._state.latencies.request)
+        for store in self._state.stores:
+            if store.name == name:
+                return store
+        raise ValueError(f"404 NOT_FOUND: {name}")
+
+    async def create(self, config=None, **kwargs):
+        self._state.count("file_search_stores.create")
+        await asyncio.sleep(self._state.latencies.request)
+        store = FakeStore(name=f"fileSearchStores/fake-{self._state.next_id()}",
+                          display_name=(config or {}).get("display_name"))
+        self._state.stores.append(store)
+        return store
+
+    async def upload_to_file_search_store(self, file_search_store_name: str, file, config=None, **kwargs):
+        self._state.count("file_search_stores.upload_to_file_search_store")
+        _read_upload(file)
+        await asyncio.sleep(self._state.latencies.upload)
+        title = (config or {}).get("display_name") or f"doc_{self._state.next_id()}"
+        self._state.documents.append(title)
+        operation = FakeOperation(name=f"operations/fake-{self._state.next_id()}",
+                                  done_at=time.monotonic() + self._state.latencies.operation_duration,
+                                  document_name=f"{file_search_store_name}/documents/{title}")
+        self._state.operations[operation.name] = operation
+        return operation
+
+
+class _AsyncOperations:
+    def __init__(self, state: FakeState):
+        self._state = state
+
+    async def get(self, operation, **kwargs):
+        self._state.count("operations.get")
+        await asyncio.sleep(self._state.latencies.request)
+        # Looked up by name, so operations rebuilt from a saved name (resumed jobs) also work
+        saved = self._state.operations[operation.name]
+        return FakeOperation(name=operation.name, done_at=saved.done_at, document_name=saved.document_name,
+                             done=time.monotonic() >= saved.done_at)
+
+
+class _AsyncModels:
+    def __init__(self, state: FakeState):
+        self._state = state
+
+    async def generate_content(self, model: str, contents, config=None, **kwargs):
+        self._state.count("models.generate_content")
+        await asyncio.sleep(self._state.latencies.generate)
+        return self._state.response(self._state.answer_text())
+
+    async def generate_content_stream(self, model: str, contents, config=None, **kwargs):
+        self._state.count("models.generate_content_stream")
+        state = self._state
+        text = state.answer_text()
+        size = max(1, len(text) // state.stream_chunks)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        rest = max(0.0, state.latencies.generate - state.latencies.first_chunk) / max(1, len(pieces) - 1)
+
+        async def chunks():
+            await asyncio.sleep(state.latencies.first_chunk)
+            for idx, piece in enumerate(pieces):
+                if idx:
+                    await asyncio.sleep(rest)
+                if idx == len(pieces) - 1:
+                    yield state.response(piece)
+                else:
+                    yield types.GenerateContentResponse(candidates=[types.Candidate(
+                        content=types.Content(role="model", parts=[types.Part(text=piece)]))])
+
+        return chunks()
+
+
+class _Aio:
+    def __init__(self, state: FakeState):
+        self.file_search_stores = _AsyncFileSearchStores(state)
+        self.operations = _AsyncOperations(state)
+        self.models = _AsyncModels(state)
+
+
+class _SyncFileSearchStores:
+    def __init__(self, state: FakeState):
+        self._state = state
+
+    def list(self, **kwargs):
+        self._state.count("file_search_stores.list")
+        time.sleep(self._state.latencies.request)
+        return list(self._state.stores)
+
+    def create(self, config=None, **kwargs):
+        return asyncio.run(_AsyncFileSearchStores(self._state).create(config=config))
+
+
+class _SyncModels:
+    def __init__(self, state: FakeState):
+        self._state = state
+
+    def generate_content(self, model: str, contents, config=None, **kwargs):
+        self._state.count("models.generate_content")
+        time.sleep(self._state.latencies.generate)
+        return self._state.response(self._state.answer_text())
+
+
+class FakeGenAIClient:
+    """Drop-in for `genai.Client`, install with `rag_agent.tools.set_client(FakeGenAIClient(...))`"""
+
+    def __init__(self, latencies: FakeLatencies = None, answer_chars: int = 600,
+                 sources_per_answer: int = 3, stream_chunks: int = 8):
+        self.state = FakeState(
+            latencies=latencies or FakeLatencies(),
+            answer_chars=answer_chars,
+            sources_per_answer=sources_per_answer,
+            stream_chunks=stream_chunks,
+        )
+        self.aio = _Aio(self.state)
+        self.file_search_stores = _SyncFileSearchStores(self.state)
+        self.models = _SyncModels(self.state)
@@ -0,0 +1,351 @@
+"""
+Multi-session load test for the RAG agent.
+
+Drives the real `app` from `rag_agent/agent.py` (orchestrator, sub-agents, tools and
+plugins) through an ADK `Runner` with in-memory session and artifact services. The
+sub-agents' LLM is replaced by `StubLlm`, which plays the tool-calling flow each agent's
+instruction asks for, and the GenAI client by `FakeGenAIClient`. Both have configurable
+latencies, so no API key or network is needed.
+
+Requests arrive open-loop at `--rate` per second for `--duration` seconds and are spread
+over `--sessions` sessions. Latency is measured from the scheduled arrival, so queueing
+shows up in the numbers. A monitor task measures event-loop lag: how late a 10ms sleep
+wakes up. Sustained lag points at blocking calls on the loop.
+
+Usage:
+    python -m benchmarks.load_test --rate 50 --duration 30 --sessions 200 --output load_results.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from typing import AsyncGenerator, Dict, List
+
+_workdir = tempfile.mkdtemp(prefix="rag_load_")
+os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+os.environ.setdefault("STORE_NAME", "load-store")
+os.environ["REGISTRY_PATH"] = os.path.join(_workdir, "registry.db")
+os.environ["SPOOL_DIR"] = os.path.join(_workdir, "spool")
+os.environ["BLOB_DIR"] = os.path.join(_workdir, "blobs")
+os.environ.pop("ANSWER_CACHE_DIR", None)
+# Payloads are random bytes labelled application/pdf: skip preprocessing and near-duplicate
+# signatures, which would only time pypdf rejecting them
+os.environ["PREPROCESS_POLICY"] = ""
+os.environ["NEAR_DUP_POLICY"] = "off"
+
+from google.adk.models.base_llm import BaseLlm  # noqa: E402
+from google.adk.models.llm_request import LlmRequest  # noqa: E402
+from google.adk.models.llm_response import LlmResponse  # noqa: E402
+from google.genai import types  # noqa: E402
+
+from benchmarks.fake_genai import FakeGenAIClient, FakeLatencies  # noqa: E402
+
+QUESTIONS = [
+    "Quais são as principais conclusões do relatório?",
+    "Qual foi a receita no último trimestre?",
+    "Quem assinou o contrato?",
+    "Como o custo operacional evoluiu?",
+    "Explique a metodologia usada na pesquisa",
+    "What are the main risks mentioned?",
+]
+FILE_QUERIES = [
+    "liste os arquivos que eu enviei",
+    "quais arquivos já foram indexados?",
+    "list my documents",
+]
+
+
+class StubLlm(BaseLlm):
+    """
+    Scripted stand-in for the sub-agents' model.
+
+    The SearchAgent calls `search_documents` with the user's question (reworded for a
+    `rewrite_rate` fraction of calls, which misses the speculative search) and then answers.
+    The FileManager calls `uploaded_file_list`, then `index_pending_files` if anything is
+    pending, and then answers. Each model turn sleeps `latency` seconds.
+    """
+
+    model: str = "stub-llm"
+    latency: float = 0.3
+    rewrite_rate: float = 0.0
+
+    async def generate_content_async(self, llm_request: LlmRequest,
+                                     stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(self.latency)
+        tools = llm_request.tools_dict or {}
+        last = llm_request.contents[-1] if llm_request.contents else None
+        responses = [p.function_response for p in (last.parts or []) if p.function_response] if last else []
+
+        if not responses:
+            if "search_documents" in tools:
+                query = self._user_text(llm_request)
+                if random.random() < self.rewrite_rate:
+                    query = f"trechos dos documentos que tratam de: {query}"
+                call = types.FunctionCall(name="search_documents", args={"query": query})
+            else:
+                call = types.FunctionCall(name="uploaded_file_list", args={})
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+            return
+
+        response = responses[-1]
+        result = response.response or {}
+        if response.name == "uploaded_file_list" and result.get("not_indexed") and "index_pending_files" in tools:
+            call = types.FunctionCall(name="index_pending_files", args={})
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+            return
+
+        text = result.get("answer") or result.get("message") or "ok"
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+    @staticmethod
+    def _user_text(llm_request: LlmRequest) -> str:
+        for content in reversed(llm_request.contents):
+            if content.role == "user":
+                for part in content.parts or []:
+                    if part.text:
+                        return part.text
+        return ""
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=20, help="requests per second (open loop)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of arrivals")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--mix", default="question=0.8,upload=0.1,file_query=0.1",
+                        help="request kinds and weights")
+    parser.add_argument("--distinct-questions", type=int, default=len(QUESTIONS),
+                        help="distinct questions in the mix; 0 makes every question unique (no cache hits)")
+    parser.add_argument("--upload-kb", type=int, default=64)
+    parser.add_argument("--corpus", type=int, default=5, help="documents indexed before the arrivals start")
+    parser.add_argument("--search-mode", choices=["agent", "direct"], default="agent")
+    parser.add_argument("--stream", action="store_true", help="direct search with streaming")
+    parser.add_argument("--model-latency", type=float, default=0.3, help="stub LLM latency per turn")
+    parser.add_argument("--rewrite-rate", type=float, default=0.0,
+                        help="fraction of searches where the stub model rewords the question")
+    parser.add_argument("--speculation", action="store_true",
+                        help="enable speculative retrieval in the orchestrator (off by default, as in production)")
+    parser.add_argument("--request-latency", type=float, default=0.02)
+    parser.add_argument("--upload-latency", type=float, default=0.05)
+    parser.add_argument("--operation-duration", type=float, default=0.2)
+    parser.add_argument("--generate-latency", type=float, default=0.4)
+    parser.add_argument("--first-chunk-latency", type=float, default=0.15)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="load_results.json")
+    return parser.parse_args(argv)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return {"n": len(samples), "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99),
+            "max_ms": ordered[-1] * 1000}
+
+
+def _parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for item in mix.split(","):
+        kind, _, weight = item.partition("=")
+        if kind.strip() not in ("question", "upload", "file_query"):
+            raise SystemExit(f"Unknown request kind in --mix: {kind}")
+        weights[kind.strip()] = float(weight or 1)
+    return weights
+
+
+async def _monitor_loop_lag(samples: List[float], stop: asyncio.Event, interval: float = 0.01):
+    """Records how late each `interval` sleep wakes up"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - started - interval))
+
+
+async def run(args):
+    os.environ["SEARCH_MODE"] = args.search_mode
+    os.environ["STREAM_SEARCH"] = "true" if args.stream else "false"
+    os.environ["SPECULATIVE_SEARCH"] = "true" if args.speculation else "false"
+
+    import rag_agent.tools as tools
+
+    fake = FakeGenAIClient(
+        latencies=FakeLatencies(
+            request=args.request_latency,
+            upload=args.upload_latency,
+            operation_duration=args.operation_duration,
+            generate=args.generate_latency,
+            first_chunk=args.first_chunk_latency,
+        ),
+    )
+    tools.set_client(fake)
+
+    import rag_agent.tools.retrieval as retrieval
+    retrieval.UPLOAD_POLL_INTERVAL = args.poll_interval
+
+    from google.adk.artifacts import InMemoryArtifactService
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+
+    from rag_agent import agent
+    from rag_agent.tools import metrics
+    from rag_agent.tools.admission import admission
+    from rag_agent.tools.index_jobs import enqueue_document, index_workers
+    from rag_agent.tools.speculation import speculative_searches
+    from rag_agent.tools.upload_index import content_digest, filename_from_digest
+
+    logging.getLogger().setLevel(logging.WARNING)
+    # The stub model reports no token usage, which ADK's telemetry warns about on every call
+    logging.getLogger("google_adk").setLevel(logging.ERROR)
+
+    stub = StubLlm(latency=args.model_latency, rewrite_rate=args.rewrite_rate)
+    agent.file_manager.model = stub
+    agent.search_agent.model = stub
+
+    session_service = InMemorySessionService()
+    runner = Runner(app=agent.app, session_service=session_service, artifact_service=InMemoryArtifactService())
+    session_ids = []
+    for i in range(args.sessions):
+        session = await session_service.create_session(app_name=agent.app.name, user_id=f"user-{i}")
+        session_ids.append((session.user_id, session.id))
+    # Invocations of one session run one at a time, like a user waiting for the answer
+    session_locks = {session_id: asyncio.Lock() for _, session_id in session_ids}
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    weights = _parse_mix(args.mix)
+    kinds, kind_weights = list(weights), list(weights.values())
+    questions = QUESTIONS[:args.distinct_questions] if args.distinct_questions else None
+
+    def make_message(kind: str, n: int) -> types.Content:
+        if kind == "upload":
+            data = rng.randbytes(args.upload_kb * 1024)
+            parts = [types.Part(text="segue o arquivo"),
+                     types.Part(inline_data=types.Blob(data=data, mime_type="application/pdf"))]
+        elif kind == "file_query":
+            parts = [types.Part(text=rng.choice(FILE_QUERIES))]
+        elif questions:
+            parts = [types.Part(text=rng.choice(questions))]
+        else:
+            parts = [types.Part(text=f"{rng.choice(QUESTIONS)} (#{n})")]
+        return types.Content(role="user", parts=parts)
+
+    latencies: Dict[str, List[float]] = {kind: [] for kind in kinds}
+    first_event: Dict[str, List[float]] = {kind: [] for kind in kinds}
+    errors: Dict[str, int] = {}
+
+    async def one_request(n: int, kind: str, arrival: float):
+        user_id, session_id = session_ids[rng.randrange(len(session_ids))]
+        message = make_message(kind, n)
+        first = None
+        try:
+            async with session_locks[session_id]:
+                async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=message):
+                    if first is None and event.content:
+                        first = time.perf_counter() - arrival
+        except Exception as e:
+            key = f"{kind}:{type(e).__name__}"
+            errors[key] = errors.get(key, 0) + 1
+            return
+        latencies[kind].append(time.perf_counter() - arrival)
+        if first is not None:
+            first_event[kind].append(first)
+
+    # Without an indexed corpus every question would stop at "No file store configured"
+    corpus_rng = random.Random(args.seed + 1)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(args.corpus):
+            data = corpus_rng.randbytes(args.upload_kb * 1024)
+            filename = filename_from_digest(content_digest(data), "application/pdf")
+            job = await enqueue_document(filename, data, "application/pdf", f"corpus-{i}.pdf")
+            await index_workers.wait(job["job_id"])
+
+    lag_samples: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_monitor_loop_lag(lag_samples, stop))
+
+    total = int(args.rate * args.duration)
+    tasks = []
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for n in range(total):
+            arrival = started + n / args.rate
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind = rng.choices(kinds, kind_weights)[0]
+            tasks.append(asyncio.create_task(one_request(n, kind, arrival)))
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    completed = sum(len(samples) for samples in latencies.values())
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args),
+            "latencies": asdict(fake.state.latencies),
+            "api_calls": fake.state.calls,
+        },
+        "throughput_rps": completed / elapsed,
+        "offered_rps": args.rate,
+        "elapsed_s": elapsed,
+        "completed": completed,
+        "errors": errors,
+        "routes": {kind: {"latency": _percentiles(latencies[kind]), "first_event": _percentiles(first_event[kind])}
+                   for kind in kinds},
+        "event_loop_lag": _percentiles(lag_samples),
+        "admission": admission.stats(),
+        "speculation": speculative_searches.stats(),
+        "stages": metrics.stage_duration.snapshot(),
+        "events": metrics.events.snapshot(),
+    }
+    return report
+
+
+def _print_report(report):
+    print(f"throughput: {report['throughput_rps']:.1f} req/s (offered {report['offered_rps']:.1f}), "
+          f"completed {report['completed']} in {report['elapsed_s']:.1f}s, errors: {report['errors'] or 'none'}")
+    for kind, stats in report["routes"].items():
+        latency = stats["latency"]
+        if not latency["n"]:
+            continue
+        print(f"{kind:<12} n={latency['n']:<6} p50={latency['p50_ms']:9.1f}ms p95={latency['p95_ms']:9.1f}ms "
+              f"p99={latency['p99_ms']:9.1f}ms max={latency['max_ms']:9.1f}ms")
+    lag = report["event_loop_lag"]
+    if lag["n"]:
+        print(f"{'loop lag':<12} n={lag['n']:<6} p50={lag['p50_ms']:9.1f}ms p95={lag['p95_ms']:9.1f}ms "
+              f"p99={lag['p99_ms']:9.1f}ms max={lag['max_ms']:9.1f}ms")
+    speculation = report["speculation"]
+    if speculation["started"] or speculation["skipped"]:
+        print(f"speculation  started={speculation['started']} skipped={speculation['skipped']} "
+              f"hit_rate={speculation['hit_rate']:.2f} waste_rate={speculation['waste_rate']:.2f}")
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    report = asyncio.run(run(args))
+    _print_report(report)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Wrote report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
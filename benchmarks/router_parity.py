@@ -0,0 +1,79 @@
+"""
+Routing parity check: compares `IntentRouter` with the substring keyword routing it replaced.
+
+Every example must route the same way as before, except the listed intentional changes
+(content questions that mention a file go to search; new pt/en/es phrases reach the
+FileManager). Exits with status 1 on any unexpected difference.
+
+Usage:
+    python -m benchmarks.router_parity
+"""
+
+import os
+import sys
+
+os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+
+from rag_agent.router import FILE_MANAGER, SEARCH, build_router  # noqa: E402
+
+# Keywords of the routing in orchestrator.py before rag_agent/router.py
+LEGACY_KEYWORDS = ["upload", "index", "arquivo", "liste os arquivos", "quais arquivos"]
+
+# Examples from the agents' instructions, the benchmarks and the review of the router
+EXAMPLES = [
+    "meu arquivo já foi indexado?",
+    "checar meus arquivos",
+    "Quais são as principais conclusões?",
+    "Quais são as principais conclusões do relatório?",
+    "Fale-me sobre a receita",
+    "O nome do documento é 8d9aefe-29839klg_final.pdf?",
+    "Como está o tempo?",
+    "Qual foi a receita no último trimestre?",
+    "Quem assinou o contrato?",
+    "Como o custo operacional evoluiu?",
+    "Explique a metodologia usada na pesquisa",
+    "What are the main risks mentioned?",
+    "liste os arquivos que eu enviei",
+    "quais arquivos já foram indexados?",
+    "segue o arquivo",
+    "indexe o relatorio.pdf",
+    "reindexar tudo",
+    "Please reindex",
+    "upload done, please index it",
+    "a fileira de trás",
+    "o filé estava bom?",
+]
+
+# Intentional differences from the legacy routing: text -> new route
+CHANGES = {
+    # Content questions that mention a file are searches (question_classifier)
+    "What does the file say about revenue?": SEARCH,
+    "O que o arquivo diz sobre a receita?": SEARCH,
+    # Phrases added with the router
+    "list my documents": FILE_MANAGER,
+    "which documents did I send?": FILE_MANAGER,
+    "enviei dois anexos": FILE_MANAGER,
+    "subí un archivo": FILE_MANAGER,
+}
+
+
+def legacy_route(text: str) -> str:
+    user_text = text.lower()
+    return FILE_MANAGER if any(keyword in user_text for keyword in LEGACY_KEYWORDS) else SEARCH
+
+
+def main() -> int:
+    router = build_router()
+    failures = 0
+    cases = [(text, legacy_route(text)) for text in EXAMPLES] + list(CHANGES.items())
+    for text, expected in cases:
+        decision = router.classify(text)
+        status = "ok" if decision.route == expected else "MISMATCH"
+        failures += decision.route != expected
+        print(f"{status:<9} {expected:<13} {decision.route:<13} {decision.reason:<11} {text}")
+    print(f"{len(cases) - failures}/{len(cases)} example(s) match")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,19 @@
 import os
 
 from google.adk.agents import LlmAgent
+from google.adk.apps import App
+from rag_agent.history import get_history_policy
 from rag_agent.orchestrator import RAGOrchestrator
-from rag_agent.tools.file_uploader_tools import list_files_tool, index_file_tool
+from rag_agent.tools import metrics
+from rag_agent.tools.file_uploader_tools import list_files_tool, index_file_tool, index_pending_tool, job_status_tool
+from rag_agent.tools.index_jobs import IndexWorkerPlugin
 from rag_agent.tools.search_file import search_tool
+from rag_agent.tools.upload_spill import UploadSpillPlugin
 
 MODEL = os.getenv("DEMO_AGENT_MODEL", "gemini-2.5-flash")
+SEARCH_MODE = os.getenv("SEARCH_MODE", "agent")
+DIRECT_SEARCH_RATIO = float(os.getenv("DIRECT_SEARCH_RATIO", "1.0"))
+STREAM_SEARCH = os.getenv("STREAM_SEARCH", "false").lower() in ("1", "true", "yes")
 
 
 file_manager = LlmAgent(
@@ -16,39 +24,52 @@ file_manager = LlmAgent(
     
     1. Chame a tool `list_files_tool`
     2. Analise os resultados
-    3. **SE** o arquivo não estiver indexado, chame a tool index_uploaded_file para cada arquivo
+    3. **SE** houver arquivos não indexados, chame a tool `index_pending_files` uma única vez (enfileira todos)
     4. Responda para o usuário final
     
     ** Suas tools **
     
-    - `list_uploaded_files`: Mostra os arquivos que foi feito o upload através da UI e quais estao indexados 
-    - `index_uploaded_file`: indexa um arquivo especifico no search_store
+    - `list_uploaded_files`: Mostra as contagens e uma página dos arquivos que foi feito o upload através da UI, com os não indexados primeiro
+    - `index_uploaded_file`: enfileira a indexação de um arquivo especifico no search_store
+    - `index_pending_files`: enfileira de uma vez todos os arquivos em not_indexed e retorna o job de cada um
+    - `index_job_status`: consulta o andamento das indexações (por job_id, ou as mais recentes) sem esperar
     
     ** Exemplo de fluxo **
     
     Usuario envia o arquivo relatorio.pdf ou diz "checar meus arquivos"
     
     1: você deve chamar `list_uploaded_files` primeiramente
-    2: Tool returns: {"uploaded_files": ["report.pdf"], "indexed_files": [], "not_indexed": ["report.pdf"]}
-    3: você deve chamar `index_uploaded_file` with filename="report.pdf"
-    4: Tool returns: {"status": "success", "message": "Successfully indexed..."}
-    5: AGORA responda: "✓Você indexou report.pdf! Você pode fazer perguntas sobre seu conteudo"
+    2: Tool returns: {"counts": {"uploaded": 1, "not_indexed": 1, "indexed_total": 0}, "uploaded_files": ["report.pdf"], "not_indexed": ["report.pdf"], "next_cursor": null}
+    3: você deve chamar `index_pending_files`
+    4: Tool returns: {"status": "success", "message": "Queued 1 of 1 pending file(s) for indexing", "results": [...]}
+    5: AGORA responda: "✓ report.pdf está sendo indexado! Em instantes você poderá fazer perguntas sobre seu conteudo"
+    
+    Usuario pergunta "meu arquivo já foi indexado?"
+    
+    1: você deve chamar `index_job_status`
+    2: Tool returns: {"jobs": [{"filename": "doc_a1b2.pdf", "original_name": "report.pdf", "status": "success"}], ...}
+    3: AGORA responda: "✓ report.pdf já está indexado e pronto para pesquisa"
     
     
     **Nunca:**
     - Não tente adivinhar quais arquivos existem - SEMPRE chame list_uploaded_files primeiro
     - Não pule a indexação - se not_indexed contiver arquivos, indexe-os
+    - Não chame `index_uploaded_file` arquivo por arquivo quando houver vários pendentes - use `index_pending_files`
     - Não fique só na conversa - USE AS tool
+    - Não percorra todas as páginas com `next_cursor` - use `counts` e só peça a próxima página se o usuário quiser ver a lista completa
+    - Não chame `index_job_status` repetidamente esperando a conclusão - informe o andamento e encerre
     
     **Comunicação após o uso das tool:**
     
     - Breve e focada na ação
     - Confirme o que você realmente fez com as tool
-    - Informe ao usuário que os arquivos estão prontos para pesquisa
+    - Informe ao usuário se os arquivos estão prontos para pesquisa ou ainda em indexação
+    - Se o status for "near_duplicate", diga que o arquivo é quase igual a um documento já indexado (`duplicate_of`) e por isso não foi indexado
+    - Se o arquivo foi enfileirado com `duplicate_of`, avise que ele é uma versão quase igual de um documento já indexado e que as duas versões ficam disponíveis na busca
     
     ''',
     description='''Gerencia e indexa os arquivos recebidos''',
-    tools=[list_files_tool, index_file_tool]
+    tools=[list_files_tool, index_file_tool, index_pending_tool, job_status_tool]
 )
 
 search_agent = LlmAgent(
@@ -107,9 +128,36 @@ search_agent = LlmAgent(
     tools=[search_tool]
 )
 
+# Instrução da chamada direta à busca de arquivos (SEARCH_MODE=direct ou STREAM_SEARCH): os
+# trechos dos documentos chegam pela própria chamada, sem a `search_tool` do SearchAgent
+DIRECT_SEARCH_INSTRUCTION = '''
+    Você é um Assistente de Busca. Responda à pergunta usando apenas os trechos dos documentos indexados recuperados pela busca de arquivos.
+
+    - Resuma as informações principais de forma simples — fale como se estivesse explicando em voz alta.
+    - Seja conciso, mas forneça contexto suficiente para garantir a clareza.
+    - Sempre cite suas fontes, mas NÃO leia nomes de arquivos complexos ou ilegíveis (hashes, códigos longos); descreva o documento de forma geral (como "o relatório principal").
+    - Se os trechos não responderem à pergunta, diga: "Não consegui encontrar informações sobre isso nos documentos que você enviou." e sugira enviar mais documentos ou reformular a pergunta.
+    - Se a pergunta não se referir aos documentos, você pode responder com base em conhecimento geral, mas sempre esclareça: "Esta resposta é de conhecimento geral, não dos documentos que você enviou."
+    '''
+
 root_agent = RAGOrchestrator(
     name="RAGOrchestrator",
     file_manager=file_manager,
     search_assistant=search_agent,
+    search_mode=SEARCH_MODE,
+    direct_search_ratio=DIRECT_SEARCH_RATIO,
+    stream_search=STREAM_SEARCH,
+    direct_search_instruction=DIRECT_SEARCH_INSTRUCTION,
+    history_policy=get_history_policy(),
+)
+
+# Os plugins tiram os uploads da mensagem antes de ela ser gravada na sessão e mantêm
+# os workers da fila de indexação rodando (retomando jobs pendentes após um reinício)
+app = App(
+    name="rag_agent",
+    root_agent=root_agent,
+    plugins=[UploadSpillPlugin(), IndexWorkerPlugin()],
 )
 
+if metrics.METRICS_PORT:
+    metrics.start_metrics_server(int(metrics.METRICS_PORT))
@@ -0,0 +1,223 @@
+"""
+Janela de histórico dos sub-agentes do RAGOrchestrator.
+
+A cada chamada ao modelo, o histórico da sessão é reduzido a:
+
+- um resumo dos turnos antigos, calculado de forma incremental e guardado em cache por
+  sessão (só os turnos que saíram da janela desde a última chamada são resumidos);
+- os últimos HISTORY_WINDOW_TURNS turnos, com as saídas longas de tools e os arquivos
+  anexados substituídos por marcadores curtos;
+- o turno atual, sem alterações.
+
+Assim o tamanho do prompt deixa de crescer com a duração da sessão.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.agents import LlmAgent
+from google.genai import types
+
+from rag_agent.tools import metrics
+
+# Turnos anteriores mantidos por completo (além do turno atual); 0 desativa a janela
+HISTORY_WINDOW_TURNS = int(os.getenv('HISTORY_WINDOW_TURNS', '4'))
+# Saídas de tools maiores que isso (em caracteres do JSON) viram um marcador nos turnos anteriores
+HISTORY_TOOL_OUTPUT_CHARS = int(os.getenv('HISTORY_TOOL_OUTPUT_CHARS', '400'))
+# Tamanho máximo do resumo dos turnos antigos; os mais antigos saem primeiro
+HISTORY_SUMMARY_CHARS = int(os.getenv('HISTORY_SUMMARY_CHARS', '2000'))
+HISTORY_CACHE_SIZE = int(os.getenv('HISTORY_CACHE_SIZE', '1024'))
+
+# Mensagens de outros agentes chegam como conteúdo "user" com este prefixo (ADK)
+OTHER_AGENT_PREFIX = "For context:"
+SUMMARY_HEADER = "Resumo da conversa anterior (turnos antigos, resumidos):"
+TURN_TEXT_CHARS = 160
+
+Turn = List[types.Content]
+
+
+def _text(content: types.Content) -> str:
+    return " ".join(part.text for part in content.parts or [] if part.text and not part.thought).strip()
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _starts_turn(content: types.Content) -> bool:
+    """Um turno começa em uma mensagem do usuário (não em respostas de tools nem em mensagens de outros agentes)"""
+    if content.role != "user" or not content.parts:
+        return False
+    if any(part.function_response for part in content.parts):
+        return False
+    return not _text(content).startswith(OTHER_AGENT_PREFIX)
+
+
+def split_turns(contents: List[types.Content]) -> Tuple[Turn, List[Turn]]:
+    """Separa o conteúdo anterior ao primeiro turno e os turnos, do mais antigo ao atual"""
+    preamble: Turn = []
+    turns: List[Turn] = []
+    for content in contents:
+        if _starts_turn(content):
+            turns.append([content])
+        elif turns:
+            turns[-1].append(content)
+        else:
+            preamble.append(content)
+    return preamble, turns
+
+
+def _stub_part(part: types.Part, max_tool_chars: int) -> types.Part:
+    """Substitui arquivos anexados e saídas longas de tools por marcadores curtos"""
+    if part.inline_data is not None:
+        blob = part.inline_data
+        name = blob.display_name or blob.mime_type or "arquivo"
+        return types.Part(text=f"[arquivo anexado: {name}, {len(blob.data or b'')} bytes, omitido do histórico]")
+    if part.file_data is not None:
+        name = part.file_data.display_name or part.file_data.file_uri or "arquivo"
+        return types.Part(text=f"[arquivo anexado: {name}, omitido do histórico]")
+    response = part.function_response
+    if response is not None and response.response:
+        if len(json.dumps(response.response, default=str, ensure_ascii=False)) > max_tool_chars:
+            stub: Dict[str, Any] = {"omitted": "saída da tool resumida no histórico"}
+            for key in ("status", "message"):
+                if key in response.response:
+                    stub[key] = _clip(str(response.response[key]), TURN_TEXT_CHARS)
+            return types.Part(function_response=types.FunctionResponse(id=response.id, name=response.name,
+                                                                      response=stub))
+    return part
+
+
+class HistoryPolicy:
+    """
+    Política de histórico aplicada aos sub-agentes por um `before_model_callback`.
+
+    O resumo dos turnos antigos é extrativo (pergunta, tools chamadas e início da
+    resposta de cada turno), sem chamadas extras ao modelo; subclasses podem trocar
+    `summarize_turn`. O cache guarda, por sessão e agente, os turnos já resumidos.
+    """
+
+    def __init__(self, window_turns: int = HISTORY_WINDOW_TURNS,
+                 max_tool_output_chars: int = HISTORY_TOOL_OUTPUT_CHARS,
+                 max_summary_chars: int = HISTORY_SUMMARY_CHARS,
+                 cache_size: int = HISTORY_CACHE_SIZE):
+        self.window_turns = window_turns
+        self.max_tool_output_chars = max_tool_output_chars
+        self.max_summary_chars = max_summary_chars
+        self.cache_size = max(1, cache_size)
+        # (sessão, agente) -> (turnos resumidos, digest do último turno resumido, linhas do resumo)
+        self._summaries: "OrderedDict[Tuple[str, str], Tuple[int, str, List[str]]]" = OrderedDict()
+
+    def install(self, agent: LlmAgent):
+        """Acrescenta a política aos `before_model_callback` do agente"""
+        callbacks = agent.before_model_callback
+        if callbacks is None:
+            callbacks = []
+        elif not isinstance(callbacks, list):
+            callbacks = [callbacks]
+        if self.before_model_callback not in callbacks:
+            agent.before_model_callback = [*callbacks, self.before_model_callback]
+
+    async def before_model_callback(self, callback_context, llm_request):
+        session = callback_context.session
+        key = (session.id if session else "", callback_context.agent_name)
+        llm_request.contents = self.compact(llm_request.contents, key)
+        return None
+
+    def summarize_turn(self, turn: Turn) -> str:
+        """Uma linha por turno: a pergunta, as tools usadas (com o status) e o início da resposta"""
+        question = _text(turn[0])
+        tools, answer = [], ""
+        for content in turn[1:]:
+            for part in content.parts or []:
+                if part.function_response is not None:
+                    status = (part.function_response.response or {}).get("status")
+                    tools.append(f"{part.function_response.name}({status})" if status else part.function_response.name)
+            if content.role == "model" and _text(content):
+                answer = _text(content)
+        line = f"- Usuário: {_clip(question, TURN_TEXT_CHARS) or '[arquivo enviado]'}"
+        if tools:
+            line += f" | tools: {', '.join(tools)}"
+        if answer:
+            line += f" | resposta: {_clip(answer, TURN_TEXT_CHARS)}"
+        return line
+
+    def _summary(self, key: Tuple[str, str], turns: List[Turn]) -> str:
+        """Resumo dos turnos, reaproveitando os já resumidos na chamada anterior da mesma sessão"""
+        cached = self._summaries.get(key)
+        lines: List[str] = []
+        if cached:
+            covered, digest, cached_lines = cached
+            if covered <= len(turns) and covered and self._digest(turns[covered - 1]) == digest:
+                lines = list(cached_lines)
+                turns_to_add = turns[covered:]
+            else:
+                # Histórico diferente do que foi resumido (e.g., sessão reescrita): recomeça
+                turns_to_add = turns
+        else:
+            turns_to_add = turns
+        lines.extend(self.summarize_turn(turn) for turn in turns_to_add)
+
+        # Mantém só as linhas mais recentes que cabem no limite
+        total, kept = 0, []
+        for line in reversed(lines):
+            total += len(line) + 1
+            if total > self.max_summary_chars and kept:
+                break
+            kept.append(line)
+        kept.reverse()
+
+        if turns:
+            self._summaries[key] = (len(turns), self._digest(turns[-1]), kept)
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+
+        header = SUMMARY_HEADER
+        if len(turns) > len(kept):
+            header += f" ({len(turns) - len(kept)} turno(s) mais antigos omitidos)"
+        return "\n".join([header, *kept])
+
+    @staticmethod
+    def _digest(turn: Turn) -> str:
+        data = json.dumps([content.model_dump(mode="json", exclude_none=True) for content in turn[:1]],
+                          sort_keys=True, default=str)
+        return hashlib.blake2b(data.encode("utf-8"), digest_size=8).hexdigest()
+
+    def compact(self, contents: List[types.Content], key: Tuple[str, str] = ("", "")) -> List[types.Content]:
+        """Aplica a janela, o resumo e os marcadores; o turno atual fica intacto"""
+        if self.window_turns <= 0 or not contents:
+            return contents
+        with metrics.span("history_compaction"):
+            preamble, turns = split_turns(contents)
+            if not turns:
+                return contents
+            older = turns[:-1 - self.window_turns] if len(turns) > self.window_turns + 1 else []
+            window = turns[len(older):-1]
+
+            compacted: List[types.Content] = list(preamble)
+            if older:
+                compacted.append(types.Content(role="user", parts=[types.Part(text=self._summary(key, older))]))
+            for turn in window:
+                for content in turn:
+                    parts = [_stub_part(part, self.max_tool_output_chars) for part in content.parts or []]
+                    compacted.append(types.Content(role=content.role, parts=parts))
+            compacted.extend(turns[-1])
+
+        metrics.count("history_compaction", result="summarized" if older else "windowed")
+        return compacted
+
+
+_policy: Optional[HistoryPolicy] = None
+
+
+def get_history_policy() -> HistoryPolicy:
+    """Política compartilhada, com a configuração das variáveis de ambiente"""
+    global _policy
+    if _policy is None:
+        _policy = HistoryPolicy()
+    return _policy
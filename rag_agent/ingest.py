@@ -0,0 +1,201 @@
+"""
+Ingestão em massa de um diretório local:
+
+    python -m rag_agent.ingest /caminho/dos/documentos [--ext pdf,docx,txt] [--no-wait]
+
+Arquivos com o mesmo tamanho e mtime da última execução são pulados sem ler o conteúdo.
+Os demais têm o hash calculado em um pool de processos (mesmo nome `doc_<hash>.<ext>` de
+`generate_filename_from_content`, então conteúdos repetidos são indexados uma única vez) e
+são enfileirados na fila de indexação (`index_jobs.py`). O conteúdo não é copiado: os workers
+leem o arquivo de origem no momento do upload. O progresso é gravado no registro a cada lote,
+então uma execução interrompida continua de onde parou.
+
+Com `--no-wait`, os jobs só são gravados; o upload fica com os workers do agente (ou de uma
+próxima execução), nunca com este processo, que termina logo em seguida.
+"""
+
+import argparse
+import asyncio
+import mimetypes
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from rag_agent.tools.index_jobs import enqueue_stored, index_workers
+from rag_agent.tools.metrics import span
+from rag_agent.tools.registry import registry
+from rag_agent.tools.upload_index import content_digest, filename_from_digest
+
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '256'))
+# Processos para o cálculo dos hashes; 0 usa a quantidade de CPUs
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '0'))
+
+
+def scan(root: Path, extensions: Optional[Set[str]] = None) -> Iterator[Tuple[str, int, int]]:
+    """Percorre o diretório (ignorando arquivos e pastas ocultos) e produz (caminho, tamanho, mtime_ns)"""
+    stack = [str(root)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError as e:
+            print(f"[Ingest] Skipping directory: {e}")
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    if extensions and entry.name.rsplit('.', 1)[-1].lower() not in extensions:
+                        continue
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime_ns
+
+
+def _hash_file(path: str, mime_type: str) -> Tuple[str, str]:
+    """
+    Executado no pool de processos: lê o arquivo e gera o nome pelo conteúdo.
+
+    Returns:
+        (nome do documento, hash do conteúdo)
+    """
+    digest = content_digest(Path(path).read_bytes())
+    return filename_from_digest(digest, mime_type), digest
+
+
+def _mime_type(path: str) -> Optional[str]:
+    return mimetypes.guess_type(path)[0]
+
+
+async def ingest(root: Path, extensions: Optional[Set[str]] = None, workers: int = INGEST_WORKERS,
+                 batch_size: int = INGEST_BATCH_SIZE, wait: bool = True) -> Dict[str, Any]:
+    """
+    Enfileira a indexação dos arquivos novos ou alterados do diretório.
+
+    Returns:
+        Um resumo com as quantidades de arquivos vistos, pulados, enfileirados e com erro
+    """
+    root = root.resolve()
+    summary = {"scanned": 0, "unchanged": 0, "hashed": 0, "queued": 0, "already_indexed": 0,
+               "in_progress": 0, "unsupported": 0, "failed": 0}
+    job_ids: List[str] = []
+
+    async def enqueue(candidates: List[Tuple[str, int, str, str, str]]):
+        """
+        Enfileira (caminho, tamanho, nome do documento, hash, mime) que ainda não estão
+        indexados nem em andamento
+        """
+        names = [filename for _, _, filename, _, _ in candidates]
+        indexed = await asyncio.to_thread(registry.indexed_subset, names)
+        active = await asyncio.to_thread(registry.active_job_filenames, set(names) - indexed)
+        seen = set()
+        for path, size, filename, digest, mime_type in candidates:
+            if filename in indexed:
+                summary["already_indexed"] += 1
+            elif filename in active or filename in seen:
+                summary["in_progress"] += 1
+            else:
+                # Os workers só começam em `wait_for_jobs`: com --no-wait, um upload iniciado aqui
+                # seria cancelado na saída e o job ficaria reservado até JOB_LEASE
+                job = await enqueue_stored(filename, digest, mime_type, size, os.path.relpath(path, root),
+                                           source_path=path, start_workers=False)
+                job_ids.append(job["job_id"])
+                summary["queued"] += 1
+            seen.add(filename)
+
+    with span("ingest_scan"):
+        checkpoints = await asyncio.to_thread(registry.ingest_checkpoints)
+        changed: List[Tuple[str, int, int, str]] = []
+        unchanged: List[Tuple[str, int, str, str, str]] = []
+        for path, size, mtime_ns in scan(root, extensions):
+            summary["scanned"] += 1
+            mime_type = _mime_type(path)
+            if not mime_type:
+                summary["unsupported"] += 1
+                continue
+            checkpoint = checkpoints.get(path)
+            # O conteúdo só é lido de novo se o arquivo mudou (ou se o checkpoint é anterior à
+            # coluna `digest`)
+            if checkpoint and checkpoint[:2] == (size, mtime_ns) and checkpoint[3]:
+                unchanged.append((path, size, checkpoint[2], checkpoint[3], mime_type))
+            else:
+                changed.append((path, size, mtime_ns, mime_type))
+
+    summary["unchanged"] = len(unchanged)
+    await enqueue(unchanged)
+    print(f"[Ingest] {summary['scanned']} file(s) found, {len(unchanged)} unchanged, {len(changed)} to hash")
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers or None) as pool:
+        for start in range(0, len(changed), batch_size):
+            batch = changed[start:start + batch_size]
+            results = await asyncio.gather(
+                *(loop.run_in_executor(pool, _hash_file, path, mime_type) for path, _, _, mime_type in batch),
+                return_exceptions=True
+            )
+            candidates, rows = [], []
+            for (path, size, mtime_ns, mime_type), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    print(f"[Ingest] Failed to read {path}: {result}")
+                    summary["failed"] += 1
+                    continue
+                filename, digest = result
+                candidates.append((path, size, filename, digest, mime_type))
+                rows.append((path, size, mtime_ns, filename, digest))
+            summary["hashed"] += len(candidates)
+            await enqueue(candidates)
+            # Checkpoint depois de enfileirar: um lote interrompido é refeito, nunca perdido
+            await asyncio.to_thread(registry.save_ingest_checkpoints, rows)
+            print(f"[Ingest] Hashed {min(start + batch_size, len(changed))}/{len(changed)}, "
+                  f"{summary['queued']} queued so far")
+
+    print(f"[Ingest] Queued {summary['queued']} file(s) for indexing")
+    if wait and job_ids:
+        summary.update(await wait_for_jobs(job_ids))
+    return summary
+
+
+async def wait_for_jobs(job_ids: List[str], report_every: float = 10.0) -> Dict[str, int]:
+    """Aguarda os jobs terminarem, mostrando o progresso periodicamente"""
+    index_workers.ensure_started()
+    results: Dict[str, int] = {}
+    last_report = time.monotonic()
+    for done, job_id in enumerate(job_ids, start=1):
+        job = await index_workers.wait(job_id)
+        status = job["status"] if job else "missing"
+        results[f"jobs_{status}"] = results.get(f"jobs_{status}", 0) + 1
+        if time.monotonic() - last_report >= report_every or done == len(job_ids):
+            print(f"[Ingest] {done}/{len(job_ids)} job(s) finished: {results}")
+            last_report = time.monotonic()
+    return results
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m rag_agent.ingest",
+                                     description="Index every new or changed file under a directory")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--ext", default="",
+                        help="Comma-separated extensions to include (e.g. pdf,docx,txt); default: all")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="Hashing processes (default: number of CPUs)")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--no-wait", dest="wait", action="store_false",
+                        help="Only queue the jobs; the agent's workers (or a later run) finish them")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    if not args.directory.is_dir():
+        raise SystemExit(f"Not a directory: {args.directory}")
+    extensions = {ext.strip().lstrip('.').lower() for ext in args.ext.split(',') if ext.strip()}
+    started = time.perf_counter()
+    summary = asyncio.run(ingest(args.directory, extensions or None, args.workers, args.batch_size, args.wait))
+    print(f"[Ingest] Done in {time.perf_counter() - started:.1f}s: {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,13 +16,24 @@
 RAG Orchestrator Agent - Routes between file management and search
 """
 
+import hashlib
 import logging
-from typing import AsyncGenerator
+import time
+from typing import AsyncGenerator, Optional
 from typing_extensions import override
 
 from google.adk.agents import BaseAgent, LlmAgent
 from google.adk.agents.invocation_context import InvocationContext
-from google.adk.events import Event
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from rag_agent.history import HistoryPolicy
+from rag_agent.router import FILE_MANAGER, IntentRouter, get_router
+from rag_agent.tools import metrics
+from rag_agent.tools.search_file import BUSY_MESSAGE, INTERRUPTED_MESSAGE, run_search, stream_search
+from rag_agent.tools.speculation import SPECULATIVE_SEARCH, speculative_searches
+from rag_agent.tools.upload_index import build_event_entries, get_upload_index, upload_index_delta
+from rag_agent.tools.upload_spill import artifact_saver, spill_inline_parts
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -42,6 +53,22 @@ class RAGOrchestrator(BaseAgent):
     # Declare sub-agents as class attributes for Pydantic
     file_manager: LlmAgent
     search_assistant: LlmAgent
+    # "agent": questions go through the SearchAgent (two model calls)
+    # "direct": the orchestrator calls the search itself, in the SearchAgent's style, in a single call
+    search_mode: str = "agent"
+    # Fraction of sessions that use the direct mode (A/B test), applied when search_mode="direct"
+    direct_search_ratio: float = 1.0
+    # Stream search answers straight from FileSearch, without the extra round trip through the SearchAgent
+    stream_search: bool = False
+    # System instruction of the direct FileSearch call; the SearchAgent's own instruction
+    # refers to its search_tool, which doesn't exist in that call
+    direct_search_instruction: Optional[str] = None
+    # Intent router; None uses the shared default (see rag_agent/router.py)
+    router: Optional[IntentRouter] = None
+    # History window applied to every sub-agent model call; None sends the full session history
+    history_policy: Optional[HistoryPolicy] = None
+    # Start retrieval for the raw user text while the Search Assistant plans its tool call
+    speculative_search: bool = SPECULATIVE_SEARCH
 
     # Allow arbitrary types for Pydantic validation
     model_config = {"arbitrary_types_allowed": True}
@@ -51,6 +78,13 @@ class RAGOrchestrator(BaseAgent):
             name: str,
             file_manager: LlmAgent,
             search_assistant: LlmAgent,
+            search_mode: str = "agent",
+            direct_search_ratio: float = 1.0,
+            stream_search: bool = False,
+            direct_search_instruction: Optional[str] = None,
+            router: Optional[IntentRouter] = None,
+            history_policy: Optional[HistoryPolicy] = None,
+            speculative_search: bool = SPECULATIVE_SEARCH,
     ):
         """
         Initialize the RAG Orchestrator.
@@ -59,6 +93,19 @@ class RAGOrchestrator(BaseAgent):
             name: The name of the orchestrator
             file_manager: Agent that handles file uploads and indexing
             search_assistant: Agent that handles search and answers questions
+            search_mode: "agent" to answer through the Search Assistant, "direct" to call
+                the retrieval pipeline from the orchestrator in a single model call
+            direct_search_ratio: Fraction of sessions that take the direct path (A/B split)
+            stream_search: Stream grounded answers for search queries as partial events
+                (always uses the direct path)
+            direct_search_instruction: System instruction for the direct path's grounded
+                call (answer style, citations); None sends no system instruction
+            router: Intent router deciding between the File Manager and search
+            history_policy: Sliding window and summary of older turns for the sub-agents'
+                prompts (see rag_agent/history.py)
+            speculative_search: Start the search for the user's text as soon as a message
+                is routed to the Search Assistant; its `search_tool` call reuses it when the
+                query matches (see rag_agent/tools/speculation.py)
         """
         # Define sub_agents list for framework
         sub_agents_list = [file_manager, search_assistant]
@@ -68,9 +115,22 @@ class RAGOrchestrator(BaseAgent):
             name=name,
             file_manager=file_manager,
             search_assistant=search_assistant,
+            search_mode=search_mode,
+            direct_search_ratio=direct_search_ratio,
+            stream_search=stream_search,
+            direct_search_instruction=direct_search_instruction,
+            router=router,
+            history_policy=history_policy,
+            speculative_search=speculative_search,
             sub_agents=sub_agents_list,
         )
 
+        if history_policy is not None:
+            # Sub-agents still receive the full InvocationContext (their tools read the
+            # session), only the contents sent to the model are windowed
+            for agent in sub_agents_list:
+                history_policy.install(agent)
+
     @override
     async def _run_async_impl(
             self, ctx: InvocationContext
@@ -79,80 +139,191 @@ class RAGOrchestrator(BaseAgent):
         Orchestration logic for routing requests.
         """
         logger.info(f"[{self.name}] Starting RAG orchestration")
+        metrics.start_invocation()
+        started = time.perf_counter()
 
         # Check session state for routing hints
         state = ctx.session.state
-        logger.info(f"[{self.name}] Session state: {state}")
+        logger.debug(f"[{self.name}] Session state keys: {sorted(state.keys())}")
 
         # Get the user's latest message from session history
-        user_text = ""
-        has_file_upload = False
-        uploaded_filename = None
-
-        # Check the latest user message from session events
-        if ctx.session.events and len(ctx.session.events) > 0:
-            # Get the most recent event
-            last_event = ctx.session.events[-1]
-            if last_event.content and last_event.content.parts:
-                for idx, part in enumerate(last_event.content.parts):
-                    if part.text:
-                        user_text = part.text.lower()
-                        logger.info(f"[{self.name}] User text: {user_text[:100]}")
-                    # Check if this part contains a file (inline_data indicates upload)
-                    if part.inline_data:
-                        has_file_upload = True
-                        mime_type = part.inline_data.mime_type
-                        logger.info(f"[{self.name}] Detected file upload: {mime_type}")
-
-                        # Generate a filename from MIME type if not provided
-                        # Try to get filename from user text or generate one
-                        if "file" in user_text or "/" in user_text:
-                            # User might have typed filename
-                            words = user_text.split()
-                            for word in words:
-                                if "." in word:
-                                    uploaded_filename = word.strip()
-                                    break
-
-                        if not uploaded_filename:
-                            # Generate filename from MIME type
-                            ext = mime_type.split('/')[-1]
-                            if ext == 'pdf':
-                                uploaded_filename = f"uploaded_document_{idx}.pdf"
-                            elif ext in ['png', 'jpg', 'jpeg']:
-                                uploaded_filename = f"uploaded_image_{idx}.{ext}"
-                            else:
-                                uploaded_filename = f"uploaded_file_{idx}.{ext}"
-
-                        # Note: File will be accessed directly from session history by tools
-                        logger.info(f"[{self.name}] Upload will be processed as: {uploaded_filename}")
-
-        # Routing Logic
-        route_to_file_manager = False
-
+        last_event = ctx.session.events[-1] if ctx.session.events else None
+        with metrics.span("routing"):
+            decision = (self.router or get_router()).route_event(last_event)
+        query_text = decision.query_text
+        has_file_upload = decision.has_upload
+        logger.info(f"[{self.name}] User text: {query_text[:100]}")
         if has_file_upload:
-            logger.info(f"[{self.name}] → Routing to File Manager (file upload detected)")
-            route_to_file_manager = True
+            # Note: File will be accessed directly from session history by tools
+            logger.info(f"[{self.name}] Detected file upload (filename hint: {decision.filename})")
 
-        elif any(keyword in user_text for keyword in ["upload", "index", "arquivo", "liste os arquivos", "quais arquivos"]):
-            logger.info(f"[{self.name}] → Routing to File Manager (file-related query)")
-            route_to_file_manager = True
+        # Hash uploads once; the tools reuse the session's upload index
+        if has_file_upload:
+            # Without the UploadSpillPlugin the bytes are still in the event: move them to the blob
+            # store here, so the in-memory session only keeps the reference
+            await spill_inline_parts(last_event.content, artifact_saver(ctx))
+            upload_index = get_upload_index(state)
+            new_entries = {
+                key: entry for key, entry in (await build_event_entries(last_event)).items()
+                if key not in upload_index
+            }
+            if new_entries:
+                # Only the new entries are written, each under its own key, so the delta doesn't
+                # grow with the number of uploads in the session
+                logger.info(f"[{self.name}] Indexed {len(new_entries)} upload(s) in session state")
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    actions=EventActions(state_delta=upload_index_delta(new_entries)),
+                )
 
-        else:
-            logger.info(f"[{self.name}] → Routing to Search Assistant (search/question query)")
-            route_to_file_manager = False
+        # Routing Logic
+        route_to_file_manager = decision.route == FILE_MANAGER
+        logger.info(f"[{self.name}] → Routing to {decision.route} ({decision.reason}: {list(decision.matched)})")
 
         if route_to_file_manager:
+            metrics.count("route", route="file_manager")
             logger.info(f"[{self.name}] Running File Manager Agent...")
             async for event in self.file_manager.run_async(ctx):
                 logger.info(f"[{self.name}] Event from FileManager: {event.author}")
                 yield event
+        elif query_text and self._use_direct_search(ctx):
+            metrics.count("route", route="direct_search")
+            logger.info(f"[{self.name}] Running direct search (stream={self.stream_search})...")
+            async for event in self._run_direct_search(ctx, query_text):
+                yield event
         else:
+            metrics.count("route", route="search_assistant")
+            if self.speculative_search and query_text and speculative_searches.worth_speculating(
+                    query_text, bool(decision.matched)):
+                # The Search Assistant will almost always search for the user's text: start it
+                # now instead of after the agent's planning turn
+                speculative_searches.start(ctx.invocation_id, query_text, lambda: run_search(query_text))
             logger.info(f"[{self.name}] Running Search Assistant Agent...")
-            async for event in self.search_assistant.run_async(ctx):
-                logger.info(f"[{self.name}] Event from SearchAssistant: {event.author}")
-                yield event
+            try:
+                async for event in self.search_assistant.run_async(ctx):
+                    logger.info(f"[{self.name}] Event from SearchAssistant: {event.author}")
+                    yield event
+            finally:
+                # Cancels the speculative search if the agent never asked for it
+                speculative_searches.finish(ctx.invocation_id)
+
+        # Per-stage timing summary for this invocation, kept at a fixed size in state
+        timings = metrics.invocation_summary()
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta={"last_invocation_timings": timings}),
+        )
 
         logger.info(f"[{self.name}] Orchestration complete")
 
+    def _use_direct_search(self, ctx: InvocationContext) -> bool:
+        """Decides the search path; the A/B bucket is sticky per session"""
+        if self.stream_search:
+            return True
+        if self.search_mode != "direct":
+            return False
+        if self.direct_search_ratio >= 1.0:
+            return True
+        bucket = int(hashlib.md5(ctx.session.id.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return bucket < self.direct_search_ratio
+
+    async def _run_direct_search(
+            self, ctx: InvocationContext, query: str
+    ) -> AsyncGenerator[Event, None]:
+        """
+        Answers a search query with a single grounded model call, applying
+        `direct_search_instruction` as the system instruction.
+
+        With stream_search the text is also emitted as partial events. The final event
+        carries the full text, the grounding metadata and the search summary in state.
+        Falls back to the Search Assistant if the call fails before any text was shown;
+        a stream that fails midway ends with the partial text, an interruption notice and
+        the event's error_code/error_message set.
+        """
+        author = self.search_assistant.name
+        started = time.perf_counter()
+        first_token_ms = None
+
+        async for item in stream_search(query, self.direct_search_instruction):
+            if item["type"] == "partial":
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                    logger.info(f"[{self.name}] Time to first token: {first_token_ms:.0f}ms")
+                if not self.stream_search:
+                    continue
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=author,
+                    branch=ctx.branch,
+                    partial=True,
+                    content=types.Content(role="model", parts=[types.Part(text=item["text"])]),
+                )
+                continue
+
+            if item["status"] == "busy":
+                # Falling back would add more load to a saturated API, answer right away
+                logger.info(f"[{self.name}] Search rejected, API queue is saturated")
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=author,
+                    branch=ctx.branch,
+                    content=types.Content(role="model", parts=[types.Part(text=BUSY_MESSAGE)]),
+                    actions=EventActions(state_delta={
+                        "last_search": {"query": query, "status": "busy", "path": "direct"}
+                    }),
+                )
+                return
+
+            if item["status"] != "success" and not (self.stream_search and item["answer"]):
+                # Without streaming nothing was shown yet, so a partial answer is discarded too
+                logger.info(f"[{self.name}] Direct search failed, falling back to Search Assistant")
+                async for event in self.search_assistant.run_async(ctx):
+                    yield event
+                return
+
+            if item["status"] != "success":
+                # The user already saw part of the answer: close it as interrupted, never as complete
+                logger.info(f"[{self.name}] Direct search stream interrupted: {item.get('message')}")
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=author,
+                    branch=ctx.branch,
+                    content=types.Content(role="model", parts=[
+                        types.Part(text=item["answer"] + "\n\n" + INTERRUPTED_MESSAGE)
+                    ]),
+                    error_code="STREAM_INTERRUPTED",
+                    error_message=item.get("message"),
+                    actions=EventActions(state_delta={
+                        "last_search": {"query": query, "status": "interrupted", "path": "direct"}
+                    }),
+                )
+                return
+
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - started) * 1000
+
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=author,
+                branch=ctx.branch,
+                content=types.Content(role="model", parts=[types.Part(text=item["answer"])]),
+                grounding_metadata=item["grounding_metadata"],
+                actions=EventActions(state_delta={
+                    "last_search": {
+                        "query": query,
+                        "found_sources": len(item["sources"]),
+                        "sources": item["sources"],
+                        "cached": item.get("cached", False),
+                        "path": "direct",
+                        "ttft_ms": round(first_token_ms),
+                        "total_ms": round((time.perf_counter() - started) * 1000),
+                    }
+                }),
+            )
+
 
@@ -0,0 +1,274 @@
+"""
+Roteamento de intenções do RAGOrchestrator.
+
+As frases de cada rota são compiladas em uma única expressão regular (uma alternação
+ordenada do maior para o menor), então o custo de uma decisão cresce com o tamanho da
+mensagem e não com o número de frases. Casos ambíguos (frases de mais de uma rota) podem
+ser resolvidos por um classificador local plugável.
+"""
+
+import importlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from rag_agent.tools import metrics
+from rag_agent.tools.upload_index import is_upload_part
+
+FILE_MANAGER = "file_manager"
+SEARCH = "search"
+
+# JSON no formato {"rota": ["frase", ...]}; as rotas informadas substituem as padrão
+ROUTER_INTENTS_FILE = os.getenv('ROUTER_INTENTS_FILE')
+# Classificador para casos ambíguos no formato "modulo:funcao"; recebe (texto, rotas candidatas)
+# e retorna a rota escolhida ou None. "none" desempata só pela ROUTE_PRIORITY
+ROUTER_CLASSIFIER = os.getenv('ROUTER_CLASSIFIER', 'rag_agent.router:question_classifier')
+ROUTER_CACHE_SIZE = int(os.getenv('ROUTER_CACHE_SIZE', '2048'))
+
+# Frases casam com palavras inteiras ("file" não casa com "fileira"); com "*" no final a frase
+# é um radical e cobre o resto da palavra ("index*" casa com "indexar" e "indexados")
+DEFAULT_INTENTS: Dict[str, List[str]] = {
+    FILE_MANAGER: [
+        # pt
+        "upload*", "index*", "reindex*", "arquivo", "arquivos", "documentos enviados", "liste os arquivos",
+        "quais arquivos", "listar arquivos", "envie", "enviar", "enviei", "anexo", "anexos", "anexei",
+        # en
+        "file", "files", "list my documents", "list my files", "which documents", "attachment",
+        "attachments", "attached",
+        # es
+        "archivo", "archivos", "subí", "adjunto", "adjuntos",
+    ],
+    SEARCH: [
+        # pt
+        "o que", "qual", "quais são", "como", "quando", "onde", "por que", "quem", "resuma", "explique",
+        # en
+        "what", "which", "how", "when", "where", "why", "who", "summarize", "explain",
+        # es
+        "qué", "cuál", "cómo", "cuándo", "dónde", "por qué", "quién", "resume",
+    ],
+}
+
+# Ordem de preferência quando não há classificador para desempatar
+ROUTE_PRIORITY = (FILE_MANAGER, SEARCH)
+
+FILENAME_RE = re.compile(r"(?<![\w.\-])[\w\-]+(?:\.[\w\-]+)*\.[A-Za-z0-9]{2,5}(?![\w.])")
+
+Classifier = Callable[[str, Tuple[str, ...]], Optional[str]]
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    route: str
+    # upload | keyword | classifier | priority | default
+    reason: str
+    query_text: str = ""
+    matched: Tuple[str, ...] = ()
+    has_upload: bool = False
+    filename: Optional[str] = None
+
+
+def _find_filename(text: str, route: str = FILE_MANAGER) -> Optional[str]:
+    """Nome de arquivo citado na mensagem (e.g., "relatorio.pdf"), apenas para o FileManager"""
+    if route != FILE_MANAGER or "." not in text:
+        return None
+    found = FILENAME_RE.search(text)
+    return found.group(0) if found else None
+
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """
+    Monta uma expressão regular equivalente à alternação das frases, fatorada por prefixos
+    comuns (uma trie). O motor de regex segue um único caminho por posição do texto, em vez
+    de testar cada frase, então o custo quase não depende da quantidade de frases.
+
+    Cada frase termina no fim de uma palavra; uma frase terminada em "*" é um radical e
+    cobre o restante da palavra.
+    """
+    trie: Dict[str, dict] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase.rstrip("*"):
+            node = node.setdefault(char, {})
+        node["*" if phrase.endswith("*") else ""] = {}
+
+    def render(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char not in ("", "*")]
+        # Prefere a frase mais longa: o fim da frase é a última alternativa
+        if "*" in node:
+            branches.append(r"\w*")
+        elif "" in node:
+            branches.append(r"(?!\w)")
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return render(trie) if trie else ""
+
+
+class IntentRouter:
+    """
+    Decide a rota de um evento do usuário.
+
+    - Uploads (`inline_data` ou referências a blobs) sempre vão para o FileManager
+    - Frases de uma única rota decidem diretamente
+    - Frases de mais de uma rota são ambíguas: usa o `classifier`, ou a ROUTE_PRIORITY
+    - Sem frases, a mensagem vai para a busca
+
+    As decisões ficam em um LRU por id de evento.
+    """
+
+    def __init__(self, intents: Optional[Dict[str, Iterable[str]]] = None,
+                 classifier: Optional[Classifier] = None, default_route: str = SEARCH,
+                 cache_size: int = ROUTER_CACHE_SIZE):
+        self.intents = {route: list(phrases) for route, phrases in (intents or DEFAULT_INTENTS).items()}
+        self.classifier = classifier
+        self.default_route = default_route
+        self.cache_size = cache_size
+
+        self._phrase_routes: Dict[str, str] = {}
+        for route, phrases in self.intents.items():
+            for phrase in phrases:
+                self._phrase_routes.setdefault(phrase.casefold(), route)
+        # Radicais ("index*"), do mais longo para o mais curto, para achar a rota da palavra encontrada
+        self._stem_routes = sorted(
+            ((phrase.rstrip("*"), route) for phrase, route in self._phrase_routes.items() if phrase.endswith("*")),
+            key=lambda item: len(item[0]), reverse=True
+        )
+        alternation = _trie_pattern(self._phrase_routes)
+        self._pattern = re.compile(rf"(?<!\w)(?:{alternation})", re.IGNORECASE) if alternation else None
+        self._cache: "OrderedDict[str, RouteDecision]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def match(self, text: str) -> Dict[str, List[str]]:
+        """Frases encontradas no texto, agrupadas por rota"""
+        found: Dict[str, List[str]] = {}
+        if not (self._pattern and text):
+            return found
+        for m in self._pattern.finditer(text):
+            phrase = m.group(0).casefold()
+            route = self._phrase_routes.get(phrase) or next(
+                (route for stem, route in self._stem_routes if phrase.startswith(stem)), None
+            )
+            if route:
+                found.setdefault(route, []).append(phrase)
+        return found
+
+    def classify(self, text: str, has_upload: bool = False) -> RouteDecision:
+        if has_upload:
+            return RouteDecision(FILE_MANAGER, "upload", text, (), True, _find_filename(text))
+
+        found = self.match(text)
+        matched = tuple(phrase for phrases in found.values() for phrase in phrases)
+        if not found:
+            return RouteDecision(self.default_route, "default", text)
+        if len(found) == 1:
+            route = next(iter(found))
+            return RouteDecision(route, "keyword", text, matched, False, _find_filename(text, route))
+
+        candidates = tuple(route for route in ROUTE_PRIORITY if route in found) + tuple(
+            route for route in found if route not in ROUTE_PRIORITY
+        )
+        if self.classifier is not None:
+            try:
+                route = self.classifier(text, candidates)
+            except Exception as e:
+                print(f"[Router] Classifier failed, using priority: {e}")
+                route = None
+            if route:
+                return RouteDecision(route, "classifier", text, matched, False, _find_filename(text, route))
+        route = candidates[0]
+        return RouteDecision(route, "priority", text, matched, False, _find_filename(text, route))
+
+    def route_event(self, event) -> RouteDecision:
+        """Decide a rota de um evento, reaproveitando a decisão já tomada para o mesmo id"""
+        event_id = getattr(event, "id", None)
+        if event_id:
+            with self._lock:
+                cached = self._cache.get(event_id)
+                if cached is not None:
+                    self._cache.move_to_end(event_id)
+                    metrics.count("route_memo", result="hit")
+                    return cached
+
+        texts = []
+        has_upload = False
+        if event is not None and event.content and event.content.parts:
+            for part in event.content.parts:
+                if is_upload_part(part):
+                    has_upload = True
+                elif part.text:
+                    texts.append(part.text)
+
+        decision = self.classify(texts[-1] if texts else "", has_upload)
+        metrics.count("route_decision", route=decision.route, reason=decision.reason)
+
+        if event_id:
+            with self._lock:
+                self._cache[event_id] = decision
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            metrics.count("route_memo", result="miss")
+        return decision
+
+
+_QUESTION_START_RE = re.compile(
+    r"^\W*(?:" + "|".join(re.escape(p) for p in sorted(DEFAULT_INTENTS[SEARCH], key=len, reverse=True)) + r")(?!\w)",
+    re.IGNORECASE,
+)
+_FILE_ACTION_RE = re.compile(
+    r"(?<!\w)(?:list(?:e|ar|s|ing)?|(?:re)?index\w*|upload\w*|envi(?:e|ar|ei|ou|ad[oa]s?)|sub[ií]|attach\w*|anex\w*)"
+    r"(?!\w)",
+    re.IGNORECASE,
+)
+
+
+def question_classifier(text: str, candidates: Tuple[str, ...]) -> Optional[str]:
+    """
+    Classificador local opcional (ROUTER_CLASSIFIER="rag_agent.router:question_classifier").
+
+    Perguntas sobre o conteúdo ("O que o arquivo diz sobre X?") vão para a busca; mensagens
+    com ações sobre arquivos (listar, indexar, enviar) continuam no FileManager.
+    """
+    if SEARCH not in candidates or _FILE_ACTION_RE.search(text):
+        return None
+    if _QUESTION_START_RE.search(text) or text.rstrip().endswith("?"):
+        return SEARCH
+    return None
+
+
+def load_intents(path: Optional[str] = ROUTER_INTENTS_FILE,
+                 base: Optional[Dict[str, List[str]]] = None) -> Dict[str, List[str]]:
+    intents = dict(base if base is not None else DEFAULT_INTENTS)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            intents.update(json.load(f))
+    return intents
+
+
+def _load_classifier(spec: Optional[str]) -> Optional[Classifier]:
+    if not spec or spec.lower() == 'none':
+        return None
+    module_name, _, func_name = spec.partition(':')
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def build_router(intents: Optional[Dict[str, Iterable[str]]] = None,
+                 classifier: Optional[Classifier] = None) -> IntentRouter:
+    """Cria um roteador a partir das frases padrão, de ROUTER_INTENTS_FILE e de ROUTER_CLASSIFIER"""
+    return IntentRouter(
+        intents=intents or load_intents(),
+        classifier=classifier or _load_classifier(ROUTER_CLASSIFIER),
+    )
+
+
+_router: Optional[IntentRouter] = None
+
+
+def get_router() -> IntentRouter:
+    """Retorna o roteador compartilhado (criado na primeira chamada)"""
+    global _router
+    if _router is None:
+        _router = build_router()
+    return _router
@@ -1,9 +1,43 @@
 import os
 from pathlib import Path
+import httpx
 from google import genai
+from google.genai import types
 
 CONFIG_PATH = Path(__file__).parent.parent / 'file_store_config.json'
+REGISTRY_PATH = Path(os.getenv('REGISTRY_PATH', Path(__file__).parent.parent / 'file_store.db'))
 STORE_NAME = os.getenv('STORE_NAME')
 
 api_key = os.getenv('FILE_SEARCH_API_KEY') or os.getenv('GOOGLE_API_KEY')
-client = genai.Client(api_key=api_key)
+# Conexões HTTP mantidas abertas pelo cliente compartilhado (reaproveitadas entre chamadas)
+API_MAX_CONNECTIONS = int(os.getenv('API_MAX_CONNECTIONS', '20'))
+API_KEEPALIVE_EXPIRY = float(os.getenv('API_KEEPALIVE_EXPIRY', '60'))
+
+_client = None
+
+
+def get_client() -> genai.Client:
+    """
+    Retorna o cliente GenAI compartilhado, criado apenas na primeira chamada.
+
+    O pool de conexões do httpx é configurado explicitamente para manter até
+    API_MAX_CONNECTIONS conexões abertas, então chamadas seguidas não refazem o handshake TLS.
+    A quantidade de chamadas simultâneas é limitada antes, em `admission.py`.
+    """
+    global _client
+    if _client is None:
+        limits = httpx.Limits(max_connections=API_MAX_CONNECTIONS,
+                              max_keepalive_connections=API_MAX_CONNECTIONS,
+                              keepalive_expiry=API_KEEPALIVE_EXPIRY)
+        _client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(client_args={'limits': limits}, async_client_args={'limits': limits})
+        )
+    return _client
+
+
+def set_client(client):
+    """Substitui o cliente GenAI (e.g., por um cliente falso nos benchmarks)"""
+    global _client
+    _client = client
+
@@ -0,0 +1,153 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List, Tuple
+
+from rag_agent.tools import metrics
+
+# Chamadas simultâneas à API do Gemini neste processo
+API_MAX_CONCURRENCY = int(os.getenv('API_MAX_CONCURRENCY', '8'))
+# Vagas reservadas para chamadas interativas (busca); a indexação usa no máximo o restante
+API_INTERACTIVE_RESERVED = int(os.getenv('API_INTERACTIVE_RESERVED', '2'))
+# Requisições por segundo (token bucket); 0 desativa o limite
+API_RATE_LIMIT = float(os.getenv('API_RATE_LIMIT', '0'))
+API_RATE_BURST = int(os.getenv('API_RATE_BURST', '10'))
+# Requisições aguardando vaga, por prioridade; acima disso a chamada é recusada na hora
+API_MAX_QUEUE = int(os.getenv('API_MAX_QUEUE', '32'))
+
+INTERACTIVE = 0
+BACKGROUND = 1
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class AdmissionRejected(Exception):
+    """A fila de chamadas à API está cheia; o chamador deve responder 'busy' em vez de esperar"""
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdmissionController:
+    """
+    Controle de admissão das chamadas à API.
+
+    - Limita as chamadas simultâneas; vagas liberadas vão primeiro para chamadas interativas,
+      então uma busca passa na frente de uploads e polling que estejam aguardando
+    - A indexação nunca ocupa as vagas reservadas para chamadas interativas
+    - Com a fila da prioridade cheia, recusa imediatamente (AdmissionRejected)
+    - Opcionalmente aplica um token bucket (requisições por segundo) a quem recebe a vaga
+    """
+
+    def __init__(self, max_concurrency: int = API_MAX_CONCURRENCY,
+                 interactive_reserved: int = API_INTERACTIVE_RESERVED,
+                 rate: float = API_RATE_LIMIT, burst: int = API_RATE_BURST,
+                 max_queue: int = API_MAX_QUEUE):
+        self.max_concurrency = max(1, max_concurrency)
+        self.background_limit = max(1, self.max_concurrency - max(0, interactive_reserved))
+        self.max_queue = max_queue
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._queued = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._seq = itertools.count()
+
+    def _can_run(self, priority: int) -> bool:
+        limit = self.max_concurrency if priority == INTERACTIVE else self.background_limit
+        return self.in_flight < limit
+
+    def _wake(self):
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_run(priority):
+                break
+            heapq.heappop(self._waiters)
+            self.in_flight += 1
+            future.set_result(None)
+
+    async def _acquire(self, priority: int, fail_fast: bool):
+        if not self._waiters and self._can_run(priority):
+            self.in_flight += 1
+            return
+
+        if fail_fast and self._queued[priority] >= self.max_queue:
+            metrics.count("admission", priority=_PRIORITY_NAMES[priority], result="rejected")
+            raise AdmissionRejected(
+                f"Gemini API queue is full ({self._queued[priority]} {_PRIORITY_NAMES[priority]} "
+                f"request(s) waiting), try again shortly"
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._queued[priority] += 1
+        try:
+            self._wake()
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # A vaga foi concedida junto com o cancelamento, devolve
+                self._release()
+            raise
+        finally:
+            self._queued[priority] -= 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def admit(self, priority: int = INTERACTIVE, fail_fast: bool = True):
+        """
+        Ocupa uma vaga durante o bloco.
+
+        Args:
+            priority: INTERACTIVE (busca) ou BACKGROUND (indexação)
+            fail_fast: recusa quando a fila está cheia; use False em chamadas que não podem
+                ser abandonadas no meio (e.g., o polling de um upload já enviado)
+        """
+        with metrics.span(f"admission_wait_{_PRIORITY_NAMES[priority]}"):
+            await self._acquire(priority, fail_fast)
+            try:
+                if self.bucket is not None:
+                    await self.bucket.acquire()
+            except BaseException:
+                self._release()
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self):
+        return {"in_flight": self.in_flight,
+                "queued": {_PRIORITY_NAMES[p]: n for p, n in self._queued.items()}}
+
+
+admission = AdmissionController()
+
+
+def admit(priority: int = INTERACTIVE, fail_fast: bool = True):
+    return admission.admit(priority, fail_fast)
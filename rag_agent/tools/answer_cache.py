@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '512'))
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', '3600'))
+ANSWER_CACHE_DIR = os.getenv('ANSWER_CACHE_DIR')
+# Número máximo de entradas na camada em disco; as usadas há mais tempo saem primeiro
+ANSWER_CACHE_DISK_SIZE = int(os.getenv('ANSWER_CACHE_DISK_SIZE', '4096'))
+
+
+def normalize_query(query: str) -> str:
+    """Normaliza a pergunta para que variações de caixa e espaços caiam na mesma chave"""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+class AnswerCache:
+    """
+    Cache LRU de respostas do `search_documents`.
+
+    A chave combina a pergunta normalizada, o nome do store e a versão do corpus,
+    então respostas antigas deixam de ser usadas assim que um novo documento é indexado.
+    Opcionalmente mantém uma segunda camada em disco (um JSON por entrada) que
+    sobrevive a reinícios do processo, limitada a `disk_max_size` entradas: o mtime
+    do arquivo marca o último uso, e as entradas expiradas ou usadas há mais tempo
+    são removidas quando o limite é ultrapassado. A leitura, a escrita e a limpeza da
+    camada em disco rodam em uma thread (`asyncio.to_thread`), fora do event loop.
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 disk_dir: Optional[str] = ANSWER_CACHE_DIR, disk_max_size: int = ANSWER_CACHE_DISK_SIZE):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_size = max(1, disk_max_size)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_count = 0
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_count = sum(1 for _ in self.disk_dir.glob("*.json"))
+
+    @staticmethod
+    def make_key(query: str, store_name: str, version: str) -> str:
+        raw = f"{store_name}\x00{version}\x00{normalize_query(query)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, query: str, store_name: str, version: str) -> Optional[Dict[str, Any]]:
+        key = self.make_key(query, store_name, version)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                return entry[2]
+            if entry:
+                del self._entries[key]
+
+        if not self.disk_dir:
+            return None
+        value = await asyncio.to_thread(self._disk_get, key, store_name, now)
+        if value is None:
+            return None
+        with self._lock:
+            self._put_memory(key, value[0], store_name, value[1])
+        return value[1]
+
+    async def put(self, query: str, store_name: str, version: str, value: Dict[str, Any]):
+        key = self.make_key(query, store_name, version)
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, now, store_name, value)
+        if self.disk_dir:
+            await asyncio.to_thread(self._disk_put, key, now, store_name, value)
+
+    def invalidate(self, store_name: Optional[str] = None):
+        """
+        Remove as entradas de um store (ou todas), e.g., quando um store é recriado.
+
+        Indexar um documento não exige invalidar: a versão do corpus faz parte da chave.
+        """
+        with self._lock:
+            if store_name is None:
+                self._entries.clear()
+            else:
+                for key in [k for k, e in self._entries.items() if e[1] == store_name]:
+                    del self._entries[key]
+
+        if self.disk_dir:
+            # O prefixo do arquivo identifica o store, então não é preciso ler as entradas
+            pattern = "*.json" if store_name is None else f"{self._store_tag(store_name)}-*.json"
+            for path in self.disk_dir.glob(pattern):
+                path.unlink(missing_ok=True)
+            self._disk_count = sum(1 for _ in self.disk_dir.glob("*.json"))
+
+    def _put_memory(self, key: str, created_at: float, store_name: str, value: Dict[str, Any]):
+        self._entries[key] = (created_at, store_name, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _store_tag(store_name: str) -> str:
+        return hashlib.blake2b(store_name.encode("utf-8"), digest_size=4).hexdigest()
+
+    def _disk_path(self, key: str, store_name: str) -> Path:
+        return self.disk_dir / f"{self._store_tag(store_name)}-{key}.json"
+
+    def _disk_get(self, key: str, store_name: str, now: float):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key, store_name)
+        try:
+            record = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        if now - record["created_at"] > self.ttl:
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            # Marca o uso para a remoção das entradas usadas há mais tempo
+            os.utime(path)
+        except OSError:
+            pass
+        return record["created_at"], record["value"]
+
+    def _disk_put(self, key: str, created_at: float, store_name: str, value: Dict[str, Any]):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key, store_name)
+        tmp = path.with_suffix(".tmp")
+        try:
+            existed = path.exists()
+            tmp.write_text(json.dumps({"created_at": created_at, "store_name": store_name, "value": value}))
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[AnswerCache] Failed to write disk entry: {e}")
+            return
+        with self._lock:
+            if not existed:
+                self._disk_count += 1
+            prune = self._disk_count > self.disk_max_size
+        if prune:
+            self._disk_prune(time.time())
+
+    def _disk_prune(self, now: float):
+        """
+        Remove as entradas expiradas e as usadas há mais tempo até 90% do limite, para
+        que a varredura do diretório aconteça uma vez a cada várias escritas
+        """
+        entries = []
+        for path in self.disk_dir.glob("*.json"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        entries.sort()
+        target = int(self.disk_max_size * 0.9)
+        removed = 0
+        for mtime, path in entries:
+            if len(entries) - removed <= target and now - mtime <= self.ttl:
+                break
+            path.unlink(missing_ok=True)
+            removed += 1
+        with self._lock:
+            self._disk_count = len(entries) - removed
+
+
+answer_cache = AnswerCache()
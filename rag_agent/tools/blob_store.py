@@ -0,0 +1,87 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+BLOB_DIR = Path(os.getenv('BLOB_DIR', Path(__file__).parent.parent / 'blobs'))
+
+
+class BlobStore:
+    """
+    Armazenamento local endereçado por conteúdo: cada payload fica em `<root>/<2 hex>/<hash>`.
+
+    Como o nome é o próprio hash, gravar o mesmo conteúdo duas vezes não ocupa espaço extra
+    e o conteúdo de um arquivo nunca é modificado depois de escrito. O mtime marca o último
+    uso (gravação ou leitura), usado por `sweep` para apagar os blobs abandonados.
+    """
+
+    def __init__(self, root: Path = BLOB_DIR):
+        self.root = Path(root)
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def contains(self, digest: str) -> bool:
+        return self.path_for(digest).exists()
+
+    def put(self, digest: str, data: bytes) -> Path:
+        """Grava o payload (uma única vez); a escrita é atômica via arquivo temporário + rename"""
+        path = self.path_for(digest)
+        if path.exists():
+            self._touch(path)
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{digest}.")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        return path
+
+    def delete(self, digest: str):
+        self.path_for(digest).unlink(missing_ok=True)
+
+    def get(self, digest: str) -> Optional[bytes]:
+        path = self.path_for(digest)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        self._touch(path)
+        return data
+
+    def sweep(self, max_age: float, keep: Callable[[str], bool] = lambda digest: False) -> int:
+        """
+        Apaga os blobs sem uso há mais de `max_age` segundos (e temporários de escritas
+        interrompidas), exceto aqueles para os quais `keep(digest)` é verdadeiro.
+
+        Returns:
+            Quantidade de arquivos apagados
+        """
+        cutoff = time.time() - max_age
+        removed = 0
+        for path in self.root.glob('*/*'):
+            try:
+                if path.stat().st_mtime >= cutoff:
+                    continue
+                if not path.name.startswith('.') and keep(path.name):
+                    continue
+                path.unlink()
+                removed += 1
+            except OSError:
+                continue
+        return removed
+
+    @staticmethod
+    def _touch(path: Path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+blob_store = BlobStore()
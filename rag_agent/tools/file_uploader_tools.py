@@ -1,56 +1,23 @@
-import hashlib
-import json
+import asyncio
 import os
-import tempfile
-import time
-from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
-from google import genai
 from google.adk.tools import ToolContext, FunctionTool
 
-from rag_agent.tools import CONFIG_PATH, client, STORE_NAME, api_key
+from rag_agent.tools.index_jobs import TERMINAL_JOB_STATUSES, enqueue_document, job_summary
+from rag_agent.tools.metrics import span
+from rag_agent.tools.near_duplicates import NEAR_DUP_POLICY, near_duplicates
+from rag_agent.tools.pagination import TOOL_PAGE_SIZE, paginate, preview
+from rag_agent.tools.registry import registry
+from rag_agent.tools.retrieval import get_backend
+from rag_agent.tools.single_flight import index_flight
+from rag_agent.tools.upload_index import (
+    build_event_entries, content_digest, entry_key, filename_from_digest, find_entry,
+    get_upload_index, is_upload_part, load_upload, upload_index_delta,
+)
 
+INDEX_CONCURRENCY = int(os.getenv('INDEX_CONCURRENCY', '4'))
 
-def create_or_load_file_search_store():
-    """Cria um novo file store caso não exista um com a nomeclatura definida"""
-    file_search_store = None
-    for store in client.file_search_stores.list():
-        if store.display_name == STORE_NAME:
-            file_search_store = store
-            print(f"Found existing store at {file_search_store.name}")
-            print(f"Total docs: {file_search_store.active_documents_count}")
-            return file_search_store.name
-
-    if file_search_store is None:
-        print("Store not found. Creating new store...")
-        try:
-            # Create the store...
-            file_search_store = client.file_search_stores.create(config={'display_name': STORE_NAME})
-            print(f"Store created: {file_search_store.name}")
-        except Exception as e:
-            print(f"Error creating store: {e}")
-            return file_search_store.name
-    print(f"LOG FILE SEARCH: {file_search_store}")
-
-
-def load_or_create_config() -> Dict[str, Any]:
-    """Carrega a configuração caso exista, caso contrario cria uma nova"""
-
-    if CONFIG_PATH.exists():
-        with open(CONFIG_PATH, 'r') as f:
-            return json.load(f)
-
-    return {
-        'file_search_store_name': None,
-        'uploaded_files': []
-    }
-
-def save_config(config: Dict[str, Any]):
-    """Salva o estado da configuração no arquivo.
-    essa etapa é utilizada para evitar a re-indexação de arquivos"""
-    with open(CONFIG_PATH, 'w') as f:
-        json.dump(config, f, indent=2)
 
 def generate_filename_from_content(file_data: bytes, mime_type: str) -> str:
     """
@@ -65,85 +32,199 @@ def generate_filename_from_content(file_data: bytes, mime_type: str) -> str:
     Returns:
         A filename como "doc_a1b2c3d4e5f6.pdf"
     """
+    return filename_from_digest(content_digest(file_data), mime_type)
+
+
+async def _recent_uploads(tool_context: ToolContext, last_n: int = 5) -> List[Dict[str, Any]]:
+    """
+    Retorna as entradas do índice de uploads dos eventos mais recentes, do mais novo ao
+    mais antigo. O conteúdo não é carregado aqui, use `_load_entry` quando precisar dos bytes.
+
+    O hash normalmente já foi calculado pelo orquestrador quando o upload chegou; eventos
+    que ainda não estão no índice são processados aqui uma única vez e salvos no estado.
+    """
+    session = tool_context.session
+    if not (session and session.events):
+        return []
+
+    with span("session_scan"):
+        index = get_upload_index(tool_context.state)
+        added = {}
+        uploads = []
+        for event in reversed(session.events[-last_n:]):
+            if not (event.content and event.content.parts):
+                continue
+            for idx, part in enumerate(event.content.parts):
+                if not is_upload_part(part):
+                    continue
+                key = entry_key(event.id, idx)
+                if key not in index:
+                    entries = {k: v for k, v in (await build_event_entries(event)).items() if k not in index}
+                    index.update(entries)
+                    added.update(entries)
+                if key in index:
+                    uploads.append(index[key])
+
+    if added:
+        tool_context.state.update(upload_index_delta(added))
+    return uploads
+
+
+async def _load_entry(tool_context: ToolContext, entry: Dict[str, Any]):
+    """Carrega o conteúdo de um upload (histórico, blob local ou artefato)"""
+    with span("blob_load"):
+        return await load_upload(entry, tool_context.session, tool_context.load_artifact)
+
+
+async def _enqueue_file_data(file_data: bytes, mime_type: str, original_name: str,
+                             digest: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Gera o nome pelo conteúdo e enfileira a indexação no backend de busca (ver `index_jobs.py`).
+    O hash completo (`digest`) é calculado aqui se o upload ainda não estiver no índice da sessão.
+
+    Antes de enfileirar, procura quase-duplicados dos documentos já indexados (ver
+    `near_duplicates.py`) e aplica a NEAR_DUP_POLICY.
+
+    Returns:
+        Um dicionario com status ("queued", "already_indexed" ou "near_duplicate"), message,
+        filename, job_id e, para quase-duplicados, duplicate_of e similarity
+    """
+    if digest is None:
+        digest = await asyncio.to_thread(content_digest, file_data)
+    actual_filename = filename_from_digest(digest, mime_type)
+    print(f"[FileUpload] Generated filename from content: {actual_filename} (original: {original_name})")
 
-    content_hash = hashlib.md5(file_data).hexdigest()[:12]  # Use first 12 chars of MD5
-    ext_map = {
-        'application/pdf': 'pdf',
-        'application/msword': 'doc',
-        'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 'docx',
-        'text/plain': 'txt',
-        'text/markdown': 'md',
-        'image/png': 'png',
-        'image/jpeg': 'jpg',
-        'image/jpg': 'jpg',
+    if await asyncio.to_thread(registry.is_indexed, actual_filename):
+        return {
+            "status": "already_indexed",
+            "message": f"File '{actual_filename}' is already indexed (same content detected)",
+            "filename": actual_filename
+        }
+
+    print(f"[FileUpload] File size: {len(file_data)} bytes, MIME: {mime_type}")
+
+    async def enqueue():
+        near, signature = None, None
+        # Um job ativo para o mesmo conteúdo já passou pela verificação
+        if NEAR_DUP_POLICY != "off" and not await asyncio.to_thread(registry.active_job_filenames, [actual_filename]):
+            signature = await near_duplicates.signature(file_data, mime_type)
+            near = await near_duplicates.find(actual_filename, signature) if signature else None
+        # Só um documento já indexado pode ser substituído
+        if near and (NEAR_DUP_POLICY == "skip" or (NEAR_DUP_POLICY == "replace" and not near["indexed"])):
+            return None, near
+        replaces = near["filename"] if near and NEAR_DUP_POLICY == "replace" else None
+        job = await enqueue_document(actual_filename, file_data, mime_type, original_name, digest=digest)
+        if signature and job["created"]:
+            await near_duplicates.add(actual_filename, signature, original_name=original_name, replaces=replaces)
+        return job, near
+
+    # O mesmo conteúdo enviado em paralelo grava o blob e cria o job uma única vez
+    (job, near), shared = await index_flight.do(actual_filename, enqueue)
+    duplicate_of = near and (near["original_name"] or near["filename"])
+
+    if job is None:
+        message = f"'{original_name}' is a near-duplicate of '{duplicate_of}' (similarity {near['similarity']:.2f})"
+        if not near["indexed"]:
+            message += ", which is still being indexed"
+        return {
+            "status": "near_duplicate",
+            "message": message + ", not indexed",
+            "filename": actual_filename,
+            "duplicate_of": near["filename"],
+            "similarity": near["similarity"]
+        }
+
+    queued = "Queued" if job["created"] and not shared else "Already queued"
+    message = f"{queued} '{actual_filename}' for indexing (job {job['job_id']})"
+    if near:
+        message += f", near-duplicate of '{duplicate_of}' (similarity {near['similarity']:.2f})"
+        if NEAR_DUP_POLICY == "replace":
+            message += " which it will replace"
+
+    result = {
+        "status": "queued",
+        "message": message + ", use index_job_status to follow the progress",
+        "filename": actual_filename,
+        "job_id": job["job_id"]
     }
+    if near:
+        result["duplicate_of"] = near["filename"]
+        result["similarity"] = near["similarity"]
+    return result
 
 
-    if '/' in mime_type:
-        mime_ext = mime_type.split('/')[-1]
-        if mime_ext in ['pdf', 'png', 'jpg', 'jpeg', 'txt', 'md']:
-            ext = mime_ext
-        else:
-            ext = ext_map.get(mime_type, mime_ext)
-    else:
-        ext = ext_map.get(mime_type, 'bin')
+async def uploaded_file_list(tool_context: ToolContext, cursor: str = "") -> Dict[str, Any]:
+    """
+    Lista os arquivos carregados e quais ainda precisam ser indexados.
 
-    return f"doc_{content_hash}.{ext}"
+    A resposta traz as contagens e uma página de nomes em ordem alfabética (até TOOL_PAGE_SIZE),
+    com os não indexados da página em `not_indexed`; o tamanho não cresce com o corpus.
+
+    Args:
+        tool_context: o contexto da ferramenta
+        cursor: o next_cursor de uma resposta anterior; vazio para a primeira página
 
-async def uploaded_file_list(tool_context: ToolContext) -> Dict[str, Any]:
+    Returns:
+        Um dicionario contendo:
+        - status: "success" ou "error"
+        - message: Resumo da listagem
+        - counts: uploaded, not_indexed e indexed_total (documentos indexados no store)
+        - uploaded_files: a página de arquivos carregados
+        - not_indexed: os arquivos da página que ainda não estão indexados
+        - next_cursor: cursor da próxima página, ou None
+    """
     print(f"[FileUpload] ====== uploaded_file_list CALLED ======")
     try:
         uploaded_files = await tool_context.list_artifacts()
-        print(f"[FileUpload] {uploaded_files} uploaded files")
+        print(f"[FileUpload] {len(uploaded_files)} uploaded files")
         inline_uploads = []
 
-        if hasattr(tool_context, '_invocation_context'):
-            ctx = tool_context._invocation_context
-            if ctx and ctx.session and ctx.session.events:
-                for event in reversed(ctx.session.events[-5:]):  # Check last 5 events
-                    if event.content and event.content.parts:
-                        for idx, part in enumerate(event.content.parts):
-                            if part.inline_data:
-                                file_data = part.inline_data.data
-                                mime_type = part.inline_data.mime_type
-
-                                filename = generate_filename_from_content(file_data, mime_type)
-                                if filename not in inline_uploads:
-                                    inline_uploads.append(filename)
-                                    print(
-                                        f"[FileUpload] Found inline upload: {filename} ({mime_type}, {len(file_data)} bytes)")
-        # Combina o arquivo carregado aos previamente carregados
-        all_files = list(set(uploaded_files + inline_uploads))
-        print(f"[FileUpload] Total files available: {len(all_files)} - {all_files}")
-
+        for entry in await _recent_uploads(tool_context):
+            filename = entry["filename"]
+            if filename not in inline_uploads:
+                inline_uploads.append(filename)
+                print(f"[FileUpload] Found inline upload: {filename} ({entry['mime_type']}, {entry['size']} bytes)")
 
-        config = load_or_create_config()
-        indexed_files = config.get('uploaded_files', [])
+        # Combina o arquivo carregado aos previamente carregados
+        all_files = sorted(set(uploaded_files + inline_uploads))
+        print(f"[FileUpload] Total files available: {len(all_files)}")
 
-        # Localiza os arquivos que nao estao indexados ainda
-        not_indexed = [f for f in all_files if f not in indexed_files]
+        # Localiza os arquivos que nao estao indexados ainda. A paginação segue a ordem dos nomes,
+        # que não muda quando um arquivo é indexado entre uma página e outra
+        already_indexed = await asyncio.to_thread(registry.indexed_subset, all_files)
+        not_indexed = [f for f in all_files if f not in already_indexed]
+        page, next_cursor = paginate(all_files, cursor)
+        indexed_total = await asyncio.to_thread(registry.count)
 
         message = f"Found {len(all_files)} uploaded file(s)"
         if not_indexed:
-            message += f", {len(not_indexed)} need indexing: {', '.join(not_indexed)}"
-        if indexed_files:
-            message += f", {len(indexed_files)} already indexed"
+            message += f", {len(not_indexed)} need indexing: {preview(not_indexed)}"
+        if indexed_total:
+            message += f", {indexed_total} document(s) indexed in the store"
+        if next_cursor:
+            message += f", showing {len(page)} (more with cursor='{next_cursor}')"
 
         return {
             "status": "success",
-            "uploaded_files": all_files,
-            "indexed_files": indexed_files,
-            "not_indexed": not_indexed,
             "message": message,
-            "store_name": config.get('file_search_store_name')
+            "counts": {
+                "uploaded": len(all_files),
+                "not_indexed": len(not_indexed),
+                "indexed_total": indexed_total
+            },
+            "uploaded_files": page,
+            "not_indexed": [f for f in page if f not in already_indexed],
+            "next_cursor": next_cursor,
+            "store_name": get_backend().current_store()
         }
     except Exception as e:
         return {
             "status": "error",
             "message": f"Failed to list files: {str(e)}",
+            "counts": {},
             "uploaded_files": [],
-            "indexed_files": [],
-            "not_indexed": []
+            "not_indexed": [],
+            "next_cursor": None
         }
 
 async def index_uploaded_file(filename: str, tool_context: ToolContext) -> Dict[str, Any]:
@@ -151,7 +232,8 @@ async def index_uploaded_file(filename: str, tool_context: ToolContext) -> Dict[
     Indexa um arquivo carregado através da interface web do ADK.
 
     Esta ferramenta recebe um arquivo carregado pela interface web (armazenado como um artefato)
-    e o indexa no repositório de busca de arquivos para que possa ser pesquisado.
+    e enfileira a sua indexação no repositório de busca de arquivos. O retorno é imediato; o
+    andamento é consultado com `index_job_status`.
 
     Args:
         filename: o nome do arquivo feito upload (e.g., "document.pdf")
@@ -159,64 +241,58 @@ async def index_uploaded_file(filename: str, tool_context: ToolContext) -> Dict[
 
     Returns:
         Um dicionario contendo:
-        - status: "success" ou "error"
-        - message: Descrição do evento
-        - filename: o arquivo indexado
-        - store_name: O file search store
+        - status: "queued", "already_indexed", "near_duplicate" ou "error"
+        - message: Descrição do evento (e.g., "near-duplicate of X")
+        - filename: o arquivo enfileirado
+        - job_id: o job de indexação
+        - duplicate_of, similarity: o documento quase igual já indexado, quando houver
     """
 
     print(f"[FileUpload] ====== index_uploaded_file CALLED with filename='{filename}' ======")
 
     try:
 
-        if not api_key:
+        backend = get_backend()
+        if backend.ready_error():
             return {
                 "status": "error",
-                "message": "No API key found in environment",
+                "message": backend.ready_error(),
                 "filename": filename
             }
 
-        # Carrega a configuração previa do storage
-        config = load_or_create_config()
-        store_name = config.get('file_search_store_name')
-
-        # Cria o store caso não exista
-        if not store_name:
-            store_name = create_or_load_file_search_store()
-            config['file_search_store_name'] = store_name
-            config['uploaded_files'] = []
-            config['created_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
-            save_config(config)
-
-
-        print(f"[FileUpload] Loading artifact: {filename}")
-        artifact_part = await tool_context.load_artifact(filename)
-
         file_data = None
         mime_type = None
-
-        if artifact_part and artifact_part.inline_data:
-            # Found in artifact storage
-            file_data = artifact_part.inline_data.data
-            mime_type = artifact_part.inline_data.mime_type
-            print(f"[FileUpload] Loaded from artifact storage")
-        else:
-            print(f"[FileUpload] Not in storage, checking session history for inline uploads...")
-            if hasattr(tool_context, '_invocation_context'):
-                ctx = tool_context._invocation_context
-                if ctx and ctx.session and ctx.session.events:
-                    # Check recent events for inline_data
-                    for event in reversed(ctx.session.events[-5:]):
-                        if event.content and event.content.parts:
-                            for part in event.content.parts:
-                                if part.inline_data:
-                                    # Found inline data!
-                                    file_data = part.inline_data.data
-                                    mime_type = part.inline_data.mime_type
-                                    print(f"[FileUpload] Loaded from session inline_data: {mime_type}")
-                                    break
-                        if file_data:
-                            break
+        digest = None
+
+        # Uploads já registrados no índice dispensam recalcular o hash
+        entry = find_entry(tool_context.state, filename)
+        if entry:
+            blob = await _load_entry(tool_context, entry)
+            if blob:
+                file_data = blob.data
+                mime_type = blob.mime_type
+                digest = entry["digest"]
+                print(f"[FileUpload] Loaded from upload index: {entry['filename']}")
+
+        if not file_data:
+            print(f"[FileUpload] Loading artifact: {filename}")
+            with span("artifact_load"):
+                artifact_part = await tool_context.load_artifact(filename)
+
+            if artifact_part and artifact_part.inline_data:
+                # Found in artifact storage
+                file_data = artifact_part.inline_data.data
+                mime_type = artifact_part.inline_data.mime_type
+                print(f"[FileUpload] Loaded from artifact storage")
+            else:
+                print(f"[FileUpload] Not in storage, checking session history for inline uploads...")
+                uploads = await _recent_uploads(tool_context)
+                blob = await _load_entry(tool_context, uploads[0]) if uploads else None
+                if blob:
+                    file_data = blob.data
+                    mime_type = blob.mime_type
+                    digest = uploads[0]["digest"]
+                    print(f"[FileUpload] Loaded from session upload: {mime_type}")
 
         if not file_data or not mime_type:
             available = await tool_context.list_artifacts()
@@ -226,82 +302,191 @@ async def index_uploaded_file(filename: str, tool_context: ToolContext) -> Dict[
                 "filename": filename
             }
 
+        return await _enqueue_file_data(file_data, mime_type, filename, digest)
 
-        actual_filename = generate_filename_from_content(file_data, mime_type)
-        print(f"[FileUpload] Generated filename from content: {actual_filename} (original: {filename})")
-
-
-        if actual_filename in config.get('uploaded_files', []):
-            return {
-                "status": "already_indexed",
-                "message": f"File '{actual_filename}' is already indexed (same content detected)",
-                "filename": actual_filename,
-                "store_name": store_name
-            }
-
-        print(f"[FileUpload] File size: {len(file_data)} bytes, MIME: {mime_type}")
+    except Exception as e:
+        error_msg = f"Failed to index file: {str(e)}"
+        print(f"[FileUpload] Error: {error_msg}")
 
+        return {
+            "status": "error",
+            "message": error_msg,
+            "filename": filename
+        }
 
-        temp_dir = Path(tempfile.gettempdir()) / "rag_uploads"
-        temp_dir.mkdir(exist_ok=True)
-        temp_file = temp_dir / actual_filename
 
-        with open(temp_file, 'wb') as f:
-            f.write(file_data)
+async def index_pending_files(tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Enfileira de uma só vez a indexação de todos os arquivos carregados que ainda não estão indexados.
 
-        # Upload to file search store
-        client = genai.Client(api_key=api_key)
+    O hash dos arquivos é calculado em paralelo, limitado por INDEX_CONCURRENCY; o upload e o
+    polling ficam com os workers da fila (`index_jobs.py`). O andamento é consultado com
+    `index_job_status`.
 
-        print(f"[FileUpload] Uploading to store: {store_name}")
-        upload_op = client.file_search_stores.upload_to_file_search_store(
-            file_search_store_name=store_name,
-            file=str(temp_file)
-        )
+    Args:
+        tool_context: o contexto da ferramenta
 
+    Returns:
+        Um dicionario contendo:
+        - status: "success", "partial" ou "error"
+        - message: Resumo da operação
+        - counts: quantidade de arquivos pendentes, enfileirados, quase-duplicados e com falha
+        - results: o resultado de até TOOL_PAGE_SIZE arquivos (com o job_id dos enfileirados), falhas primeiro
+    """
 
-        timeout = 120  # 2 minutes
-        elapsed = 0
-        while not upload_op.done and elapsed < timeout:
-            time.sleep(3)
-            elapsed += 3
-            upload_op = client.operations.get(upload_op)
-            print(f"[FileUpload] Uploading... {elapsed}s")
+    print(f"[FileUpload] ====== index_pending_files CALLED ======")
 
-        if not upload_op.done:
+    try:
+        backend = get_backend()
+        if backend.ready_error():
             return {
                 "status": "error",
-                "message": f"Upload timed out after {timeout}s",
-                "filename": actual_filename
+                "message": backend.ready_error(),
+                "results": []
             }
 
-
-        config['uploaded_files'].append(actual_filename)
-        save_config(config)
-
-        # armazenando o estado do contexto
-        tool_context.state['last_indexed_file'] = actual_filename
-        tool_context.state['indexed_files'] = config['uploaded_files']
-
-        print(f"[FileUpload] Successfully indexed: {actual_filename}")
-
+        # Coleta os arquivos pendentes: artefatos salvos e uploads inline recentes
+        pending = []
+        artifacts = await tool_context.list_artifacts()
+        indexed_artifacts = await asyncio.to_thread(registry.indexed_subset, artifacts)
+        for name in artifacts:
+            if name in indexed_artifacts:
+                continue
+            with span("artifact_load"):
+                artifact_part = await tool_context.load_artifact(name)
+            if artifact_part and artifact_part.inline_data:
+                pending.append((name, artifact_part.inline_data.data, artifact_part.inline_data.mime_type))
+
+        semaphore = asyncio.Semaphore(max(1, INDEX_CONCURRENCY))
+
+        async def hash_one(name: str, file_data: bytes, mime_type: str):
+            async with semaphore:
+                return await asyncio.to_thread(content_digest, file_data)
+
+        digests = list(await asyncio.gather(*(hash_one(*item) for item in pending)))
+        names = [filename_from_digest(digest, mime_type) for digest, (_, _, mime_type) in zip(digests, pending)]
+
+        # Uploads da sessão já possuem o hash no índice; só os não indexados são carregados
+        entries = await _recent_uploads(tool_context)
+        indexed_uploads = await asyncio.to_thread(registry.indexed_subset, [entry["filename"] for entry in entries])
+        # Uploads movidos para artefatos já entraram na lista acima
+        entries = [entry for entry in entries
+                   if entry["filename"] not in indexed_uploads and entry["filename"] not in artifacts]
+        blobs = await asyncio.gather(*(_load_entry(tool_context, entry) for entry in entries))
+        for entry, blob in zip(entries, blobs):
+            if blob:
+                pending.append((entry.get("display_name") or entry["filename"], blob.data, blob.mime_type))
+                names.append(entry["filename"])
+                digests.append(entry["digest"])
+
+        # Uploads repetidos geram o mesmo nome, mantém apenas um por conteúdo
+        indexed_files = await asyncio.to_thread(registry.indexed_subset, names)
+        unique = {}
+        for actual_filename, digest, item in zip(names, digests, pending):
+            if actual_filename not in indexed_files:
+                unique.setdefault(actual_filename, (digest, *item))
+
+        async def enqueue_one(actual_filename: str, digest: str, name: str, file_data: bytes,
+                              mime_type: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await _enqueue_file_data(file_data, mime_type, name, digest)
+                except Exception as e:
+                    return {
+                        "status": "error",
+                        "message": f"Failed to queue file: {str(e)}",
+                        "filename": actual_filename
+                    }
+
+        results = await asyncio.gather(*(enqueue_one(actual, *item) for actual, item in unique.items()))
+
+        queued = [r["filename"] for r in results if r["status"] == "queued"]
+        failed = [r["filename"] for r in results if r["status"] == "error"]
+        near = [r for r in results if r["status"] == "near_duplicate"]
+
+        message = f"Queued {len(queued)} of {len(results)} pending file(s) for indexing"
+        if near:
+            message += f", {len(near)} skipped as near-duplicates of indexed documents"
+        if failed:
+            message += f", {len(failed)} failed: {preview(failed)}"
+        if queued:
+            message += ", use index_job_status to follow the progress"
+
+        print(f"[FileUpload] {message}")
+
+        # Falhas primeiro; com muitos arquivos, o detalhe fica limitado a uma página
+        results = sorted(results, key=lambda r: r["status"] != "error")
         return {
-            "status": "success",
-            "message": f"Successfully indexed '{actual_filename}' into the search store",
-            "filename": actual_filename,
-            "store_name": store_name,
-            "total_indexed": len(config['uploaded_files'])
+            "status": "partial" if failed and queued else ("error" if failed else "success"),
+            "message": message,
+            "counts": {"pending": len(results), "queued": len(queued), "near_duplicate": len(near),
+                       "failed": len(failed)},
+            "results": results[:TOOL_PAGE_SIZE]
         }
 
     except Exception as e:
-        error_msg = f"Failed to index file: {str(e)}"
+        error_msg = f"Failed to index pending files: {str(e)}"
         print(f"[FileUpload] Error: {error_msg}")
 
         return {
             "status": "error",
             "message": error_msg,
-            "filename": filename
+            "results": []
         }
 
 
+async def index_job_status(tool_context: ToolContext, job_id: str = "") -> Dict[str, Any]:
+    """
+    Consulta o andamento das indexações enfileiradas, sem aguardar a conclusão.
+
+    Args:
+        tool_context: o contexto da ferramenta
+        job_id: o job retornado por `index_uploaded_file` ou `index_pending_files`;
+            vazio para os jobs mais recentes
+
+    Returns:
+        Um dicionario contendo:
+        - status: "success" ou "error"
+        - message: Resumo do andamento
+        - jobs: os jobs consultados (status "queued", "polling", "success", "already_indexed" ou "error")
+        - counts: quantidade de jobs por status
+    """
+    print(f"[FileUpload] ====== index_job_status CALLED with job_id='{job_id}' ======")
+
+    if job_id:
+        job = await asyncio.to_thread(registry.get_job, job_id)
+        if job is None:
+            return {
+                "status": "error",
+                "message": f"Job '{job_id}' not found",
+                "jobs": [],
+                "counts": {}
+            }
+        jobs = [job]
+    else:
+        jobs = await asyncio.to_thread(registry.list_jobs)
+
+    counts = await asyncio.to_thread(registry.job_counts)
+    finished = [job["filename"] for job in jobs if job["status"] == "success"]
+    if finished:
+        tool_context.state['last_indexed_file'] = finished[0]
+        tool_context.state['indexed_count'] = await asyncio.to_thread(registry.count)
+
+    pending = sum(counts.get(status, 0) for status in ("queued", "polling"))
+    done = [job for job in jobs if job["status"] in TERMINAL_JOB_STATUSES]
+    message = f"{len(done)} of {len(jobs)} job(s) finished"
+    if pending:
+        message += f", {pending} still in progress"
+
+    return {
+        "status": "success",
+        "message": message,
+        "jobs": [job_summary(job) for job in jobs],
+        "counts": counts
+    }
+
+
 list_files_tool = FunctionTool(uploaded_file_list)
-index_file_tool = FunctionTool(index_uploaded_file)
\ No newline at end of file
+index_file_tool = FunctionTool(index_uploaded_file)
+index_pending_tool = FunctionTool(index_pending_files)
+job_status_tool = FunctionTool(index_job_status)
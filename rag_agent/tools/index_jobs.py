@@ -0,0 +1,355 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import errors
+
+from rag_agent.tools import retrieval
+from rag_agent.tools.admission import AdmissionRejected
+from rag_agent.tools.blob_store import blob_store
+from rag_agent.tools.metrics import count, span
+from rag_agent.tools.preprocess import get_preprocessor
+from rag_agent.tools.registry import digest_from_filename, registry
+from rag_agent.tools.upload_index import content_digest
+
+# Workers de indexação por processo; cada um executa um passo de um job por vez (upload ou polling)
+INDEX_WORKERS = int(os.getenv('INDEX_WORKERS', '4'))
+# Tentativas para falhas transitórias (rede, 429, 5xx, fila da API cheia) antes de marcar o job como erro
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BASE = float(os.getenv('JOB_RETRY_BASE', '2'))
+# O intervalo entre consultas à operação dobra a cada consulta, até este limite
+JOB_POLL_MAX_INTERVAL = float(os.getenv('JOB_POLL_MAX_INTERVAL', '60'))
+# Tempo máximo de processamento de um upload já enviado
+JOB_TIMEOUT = float(os.getenv('JOB_TIMEOUT', '3600'))
+# Reserva de um job por um worker, renovada enquanto o passo executa; se o processo parar,
+# outro worker retoma o job depois disso
+JOB_LEASE = float(os.getenv('JOB_LEASE', '120'))
+# Intervalo para procurar jobs criados por outros processos quando não há nada agendado
+JOB_IDLE_POLL = float(os.getenv('JOB_IDLE_POLL', '5'))
+
+TERMINAL_JOB_STATUSES = ('success', 'already_indexed', 'error')
+
+
+def is_transient(error: BaseException) -> bool:
+    """Falhas que valem uma nova tentativa: fila da API cheia, rede, timeout, 408/429 e 5xx"""
+    if isinstance(error, (AdmissionRejected, httpx.TransportError, asyncio.TimeoutError, errors.ServerError)):
+        return True
+    return isinstance(error, errors.ClientError) and error.code in (408, 429)
+
+
+def job_summary(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos de um job relevantes para o agente"""
+    summary = {
+        "job_id": job["job_id"],
+        "filename": job["filename"],
+        "original_name": job["original_name"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+    if job["status"] == "polling" and job["submitted_at"]:
+        summary["processing_seconds"] = round(time.time() - job["submitted_at"])
+    if job["error"]:
+        summary["error"] = job["error"]
+    return summary
+
+
+class IndexWorkerPool:
+    """
+    Workers que executam a fila de indexação persistida no registro (tabela `index_jobs`).
+
+    Cada job avança em passos curtos: o upload (status "queued") e as consultas à operação
+    (status "polling"). Entre um passo e outro o job volta para a fila com o horário da
+    próxima tentativa, então poucos workers acompanham muitos uploads em processamento.
+    O nome da operação fica salvo no job: após um reinício, o polling continua de onde parou.
+
+    O conteúdo dos documentos fica no armazenamento de blobs (`blob_store`), pelo hash, ou,
+    na ingestão de um diretório, é lido do arquivo de origem no momento do upload.
+    """
+
+    def __init__(self, workers: int = INDEX_WORKERS):
+        self.workers = max(1, workers)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._progress: Optional[asyncio.Condition] = None
+
+    def ensure_started(self):
+        """Inicia os workers no event loop atual, ou acorda os que já estão rodando nele"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and any(not task.done() for task in self._tasks):
+            self._wakeup.set()
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._progress = asyncio.Condition()
+        self._tasks = [loop.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Aguarda o job terminar; retorna o job (ainda ativo se o timeout for atingido)"""
+        self.ensure_started()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = await asyncio.to_thread(registry.get_job, job_id)
+            if job is None or job["status"] in TERMINAL_JOB_STATUSES:
+                return job
+            remaining = JOB_IDLE_POLL if deadline is None else min(JOB_IDLE_POLL, deadline - time.monotonic())
+            if remaining <= 0:
+                return job
+            async with self._progress:
+                try:
+                    await asyncio.wait_for(self._progress.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                job = await asyncio.to_thread(registry.claim_job, JOB_LEASE)
+            except Exception as e:
+                # e.g., banco bloqueado por outro processo; tenta de novo depois
+                print(f"[IndexJobs] Worker {index} could not claim a job: {e}")
+                await asyncio.sleep(JOB_IDLE_POLL)
+                continue
+            if job is None:
+                self._wakeup.clear()
+                next_due = await asyncio.to_thread(registry.next_job_due)
+                delay = JOB_IDLE_POLL if next_due is None else min(JOB_IDLE_POLL, max(0.0, next_due - time.time()))
+                # asyncio.wait em vez de wait_for: no Python 3.11, wait_for perde um cancelamento que
+                # chega junto com o evento, e o worker não pararia no fim do asyncio.run
+                wakeup = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait([wakeup], timeout=delay)
+                finally:
+                    wakeup.cancel()
+                continue
+
+            # Um upload grande (pré-processamento + envio) pode passar de JOB_LEASE: a reserva é
+            # renovada durante o passo para que outro worker não envie o mesmo job de novo
+            heartbeat = asyncio.ensure_future(self._renew_lease(job["job_id"]))
+            try:
+                await self.run_step(job)
+            finally:
+                heartbeat.cancel()
+            async with self._progress:
+                self._progress.notify_all()
+
+    @staticmethod
+    async def _renew_lease(job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE / 3)
+            try:
+                await asyncio.to_thread(registry.renew_lease, job_id, JOB_LEASE)
+            except Exception as e:
+                print(f"[IndexJobs] Could not renew the lease of job {job_id}: {e}")
+
+    async def run_step(self, job: Dict[str, Any]):
+        """Executa o próximo passo de um job reservado e grava o novo estado"""
+        try:
+            if job["status"] == "queued":
+                await self._upload(job)
+            else:
+                await self._poll(job)
+        except Exception as e:
+            attempts = job["attempts"] + 1
+            if is_transient(e) and attempts < JOB_MAX_ATTEMPTS:
+                delay = JOB_RETRY_BASE * 2 ** (attempts - 1)
+                print(f"[IndexJobs] Job {job['job_id']} failed ({e}), retrying in {delay:.0f}s")
+                count("index_job", result="retry")
+                await asyncio.to_thread(registry.update_job, job["job_id"], attempts=attempts, error=str(e),
+                                        next_attempt_at=time.time() + delay)
+            else:
+                print(f"[IndexJobs] Job {job['job_id']} failed: {e}")
+                count("index_job", result="error")
+                await asyncio.to_thread(registry.update_job, job["job_id"], status="error", attempts=attempts,
+                                        error=str(e))
+
+    async def _upload(self, job: Dict[str, Any]):
+        filename = job["filename"]
+        if await asyncio.to_thread(registry.is_indexed, filename):
+            await asyncio.to_thread(registry.update_job, job["job_id"], status="already_indexed", error=None)
+            await self._release_blob(job)
+            return
+
+        with span("blob_load"):
+            file_data = await asyncio.to_thread(self._load_content, job)
+        if file_data is None:
+            error = f"Content of '{filename}' not found"
+            if job["source_path"]:
+                error += f": '{job['source_path']}' changed or was removed since it was queued"
+            await asyncio.to_thread(registry.update_job, job["job_id"], status="error", error=error)
+            return
+
+        # O nome (e a deduplicação) vem do conteúdo original; só o que é enviado é reduzido
+        file_data, mime_type = await get_preprocessor().run(file_data, job["mime_type"])
+
+        backend = retrieval.get_backend()
+        store_name = await backend.store_for_document(filename)
+        print(f"[IndexJobs] Uploading {filename} to store: {store_name}")
+        upload = await backend.submit_document(filename, file_data, mime_type, store_name)
+
+        if upload["status"] == "error":
+            await asyncio.to_thread(registry.update_job, job["job_id"], status="error", error=upload["message"])
+        elif upload["status"] == "success":
+            await self._finish(job, upload["operation_name"], store_name, upload.get("document_name"))
+        else:
+            await asyncio.to_thread(registry.update_job, job["job_id"], status="polling",
+                                    operation_name=upload["operation_name"], store_name=store_name,
+                                    submitted_at=time.time(), polls=0, attempts=0, error=None,
+                                    next_attempt_at=time.time() + retrieval.UPLOAD_POLL_INTERVAL)
+
+    async def _poll(self, job: Dict[str, Any]):
+        operation = await retrieval.get_backend().check_operation(job["operation_name"])
+        if operation["error"]:
+            await asyncio.to_thread(registry.update_job, job["job_id"], status="error", error=operation["error"])
+            return
+        if operation["done"]:
+            await self._finish(job, job["operation_name"], job["store_name"], operation.get("document_name"))
+            return
+
+        elapsed = time.time() - job["submitted_at"]
+        if elapsed > JOB_TIMEOUT:
+            await asyncio.to_thread(registry.update_job, job["job_id"], status="error",
+                                    error=f"Upload still processing after {elapsed:.0f}s")
+            return
+        polls = job["polls"] + 1
+        interval = min(JOB_POLL_MAX_INTERVAL, retrieval.UPLOAD_POLL_INTERVAL * 2 ** polls)
+        print(f"[IndexJobs] {job['filename']} still processing ({elapsed:.0f}s), next check in {interval:.0f}s")
+        await asyncio.to_thread(registry.update_job, job["job_id"], polls=polls, attempts=0,
+                                next_attempt_at=time.time() + interval)
+
+    async def _finish(self, job: Dict[str, Any], operation_name: Optional[str], store_name: str,
+                      document_name: Optional[str] = None):
+        await asyncio.to_thread(
+            registry.add_document,
+            job["filename"],
+            original_name=job["original_name"],
+            mime_type=job["mime_type"],
+            size_bytes=job["size_bytes"],
+            operation_name=operation_name,
+            store_name=store_name,
+            document_name=document_name
+        )
+        await asyncio.to_thread(registry.update_job, job["job_id"], status="success",
+                                operation_name=operation_name, store_name=store_name, error=None)
+        replaced = await asyncio.to_thread(registry.take_replacement, job["filename"])
+        if replaced:
+            await self._remove_replaced(replaced)
+        await self._release_blob(job)
+        count("index_job", result="success")
+        print(f"[IndexJobs] Successfully indexed: {job['filename']}")
+
+    @classmethod
+    def _load_content(cls, job: Dict[str, Any]) -> Optional[bytes]:
+        """Lê o conteúdo do arquivo de origem (se ainda for o mesmo que foi enfileirado) ou do blob"""
+        digest = cls._digest(job)
+        if job["source_path"]:
+            try:
+                file_data = Path(job["source_path"]).read_bytes()
+            except OSError:
+                file_data = None
+            if file_data is not None and content_digest(file_data) == digest:
+                return file_data
+        return blob_store.get(digest)
+
+    @staticmethod
+    def _digest(job: Dict[str, Any]) -> str:
+        # Jobs criados antes da coluna `digest` guardaram o conteúdo pelo prefixo do nome
+        return job["digest"] or digest_from_filename(job["filename"])
+
+    async def _release_blob(self, job: Dict[str, Any]):
+        """
+        Apaga o blob gravado para o job quando o documento já está indexado. Jobs com erro
+        mantêm o blob, para uma nova tentativa.
+        """
+        if not job["owns_blob"]:
+            return
+        digest = self._digest(job)
+        # O mesmo conteúdo com outro mime type gera outro nome e pode estar em outro job
+        if await asyncio.to_thread(registry.digest_in_use, digest, job["job_id"]):
+            return
+        await asyncio.to_thread(blob_store.delete, digest)
+
+    async def _remove_replaced(self, filename: str):
+        """Remove o quase-duplicado substituído pelo documento recém-indexado (NEAR_DUP_POLICY=replace)"""
+        document = await asyncio.to_thread(registry.get_document, filename)
+        if document is None:
+            return
+        try:
+            removed = await retrieval.get_backend().delete_document(document)
+        except Exception as e:
+            print(f"[IndexJobs] Could not remove replaced document {filename}: {e}")
+            removed = False
+        if removed:
+            await asyncio.to_thread(registry.remove_document, filename)
+            count("near_duplicate", result="replaced")
+            print(f"[IndexJobs] Removed {filename}, replaced by a newer version")
+        else:
+            # O documento continua no store, então continua registrado
+            print(f"[IndexJobs] Replaced document {filename} was kept (the backend could not delete it)")
+
+
+index_workers = IndexWorkerPool()
+
+
+async def enqueue_document(filename: str, file_data: bytes, mime_type: str, original_name: Optional[str] = None,
+                           digest: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Guarda o conteúdo no armazenamento de blobs e enfileira a indexação.
+
+    Args:
+        digest: o hash completo do conteúdo (`content_digest`), calculado aqui se não for informado
+
+    Returns:
+        O job criado, ou o job ativo que já existia para o mesmo conteúdo (`created` = False)
+    """
+    if digest is None:
+        digest = await asyncio.to_thread(content_digest, file_data)
+    # Um blob que já existia pertence a outro dono (e.g., o upload da sessão em `upload_spill.py`)
+    owns_blob = not await asyncio.to_thread(blob_store.contains, digest)
+    await asyncio.to_thread(blob_store.put, digest, file_data)
+    job = await enqueue_stored(filename, digest, mime_type, len(file_data), original_name, owns_blob=owns_blob)
+    if not job["created"]:
+        # O job da ingestão que já estava ativo lê o arquivo de origem; o blob ficaria sem dono
+        if owns_blob and job["source_path"]:
+            await asyncio.to_thread(blob_store.delete, digest)
+    elif not await asyncio.to_thread(blob_store.contains, digest):
+        # Um job concluído com o mesmo conteúdo pode ter apagado o blob entre o `put` e o enfileiramento
+        await asyncio.to_thread(blob_store.put, digest, file_data)
+    return job
+
+
+async def enqueue_stored(filename: str, digest: str, mime_type: str, size_bytes: int,
+                         original_name: Optional[str] = None, owns_blob: bool = False,
+                         source_path: Optional[str] = None, start_workers: bool = True) -> Dict[str, Any]:
+    """
+    Enfileira a indexação de um documento cujo conteúdo já está no armazenamento de blobs, pelo
+    hash, ou no arquivo local `source_path`. Com `owns_blob`, o blob é apagado quando o documento
+    fica indexado.
+
+    Args:
+        start_workers: se False, só grava o job; os workers de outro processo (ou de uma
+            execução seguinte) fazem o upload
+    """
+    job = await asyncio.to_thread(registry.enqueue_job, filename, digest=digest, original_name=original_name,
+                                  mime_type=mime_type, size_bytes=size_bytes, owns_blob=owns_blob,
+                                  source_path=source_path)
+    if start_workers:
+        index_workers.ensure_started()
+    return job
+
+
+class IndexWorkerPlugin(BasePlugin):
+    """Inicia os workers a cada execução, retomando os jobs pendentes após um reinício"""
+
+    def __init__(self, name: str = "index_workers"):
+        super().__init__(name=name)
+
+    async def before_run_callback(self, *, invocation_context):
+        index_workers.ensure_started()
+        return None
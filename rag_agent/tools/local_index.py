@@ -0,0 +1,286 @@
+import asyncio
+import hashlib
+import importlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from rag_agent.tools.retrieval import RetrievalBackend
+
+LOCAL_INDEX_DIR = Path(os.getenv('LOCAL_INDEX_DIR', Path(__file__).parent.parent / 'local_index'))
+# Função de embedding alternativa no formato "modulo:funcao", recebe List[str] e retorna uma matriz (n, dim)
+LOCAL_EMBEDDING_FN = os.getenv('LOCAL_EMBEDDING_FN')
+LOCAL_EMBEDDING_DIM = int(os.getenv('LOCAL_EMBEDDING_DIM', '256'))
+LOCAL_CHUNK_WORDS = int(os.getenv('LOCAL_CHUNK_WORDS', '200'))
+LOCAL_CHUNK_OVERLAP = int(os.getenv('LOCAL_CHUNK_OVERLAP', '40'))
+LOCAL_TOP_K = int(os.getenv('LOCAL_TOP_K', '4'))
+# Peso do score denso (cosseno) em relação ao BM25 na pontuação final
+LOCAL_DENSE_WEIGHT = float(os.getenv('LOCAL_DENSE_WEIGHT', '0.5'))
+# Trechos com score final abaixo disso não entram na resposta
+LOCAL_MIN_SCORE = float(os.getenv('LOCAL_MIN_SCORE', '0.1'))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+TEXT_MIME_TYPES = {'application/json', 'application/xml', 'application/x-yaml', 'text/markdown'}
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def chunk_text(text: str, size: int = LOCAL_CHUNK_WORDS, overlap: int = LOCAL_CHUNK_OVERLAP) -> List[str]:
+    """Divide o texto em janelas de `size` palavras com `overlap` palavras de sobreposição"""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, size - overlap)
+    return [" ".join(words[i:i + size]) for i in range(0, max(len(words) - overlap, 1), step)]
+
+
+def extract_text(file_data: bytes, mime_type: str) -> Optional[str]:
+    """Extrai o texto de documentos textuais; retorna None para formatos não suportados"""
+    if mime_type.startswith('text/') or mime_type in TEXT_MIME_TYPES:
+        return file_data.decode('utf-8', errors='replace')
+    return None
+
+
+@lru_cache(maxsize=65536)
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def hashing_embedding(texts: List[str], dim: int = LOCAL_EMBEDDING_DIM):
+    """
+    Embedding determinístico por feature hashing de tokens e bigramas.
+
+    Não depende de modelo nem de rede, então serve para testes e instalações offline.
+    Os vetores são normalizados (L2), então o produto interno é o cosseno.
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        features = Counter(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+        for feature, count in features.items():
+            h = _feature_hash(feature)
+            matrix[row, h % dim] += (1.0 if h >> 63 else -1.0) * (1.0 + math.log(count))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _load_embedding_fn(spec: Optional[str]) -> Callable:
+    if not spec:
+        return hashing_embedding
+    module_name, _, func_name = spec.partition(':')
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+class LocalIndex:
+    """
+    Índice híbrido em processo: BM25 sobre um índice invertido e cosseno sobre uma matriz densa.
+
+    Persistência em `index_dir`:
+    - chunks.jsonl: um trecho por linha (documento e texto), apenas acrescentado
+    - embeddings.f32: matriz float32 (linhas na mesma ordem), lida via memória mapeada
+    - meta.json: dimensão dos embeddings
+    """
+
+    def __init__(self, index_dir: Path, embed_fn: Callable):
+        self.index_dir = Path(index_dir)
+        self.embed_fn = embed_fn
+        self.chunks: List[Dict[str, Any]] = []
+        self.documents = set()
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+        self.dim: Optional[int] = None
+        self.embeddings = None
+        self._lock = threading.RLock()
+        self._load()
+
+    @property
+    def _chunks_path(self) -> Path:
+        return self.index_dir / 'chunks.jsonl'
+
+    @property
+    def _embeddings_path(self) -> Path:
+        return self.index_dir / 'embeddings.f32'
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.index_dir / 'meta.json'
+
+    def _load(self):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        if self._meta_path.exists():
+            self.dim = json.loads(self._meta_path.read_text())['dim']
+
+        chunks = []
+        if self._chunks_path.exists():
+            with open(self._chunks_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        chunks.append(json.loads(line))
+
+        rows = 0
+        if self.dim and self._embeddings_path.exists():
+            rows = self._embeddings_path.stat().st_size // (4 * self.dim)
+
+        # Uma escrita interrompida pode deixar os dois arquivos com tamanhos diferentes,
+        # trunca ambos no menor para manter as linhas alinhadas nas próximas inclusões
+        valid = min(rows, len(chunks))
+        if rows != valid:
+            with open(self._embeddings_path, 'r+b') as f:
+                f.truncate(valid * 4 * self.dim)
+        if len(chunks) != valid:
+            with open(self._chunks_path, 'w', encoding='utf-8') as f:
+                for chunk in chunks[:valid]:
+                    f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+
+        for chunk in chunks[:valid]:
+            self._add_to_inverted_index(chunk)
+        self._remap()
+
+    def _remap(self):
+        rows = len(self.chunks)
+        if rows and self.dim:
+            self.embeddings = np.memmap(self._embeddings_path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+        else:
+            self.embeddings = None
+
+    def _add_to_inverted_index(self, chunk: Dict[str, Any]):
+        chunk_id = len(self.chunks)
+        tokens = tokenize(chunk['text'])
+        for term, tf in Counter(tokens).items():
+            self.postings[term][chunk_id] = tf
+        self.chunks.append(chunk)
+        self.documents.add(chunk['filename'])
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+
+    def has_document(self, filename: str) -> bool:
+        return filename in self.documents
+
+    def add(self, filename: str, texts: List[str]) -> int:
+        if not texts:
+            return 0
+        vectors = np.asarray(self.embed_fn(texts), dtype=np.float32)
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._meta_path.write_text(json.dumps({'dim': self.dim}))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+            with open(self._embeddings_path, 'ab') as f:
+                f.write(vectors.tobytes())
+            new_chunks = [{'filename': filename, 'text': text} for text in texts]
+            with open(self._chunks_path, 'a', encoding='utf-8') as f:
+                for chunk in new_chunks:
+                    f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+
+            for chunk in new_chunks:
+                self._add_to_inverted_index(chunk)
+            self._remap()
+        return len(texts)
+
+    def _bm25_scores(self, query_terms: List[str]):
+        n = len(self.chunks)
+        scores = np.zeros(n, dtype=np.float32)
+        avg_length = self.total_length / n if n else 0.0
+        lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        for term in set(query_terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            ids = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            tfs = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ids] / (avg_length or 1.0))
+            scores[ids] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = LOCAL_TOP_K) -> List[Dict[str, Any]]:
+        with self._lock:
+            if not self.chunks:
+                return []
+            bm25 = self._bm25_scores(tokenize(query))
+            if bm25.max() > 0:
+                bm25 = bm25 / bm25.max()
+
+            query_vector = np.asarray(self.embed_fn([query]), dtype=np.float32)[0]
+            dense = np.clip(np.asarray(self.embeddings) @ query_vector, 0.0, None)
+
+            scores = (1 - LOCAL_DENSE_WEIGHT) * bm25 + LOCAL_DENSE_WEIGHT * dense
+            k = min(top_k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {**self.chunks[i], 'score': float(scores[i])}
+                for i in top if scores[i] >= LOCAL_MIN_SCORE
+            ]
+
+
+class LocalBackend(RetrievalBackend):
+    """
+    Backend de busca local, sem chamadas remotas.
+
+    A resposta é extrativa: os trechos mais relevantes, na ordem do score, no mesmo
+    formato {"answer", "sources"} do backend FileSearch.
+    """
+
+    name = "local"
+
+    def __init__(self, index_dir: Path = LOCAL_INDEX_DIR, embed_fn: Optional[Callable] = None):
+        if np is None:
+            raise ImportError("The local retrieval backend requires numpy (pip install numpy)")
+        self.index = LocalIndex(index_dir, embed_fn or _load_embedding_fn(LOCAL_EMBEDDING_FN))
+
+    def current_store(self) -> Optional[str]:
+        return f"local:{self.index.index_dir}"
+
+    async def ensure_store(self) -> str:
+        return self.current_store()
+
+    async def submit_document(self, filename: str, file_data: bytes, mime_type: str,
+                              store_name: str) -> Dict[str, Any]:
+        text = extract_text(file_data, mime_type)
+        if text is None:
+            return {
+                "status": "error",
+                "message": f"MIME type '{mime_type}' is not supported by the local backend",
+                "operation_name": None
+            }
+        if self.index.has_document(filename):
+            return {"status": "success", "message": f"'{filename}' already in local index", "operation_name": None}
+
+        chunks = chunk_text(text)
+        added = await asyncio.to_thread(self.index.add, filename, chunks)
+        return {
+            "status": "success",
+            "message": f"Indexed {added} chunk(s) of '{filename}'",
+            "operation_name": None
+        }
+
+    async def search(self, query: str, store_name: str,
+                     system_instruction: Optional[str] = None) -> Dict[str, Any]:
+        hits = await asyncio.to_thread(self.index.search, query)
+        return {
+            "answer": "\n\n".join(hit['text'] for hit in hits),
+            "sources": list(dict.fromkeys(hit['filename'] for hit in hits)),
+            "grounding_metadata": None
+        }
@@ -0,0 +1,190 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+
+METRICS_PORT = os.getenv('METRICS_PORT')
+
+# Limites dos buckets, em segundos (do hashing de arquivos pequenos ao polling de uploads longos)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> _LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label_value(value: str) -> str:
+    """Escapes exigidos pelo formato de texto do Prometheus: barra invertida, aspas e quebra de linha"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: _LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[_LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Valores por label, com as chaves no formato do Prometheus (e.g., '{event="route"}')"""
+        with self._lock:
+            return {_format_labels(key): value for key, value in sorted(self._values.items())}
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}_total{_format_labels(key)} {value}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        # por label: (contagem por bucket, soma, contagem total)
+        self._values: Dict[_LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if idx < len(self.buckets):
+                entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Contagem e soma (em segundos) por label, sem os buckets"""
+        with self._lock:
+            return {_format_labels(key): {"count": count, "total_s": total}
+                    for key, (_, total, count) in sorted(self._values.items())}
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(bound)))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return "\n".join(lines)
+
+
+stage_duration = Histogram('rag_stage_duration_seconds', 'Duration of each RAG pipeline stage')
+stage_errors = Counter('rag_stage_errors', 'Stages that raised an exception')
+events = Counter('rag_events', 'Pipeline events (routes, cache hits, uploads...)')
+
+_REGISTERED = [stage_duration, stage_errors, events]
+
+# Tempos da invocação atual: {stage: [contagem, segundos]}
+_invocation_timings: ContextVar[Optional[Dict[str, list]]] = ContextVar('rag_invocation_timings', default=None)
+
+
+def record(stage: str, seconds: float):
+    """Registra uma duração já medida (e.g., somada ao longo de um streaming)"""
+    stage_duration.observe(seconds, stage=stage)
+    timings = _invocation_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(stage, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Mede a duração de um estágio, registrando no histograma e no resumo da invocação atual.
+
+    Funciona tanto em código síncrono quanto dentro de corrotinas (`with span(...)`).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+def count(name: str, **labels):
+    events.inc(event=name, **labels)
+
+
+def start_invocation():
+    """Inicia um novo resumo de tempos para a invocação (contexto) atual"""
+    _invocation_timings.set({})
+
+
+def invocation_summary() -> Dict[str, Dict[str, float]]:
+    timings = _invocation_timings.get() or {}
+    return {
+        stage: {"count": entry[0], "total_ms": round(entry[1] * 1000, 3)}
+        for stage, entry in timings.items()
+    }
+
+
+def render_prometheus() -> str:
+    """Exporta todas as métricas no formato texto do Prometheus"""
+    return "\n".join(metric.render() for metric in _REGISTERED) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """Serve `/metrics` em uma thread em segundo plano (uma única vez por processo)"""
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_server.serve_forever, name='rag-metrics', daemon=True).start()
+        print(f"[Metrics] Serving Prometheus metrics on http://{host}:{port}/metrics")
+    return _server
@@ -0,0 +1,162 @@
+import array
+import asyncio
+import hashlib
+import os
+import random
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from rag_agent.tools.metrics import count, span
+from rag_agent.tools.preprocess import DOCX_MIME, PdfReader, document_text, get_preprocessor
+from rag_agent.tools.registry import registry
+
+# O que fazer com um quase-duplicado de um documento indexado:
+# "index" indexa os dois e só sinaliza, "replace" indexa e remove o anterior, "skip" não indexa,
+# "off" desativa a detecção. O padrão não perde nada: uma versão revisada (e.g., um contrato
+# corrigido) com similaridade acima do limiar seria descartada com "skip"
+NEAR_DUP_POLICY = os.getenv('NEAR_DUP_POLICY', 'index').lower()
+# Similaridade de Jaccard estimada (shingles de palavras) a partir da qual um documento é quase-duplicado
+NEAR_DUP_THRESHOLD = float(os.getenv('NEAR_DUP_THRESHOLD', '0.9'))
+NEAR_DUP_SHINGLE_WORDS = int(os.getenv('NEAR_DUP_SHINGLE_WORDS', '5'))
+# Textos com menos shingles que isso não são comparados (pouco texto para uma estimativa confiável)
+NEAR_DUP_MIN_SHINGLES = int(os.getenv('NEAR_DUP_MIN_SHINGLES', '20'))
+
+# 128 permutações em 32 bandas de 4 linhas: pares com similaridade acima de ~0.6 quase
+# sempre caem juntos em algum bucket, e o limiar acima é conferido na assinatura completa
+NUM_PERMUTATIONS = 128
+BANDS = 32
+ROWS = NUM_PERMUTATIONS // BANDS
+# Primo de Mersenne 2^31 - 1: (a * x + b) cabe em 64 bits para hashes de 32 bits
+PRIME = (1 << 31) - 1
+
+_rng = random.Random(20240601)
+_A = [_rng.randrange(1, PRIME) for _ in range(NUM_PERMUTATIONS)]
+_B = [_rng.randrange(0, PRIME) for _ in range(NUM_PERMUTATIONS)]
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = NEAR_DUP_SHINGLE_WORDS) -> List[int]:
+    """Hashes de 32 bits das sequências de `size` palavras, sem repetições"""
+    words = _WORD_RE.findall(text.casefold())
+    if len(words) < size:
+        return []
+    return list({
+        int.from_bytes(hashlib.blake2b(' '.join(words[i:i + size]).encode('utf-8'), digest_size=4).digest(), 'little')
+        for i in range(len(words) - size + 1)
+    })
+
+
+def minhash(values: List[int]) -> List[int]:
+    """Assinatura MinHash: o menor (a * x + b) mod PRIME de cada permutação"""
+    if np is not None:
+        a = np.asarray(_A, dtype=np.uint64)[None, :]
+        b = np.asarray(_B, dtype=np.uint64)[None, :]
+        result = np.full(NUM_PERMUTATIONS, PRIME, dtype=np.uint64)
+        # Em blocos, para não montar uma matriz (shingles x permutações) inteira em memória
+        for start in range(0, len(values), 8192):
+            x = np.asarray(values[start:start + 8192], dtype=np.uint64)[:, None]
+            result = np.minimum(result, ((a * x + b) % PRIME).min(axis=0))
+        return result.tolist()
+    return [min((a * x + b) % PRIME for x in values) for a, b in zip(_A, _B)]
+
+
+def lsh_buckets(signature: List[int]) -> List[Tuple[int, int]]:
+    """(banda, bucket) de cada banda: documentos com uma banda idêntica são candidatos"""
+    buckets = []
+    for band in range(BANDS):
+        rows = array.array('I', signature[band * ROWS:(band + 1) * ROWS]).tobytes()
+        bucket = int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), 'little', signed=True)
+        buckets.append((band, bucket))
+    return buckets
+
+
+def similarity(signature: List[int], other: List[int]) -> float:
+    """Similaridade de Jaccard estimada: fração das permutações com o mesmo mínimo"""
+    return sum(1 for x, y in zip(signature, other) if x == y) / NUM_PERMUTATIONS
+
+
+def may_have_text(file_data: bytes, mime_type: str) -> bool:
+    """
+    Verificação barata, antes de usar o pool: tipos sem extração de texto (e.g., imagens), PDFs
+    sem o `pypdf` instalado e conteúdos sem a assinatura do formato não têm assinatura
+    """
+    mime_type = (mime_type or '').lower()
+    if mime_type == 'application/pdf':
+        return PdfReader is not None and b'%PDF-' in file_data[:1024]
+    if mime_type == DOCX_MIME:
+        return file_data[:4] == b'PK\x03\x04'
+    return mime_type.startswith('text/')
+
+
+def compute_signature(file_data: bytes, mime_type: str) -> Optional[List[int]]:
+    """Executado no pool de processos: extrai o texto e calcula a assinatura (None sem texto suficiente)"""
+    text = document_text(file_data, mime_type)
+    if not text:
+        return None
+    values = shingles(text)
+    if len(values) < NEAR_DUP_MIN_SHINGLES:
+        return None
+    return minhash(values)
+
+
+def _pack(signature: List[int]) -> bytes:
+    return array.array('I', signature).tobytes()
+
+
+def _unpack(data: bytes) -> List[int]:
+    return array.array('I', data).tolist()
+
+
+class NearDuplicateIndex:
+    """
+    Índice de quase-duplicados por MinHash/LSH, guardado no registro (tabelas `near_dup_*`).
+
+    A deduplicação exata continua sendo o nome pelo hash do conteúdo; este índice encontra
+    versões quase iguais (e.g., um PDF exportado de novo com outra data). A busca consulta
+    apenas os buckets da assinatura, então não cresce com o corpus.
+    """
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD):
+        self.threshold = threshold
+
+    async def signature(self, file_data: bytes, mime_type: str) -> Optional[List[int]]:
+        """Assinatura do documento, ou None para tipos sem texto (e.g., imagens) e falhas de extração"""
+        if not may_have_text(file_data, mime_type):
+            count("near_duplicate", result="no_text")
+            return None
+        try:
+            with span("near_dup_signature"):
+                return await get_preprocessor().call(compute_signature, file_data, mime_type)
+        except Exception as e:
+            print(f"[NearDup] Could not compute signature ({mime_type}): {e}")
+            return None
+
+    async def find(self, filename: str, signature: List[int]) -> Optional[Dict[str, Any]]:
+        """O documento mais parecido acima do limiar: {"filename", "original_name", "similarity", "indexed"}"""
+        best = None
+        candidates = await asyncio.to_thread(registry.near_dup_candidates, filename, lsh_buckets(signature))
+        for candidate in candidates:
+            score = similarity(signature, _unpack(candidate["signature"]))
+            if score >= self.threshold and (best is None or score > best["similarity"]):
+                best = {
+                    "filename": candidate["filename"],
+                    "original_name": candidate["original_name"],
+                    "similarity": round(score, 3),
+                    "indexed": bool(candidate["indexed"]),
+                }
+        count("near_duplicate", result="match" if best else "unique")
+        return best
+
+    async def add(self, filename: str, signature: List[int], original_name: Optional[str] = None,
+                  replaces: Optional[str] = None):
+        await asyncio.to_thread(registry.save_signature, filename, _pack(signature), lsh_buckets(signature),
+                                original_name=original_name, replaces=replaces)
+
+
+near_duplicates = NearDuplicateIndex()
@@ -0,0 +1,27 @@
+import bisect
+import os
+from typing import List, Optional, Sequence, Tuple
+
+# Itens por página nas respostas das tools; o restante é obtido com o cursor
+TOOL_PAGE_SIZE = int(os.getenv('TOOL_PAGE_SIZE', '50'))
+
+def paginate(items: Sequence[str], cursor: str = "", page_size: int = TOOL_PAGE_SIZE) -> Tuple[List[str], Optional[str]]:
+    """
+    Retorna uma página de `items` (em ordem crescente) depois do cursor e o cursor da próxima página.
+
+    O cursor é o último item da página anterior, não uma posição: itens que entram ou saem
+    da lista entre duas chamadas não fazem a paginação pular nem repetir os demais. Um
+    cursor vazio começa do início; o próximo cursor é None na última página.
+    """
+    start = bisect.bisect_right(items, cursor) if cursor else 0
+    end = start + max(1, page_size)
+    page = list(items[start:end])
+    return page, (page[-1] if end < len(items) else None)
+
+
+def preview(names: Sequence[str], limit: int = 5) -> str:
+    """Lista curta de nomes para mensagens (e.g., a.pdf, b.pdf and 3 more)"""
+    shown = ', '.join(names[:limit])
+    if len(names) > limit:
+        shown += f" and {len(names) - limit} more"
+    return shown
@@ -0,0 +1,220 @@
+import asyncio
+import io
+import os
+import re
+import unicodedata
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from xml.etree import ElementTree
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from rag_agent.tools.metrics import count, span
+
+# Ação por mime type no formato "mime=acao,..." (aceita "image/*"); vazio envia os arquivos
+# sem alteração. Ações: extract_text, downscale, normalize, none
+PREPROCESS_POLICY = os.getenv('PREPROCESS_POLICY', '')
+# Processos para o pré-processamento; 0 usa a quantidade de CPUs
+PREPROCESS_WORKERS = int(os.getenv('PREPROCESS_WORKERS', '0'))
+# Payloads menores que isso são processados em uma thread (o pool não compensa), nunca no event loop
+PREPROCESS_INLINE_BYTES = int(os.getenv('PREPROCESS_INLINE_BYTES', str(64 * 1024)))
+# Texto extraído de um PDF com menos caracteres por página que isso (e.g., PDF escaneado) é descartado
+PREPROCESS_MIN_CHARS_PER_PAGE = int(os.getenv('PREPROCESS_MIN_CHARS_PER_PAGE', '100'))
+PREPROCESS_IMAGE_MAX_SIDE = int(os.getenv('PREPROCESS_IMAGE_MAX_SIDE', '2048'))
+PREPROCESS_JPEG_QUALITY = int(os.getenv('PREPROCESS_JPEG_QUALITY', '85'))
+
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# A extração de texto e a recompressão perdem conteúdo (layout, tabelas, imagens dos PDFs),
+# então nenhuma ação é aplicada sem PREPROCESS_POLICY
+DEFAULT_POLICY: Dict[str, str] = {}
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+_CONTROL_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+
+
+def parse_policy(spec: str = PREPROCESS_POLICY) -> Dict[str, str]:
+    policy = dict(DEFAULT_POLICY)
+    for item in spec.split(','):
+        if '=' in item:
+            mime_type, action = item.split('=', 1)
+            policy[mime_type.strip().lower()] = action.strip().lower()
+    return policy
+
+
+def action_for(mime_type: str, policy: Dict[str, str]) -> str:
+    """A ação do mime type exato, ou a do grupo ("image/*"), ou "none" """
+    mime_type = (mime_type or '').lower()
+    return policy.get(mime_type) or policy.get(mime_type.split('/')[0] + '/*') or 'none'
+
+
+def normalize_text(text: str) -> str:
+    """Unicode NFC, quebras de linha "\\n", sem espaços no fim das linhas nem sequências de linhas em branco"""
+    text = unicodedata.normalize('NFC', text.replace('\r\n', '\n').replace('\r', '\n').lstrip('\ufeff'))
+    text = _CONTROL_RE.sub('', text)
+    text = '\n'.join(line.rstrip() for line in text.split('\n'))
+    return _BLANK_LINES_RE.sub('\n\n', text).strip() + '\n'
+
+
+def _decode(file_data: bytes) -> str:
+    try:
+        return file_data.decode('utf-8')
+    except UnicodeDecodeError:
+        return file_data.decode('latin-1')
+
+
+def _pdf_text(file_data: bytes) -> Optional[str]:
+    if PdfReader is None:
+        return None
+    reader = PdfReader(io.BytesIO(file_data))
+    pages = [page.extract_text() or '' for page in reader.pages]
+    text = normalize_text('\n\n'.join(pages))
+    if len(text) < PREPROCESS_MIN_CHARS_PER_PAGE * max(1, len(pages)):
+        return None
+    return text
+
+
+def _docx_text(file_data: bytes) -> Optional[str]:
+    """Texto dos parágrafos de `word/document.xml`, sem dependências externas"""
+    with zipfile.ZipFile(io.BytesIO(file_data)) as archive:
+        root = ElementTree.fromstring(archive.read('word/document.xml'))
+    paragraphs = []
+    for paragraph in root.iter(f'{_W}p'):
+        pieces = []
+        for node in paragraph.iter():
+            if node.tag == f'{_W}t' and node.text:
+                pieces.append(node.text)
+            elif node.tag == f'{_W}tab':
+                pieces.append('\t')
+            elif node.tag in (f'{_W}br', f'{_W}cr'):
+                pieces.append('\n')
+        paragraphs.append(''.join(pieces))
+    text = normalize_text('\n'.join(paragraphs))
+    return text if text.strip() else None
+
+
+def document_text(file_data: bytes, mime_type: str) -> Optional[str]:
+    """Texto normalizado de PDFs, DOCX e arquivos de texto; None para os demais tipos (e.g., imagens)"""
+    mime_type = (mime_type or '').lower()
+    if mime_type == DOCX_MIME:
+        return _docx_text(file_data)
+    if mime_type == 'application/pdf':
+        return _pdf_text(file_data)
+    if mime_type.startswith('text/'):
+        return normalize_text(_decode(file_data))
+    return None
+
+
+def _extract_text(file_data: bytes, mime_type: str) -> Optional[Tuple[bytes, str]]:
+    text = _docx_text(file_data) if mime_type == DOCX_MIME else _pdf_text(file_data)
+    return (text.encode('utf-8'), 'text/plain') if text else None
+
+
+def _downscale(file_data: bytes, mime_type: str) -> Optional[Tuple[bytes, str]]:
+    """Reduz a imagem para PREPROCESS_IMAGE_MAX_SIDE e recomprime (JPEG, ou PNG se houver transparência)"""
+    if Image is None:
+        return None
+    with Image.open(io.BytesIO(file_data)) as image:
+        image.thumbnail((PREPROCESS_IMAGE_MAX_SIDE, PREPROCESS_IMAGE_MAX_SIDE))
+        output = io.BytesIO()
+        if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+            image.save(output, format='PNG', optimize=True)
+            return output.getvalue(), 'image/png'
+        image.convert('RGB').save(output, format='JPEG', quality=PREPROCESS_JPEG_QUALITY, optimize=True)
+        return output.getvalue(), 'image/jpeg'
+
+
+def _normalize(file_data: bytes, mime_type: str) -> Optional[Tuple[bytes, str]]:
+    return normalize_text(_decode(file_data)).encode('utf-8'), mime_type
+
+
+ACTIONS: Dict[str, Callable[[bytes, str], Optional[Tuple[bytes, str]]]] = {
+    'extract_text': _extract_text,
+    'downscale': _downscale,
+    'normalize': _normalize,
+}
+
+
+def preprocess_bytes(file_data: bytes, mime_type: str, action: str) -> Tuple[bytes, str, str]:
+    """
+    Aplica a ação ao conteúdo; executado no pool de processos.
+
+    Returns:
+        (conteúdo, mime type, resultado), onde resultado é "applied", ou "skipped" quando o
+        conteúdo original é mantido (ação sem efeito, biblioteca ausente ou saída maior)
+    """
+    handler = ACTIONS.get(action)
+    result = handler(file_data, mime_type) if handler else None
+    # Nunca envia um payload maior que o original
+    if result is None or len(result[0]) >= len(file_data):
+        return file_data, mime_type, 'skipped'
+    return result[0], result[1], 'applied'
+
+
+class Preprocessor:
+    """
+    Reduz os documentos antes do upload conforme a política por mime type.
+
+    Roda em um pool de processos criado na primeira chamada. O nome do documento (e a
+    deduplicação) continua vindo do hash do conteúdo original; só os bytes enviados mudam,
+    então alterar a política não reindexa nem duplica documentos já registrados.
+    """
+
+    def __init__(self, policy: Optional[Dict[str, str]] = None, workers: int = PREPROCESS_WORKERS):
+        self.policy = policy if policy is not None else parse_policy()
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers or None)
+        return self._pool
+
+    async def call(self, fn: Callable[..., Any], file_data: bytes, *args) -> Any:
+        """Executa `fn(file_data, *args)` no pool de processos, ou em uma thread para payloads pequenos"""
+        if len(file_data) < PREPROCESS_INLINE_BYTES:
+            return await asyncio.to_thread(fn, file_data, *args)
+        return await asyncio.get_running_loop().run_in_executor(self._get_pool(), fn, file_data, *args)
+
+    async def run(self, file_data: bytes, mime_type: str) -> Tuple[bytes, str]:
+        """Retorna o conteúdo e o mime type a enviar; em caso de falha, o original"""
+        action = action_for(mime_type, self.policy)
+        if action == 'none':
+            return file_data, mime_type
+        try:
+            with span("preprocess"):
+                data, new_mime, result = await self.call(preprocess_bytes, file_data, mime_type, action)
+        except Exception as e:
+            print(f"[Preprocess] {action} failed for {mime_type}, uploading the original: {e}")
+            count("preprocess", action=action, result="failed")
+            return file_data, mime_type
+        count("preprocess", action=action, result=result)
+        if result == 'applied':
+            print(f"[Preprocess] {action}: {len(file_data)} -> {len(data)} bytes ({mime_type} -> {new_mime})")
+        return data, new_mime
+
+
+_preprocessor: Optional[Preprocessor] = None
+
+
+def get_preprocessor() -> Preprocessor:
+    global _preprocessor
+    if _preprocessor is None:
+        _preprocessor = Preprocessor()
+    return _preprocessor
+
+
+def set_preprocessor(preprocessor: Optional[Preprocessor]):
+    """Substitui o pré-processador (e.g., com outra política nos benchmarks); None volta ao padrão"""
+    global _preprocessor
+    _preprocessor = preprocessor
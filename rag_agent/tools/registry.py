@@ -0,0 +1,550 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+from rag_agent.tools import CONFIG_PATH, REGISTRY_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS documents (
+    filename TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    original_name TEXT,
+    mime_type TEXT,
+    size_bytes INTEGER,
+    uploaded_at TEXT,
+    operation_name TEXT,
+    store_name TEXT,
+    document_name TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_digest ON documents (digest);
+CREATE TABLE IF NOT EXISTS shards (
+    shard_index INTEGER PRIMARY KEY,
+    display_name TEXT UNIQUE NOT NULL,
+    store_name TEXT,
+    added_at TEXT
+);
+CREATE TABLE IF NOT EXISTS index_jobs (
+    job_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    digest TEXT,
+    owns_blob INTEGER,
+    source_path TEXT,
+    original_name TEXT,
+    mime_type TEXT,
+    size_bytes INTEGER,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    polls INTEGER NOT NULL DEFAULT 0,
+    operation_name TEXT,
+    store_name TEXT,
+    error TEXT,
+    submitted_at REAL,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS index_jobs_due ON index_jobs (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS index_jobs_filename ON index_jobs (filename);
+CREATE TABLE IF NOT EXISTS ingest_files (
+    path TEXT PRIMARY KEY,
+    size_bytes INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    digest TEXT,
+    checked_at TEXT
+);
+CREATE TABLE IF NOT EXISTS near_dup_signatures (
+    filename TEXT PRIMARY KEY,
+    original_name TEXT,
+    signature BLOB NOT NULL,
+    replaces TEXT,
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS near_dup_buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, filename)
+);
+CREATE INDEX IF NOT EXISTS near_dup_buckets_filename ON near_dup_buckets (filename);
+-- Versão do conjunto de documentos (ver `version`): o id distingue bancos recriados e o
+-- contador só cresce, incrementado na mesma transação que altera `documents`
+INSERT OR IGNORE INTO settings (key, value) VALUES ('registry_id', lower(hex(randomblob(8))));
+INSERT OR IGNORE INTO settings (key, value) VALUES ('documents_version', '0');
+"""
+
+# Colunas acrescentadas depois da criação das tabelas; bancos antigos recebem um ALTER TABLE
+ADDED_COLUMNS = {
+    'documents': [('document_name', 'TEXT')],
+    'index_jobs': [('digest', 'TEXT'), ('owns_blob', 'INTEGER'), ('source_path', 'TEXT')],
+    'ingest_files': [('digest', 'TEXT')],
+}
+
+# Jobs de indexação ainda em andamento: aguardando upload ou com a operação em processamento
+ACTIVE_JOB_STATUSES = ('queued', 'polling')
+
+
+def digest_from_filename(filename: str) -> str:
+    """Extrai o hash do conteúdo de um nome gerado por `generate_filename_from_content` (doc_<hash>.<ext>)"""
+    stem = filename.rsplit('.', 1)[0]
+    return stem[4:] if stem.startswith('doc_') else stem
+
+
+class DocumentRegistry:
+    """
+    Registro dos documentos indexados, armazenado em SQLite (modo WAL).
+
+    Substitui o `file_store_config.json`: cada consulta usa índice em vez de reler
+    o arquivo inteiro, e as inserções são transacionais, então vários workers podem
+    indexar ao mesmo tempo sem perder atualizações. Cada thread usa a sua própria conexão.
+
+    Uma escrita pode aguardar até 30s pelo lock do banco quando outro processo está
+    escrevendo, então corrotinas chamam os métodos que escrevem via `asyncio.to_thread`.
+    """
+
+    def __init__(self, db_path: Path, legacy_config_path: Optional[Path] = None):
+        self.db_path = Path(db_path)
+        self.legacy_config_path = legacy_config_path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(SCHEMA)
+                    self._add_missing_columns(conn)
+                    self._migrate_legacy_config(conn)
+                    self._initialized = True
+        return conn
+
+    @staticmethod
+    def _add_missing_columns(conn: sqlite3.Connection):
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for name, column_type in columns:
+                if name not in existing:
+                    try:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+                    except sqlite3.OperationalError as e:
+                        # Outro processo acrescentou a coluna ao mesmo tempo
+                        if 'duplicate column' not in str(e):
+                            raise
+
+    def _migrate_legacy_config(self, conn: sqlite3.Connection):
+        """Importa uma única vez o `file_store_config.json` antigo, se existir"""
+        path = self.legacy_config_path
+        if not path or not path.exists():
+            return
+
+        try:
+            with open(path, 'r') as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            # Outro worker já fez a migração
+            return
+
+        store_name = config.get('file_search_store_name')
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if store_name:
+                conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('file_search_store_name', ?)",
+                             (store_name,))
+            if config.get('created_at'):
+                conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('created_at', ?)",
+                             (config['created_at'],))
+            conn.executemany(
+                "INSERT OR IGNORE INTO documents (filename, digest, store_name) VALUES (?, ?, ?)",
+                [(name, digest_from_filename(name), store_name) for name in config.get('uploaded_files', [])]
+            )
+            self._bump_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        try:
+            path.rename(path.with_name(path.name + '.migrated'))
+        except FileNotFoundError:
+            return
+        print(f"[Registry] Migrated {len(config.get('uploaded_files', []))} document(s) from {path.name}")
+
+    @staticmethod
+    def _bump_version(conn: sqlite3.Connection):
+        """Incrementa a versão dos documentos; chamado dentro da transação que os altera"""
+        conn.execute("UPDATE settings SET value = CAST(value AS INTEGER) + 1 WHERE key = 'documents_version'")
+
+    def get_setting(self, key: str) -> Optional[str]:
+        row = self._connect().execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_setting(self, key: str, value: Optional[str]):
+        self._connect().execute(
+            "INSERT INTO settings (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+    @property
+    def store_name(self) -> Optional[str]:
+        return self.get_setting('file_search_store_name')
+
+    def is_indexed(self, filename: str) -> bool:
+        row = self._connect().execute("SELECT 1 FROM documents WHERE filename = ?", (filename,)).fetchone()
+        return row is not None
+
+    def indexed_subset(self, filenames: Iterable[str]) -> Set[str]:
+        """Retorna quais dos nomes informados já estão indexados"""
+        names = list(filenames)
+        found = set()
+        conn = self._connect()
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(f"SELECT filename FROM documents WHERE filename IN ({placeholders})", chunk)
+            found.update(row['filename'] for row in rows)
+        return found
+
+    def add_document(self, filename: str, original_name: Optional[str] = None, mime_type: Optional[str] = None,
+                     size_bytes: Optional[int] = None, operation_name: Optional[str] = None,
+                     store_name: Optional[str] = None, document_name: Optional[str] = None) -> bool:
+        """
+        Registra um documento indexado.
+
+        `document_name` é o nome do recurso no store (e.g., fileSearchStores/.../documents/...),
+        usado para removê-lo sem listar o store.
+
+        Returns:
+            True se o documento foi inserido, False se já estava registrado
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO documents "
+                "(filename, digest, original_name, mime_type, size_bytes, uploaded_at, operation_name, store_name, "
+                "document_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (filename, digest_from_filename(filename), original_name, mime_type, size_bytes,
+                 time.strftime('%Y-%m-%d %H:%M:%S'), operation_name, store_name, document_name)
+            )
+            added = cursor.rowcount == 1
+            if added:
+                self._bump_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def get_document(self, filename: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM documents WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def list_filenames(self) -> List[str]:
+        rows = self._connect().execute("SELECT filename FROM documents ORDER BY rowid")
+        return [row['filename'] for row in rows]
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def version(self) -> str:
+        """
+        Versão do conjunto de documentos, muda sempre que um documento é adicionado ou removido.
+
+        Nunca se repete: o contador só cresce e vem prefixado pelo id deste banco.
+        """
+        rows = self._connect().execute(
+            "SELECT key, value FROM settings WHERE key IN ('registry_id', 'documents_version')"
+        )
+        values = {row['key']: row['value'] for row in rows}
+        return f"{values['registry_id']}:{values['documents_version']}"
+
+    def clear_documents(self, store_name: Optional[str] = None):
+        """
+        Apaga os documentos registrados, usado quando um store é recriado.
+
+        Com `store_name`, apaga apenas os documentos daquele store (e.g., um shard).
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if store_name is None:
+                cursor = conn.execute("DELETE FROM documents")
+            else:
+                cursor = conn.execute("DELETE FROM documents WHERE store_name = ?", (store_name,))
+            if cursor.rowcount:
+                self._bump_version(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def shard_layout(self) -> List[Dict[str, Any]]:
+        """Shards registrados, na ordem em que foram adicionados"""
+        rows = self._connect().execute("SELECT * FROM shards ORDER BY shard_index")
+        return [dict(row) for row in rows]
+
+    def ensure_shards(self, display_names: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Acrescenta ao layout os shards que ainda não existem. O layout só cresce: documentos
+        já indexados continuam no shard registrado em `documents.store_name`.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            next_index = conn.execute("SELECT COALESCE(MAX(shard_index) + 1, 0) FROM shards").fetchone()[0]
+            for display_name in display_names:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO shards (shard_index, display_name, added_at) VALUES (?, ?, ?)",
+                    (next_index, display_name, time.strftime('%Y-%m-%d %H:%M:%S'))
+                )
+                next_index += cursor.rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.shard_layout()
+
+    def shard_store(self, display_name: str) -> Optional[str]:
+        row = self._connect().execute("SELECT store_name FROM shards WHERE display_name = ?",
+                                      (display_name,)).fetchone()
+        return row['store_name'] if row else None
+
+    def set_shard_store(self, display_name: str, store_name: str):
+        self._connect().execute("UPDATE shards SET store_name = ? WHERE display_name = ?", (store_name, display_name))
+
+    def enqueue_job(self, filename: str, digest: Optional[str] = None, original_name: Optional[str] = None,
+                    mime_type: Optional[str] = None, size_bytes: Optional[int] = None,
+                    owns_blob: bool = False, source_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Cria um job de indexação para o documento, ou retorna o job ativo que já existe para ele.
+        `digest` é o hash completo do conteúdo, a chave do conteúdo no armazenamento de blobs;
+        `owns_blob` indica que o blob foi gravado para o job e pode ser apagado quando ele termina;
+        `source_path` é o arquivo local de onde o conteúdo é lido, no lugar do blob (ingestão).
+
+        Returns:
+            O job, com `created` indicando se foi criado agora
+        """
+        conn = self._connect()
+        placeholders = ','.join('?' * len(ACTIVE_JOB_STATUSES))
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT * FROM index_jobs WHERE filename = ? AND status IN ({placeholders})",
+                (filename, *ACTIVE_JOB_STATUSES)
+            ).fetchone()
+            if row is None:
+                job_id = uuid.uuid4().hex[:12]
+                conn.execute(
+                    "INSERT INTO index_jobs (job_id, filename, digest, owns_blob, source_path, original_name, "
+                    "mime_type, size_bytes, status, next_attempt_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                    (job_id, filename, digest, int(owns_blob), source_path, original_name, mime_type, size_bytes,
+                     time.time(), now, now)
+                )
+                row = conn.execute("SELECT * FROM index_jobs WHERE job_id = ?", (job_id,)).fetchone()
+                created = True
+            else:
+                created = False
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {**dict(row), "created": created}
+
+    def claim_job(self, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """
+        Reserva o próximo job pronto para execução por `lease_seconds`. Um job cujo worker parou
+        (e.g., o processo reiniciou) volta a ficar disponível quando a reserva expira.
+        """
+        conn = self._connect()
+        placeholders = ','.join('?' * len(ACTIVE_JOB_STATUSES))
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT * FROM index_jobs WHERE status IN ({placeholders}) AND next_attempt_at <= ? "
+                "AND (lease_until IS NULL OR lease_until < ?) ORDER BY next_attempt_at LIMIT 1",
+                (*ACTIVE_JOB_STATUSES, now, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE index_jobs SET lease_until = ? WHERE job_id = ?",
+                             (now + lease_seconds, row['job_id']))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return dict(row) if row else None
+
+    def renew_lease(self, job_id: str, lease_seconds: float) -> bool:
+        """
+        Estende a reserva de um job em execução. Não faz nada se a reserva já foi liberada
+        (`update_job`), então uma renovação atrasada não prende o job.
+        """
+        cursor = self._connect().execute(
+            "UPDATE index_jobs SET lease_until = ? WHERE job_id = ? AND lease_until IS NOT NULL",
+            (time.time() + lease_seconds, job_id)
+        )
+        return cursor.rowcount == 1
+
+    def digest_in_use(self, digest: str, exclude_job_id: Optional[str] = None) -> bool:
+        """Se algum job ativo (além de `exclude_job_id`) ainda precisa do conteúdo com este hash"""
+        placeholders = ','.join('?' * len(ACTIVE_JOB_STATUSES))
+        row = self._connect().execute(
+            f"SELECT 1 FROM index_jobs WHERE digest = ? AND job_id != ? AND status IN ({placeholders}) LIMIT 1",
+            (digest, exclude_job_id or '', *ACTIVE_JOB_STATUSES)
+        ).fetchone()
+        return row is not None
+
+    def update_job(self, job_id: str, **fields):
+        """Atualiza os campos informados e libera a reserva do job"""
+        fields = {**fields, 'lease_until': None, 'updated_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        self._connect().execute(f"UPDATE index_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM index_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Jobs mais recentes primeiro"""
+        rows = self._connect().execute("SELECT * FROM index_jobs ORDER BY rowid DESC LIMIT ?", (limit,))
+        return [dict(row) for row in rows]
+
+    def job_counts(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM index_jobs GROUP BY status")
+        return {row[0]: row[1] for row in rows}
+
+    def active_job_filenames(self, filenames: Iterable[str]) -> Set[str]:
+        """Quais dos nomes informados já têm um job de indexação em andamento"""
+        names = list(filenames)
+        found = set()
+        conn = self._connect()
+        statuses = ','.join('?' * len(ACTIVE_JOB_STATUSES))
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                f"SELECT DISTINCT filename FROM index_jobs WHERE filename IN ({placeholders}) "
+                f"AND status IN ({statuses})", (*chunk, *ACTIVE_JOB_STATUSES)
+            )
+            found.update(row['filename'] for row in rows)
+        return found
+
+    def ingest_checkpoints(self) -> Dict[str, Tuple[int, int, str, Optional[str]]]:
+        """Arquivos já vistos pela ingestão em massa: caminho -> (tamanho, mtime_ns, nome do documento, hash)"""
+        rows = self._connect().execute("SELECT path, size_bytes, mtime_ns, filename, digest FROM ingest_files")
+        return {row['path']: (row['size_bytes'], row['mtime_ns'], row['filename'], row['digest']) for row in rows}
+
+    def save_ingest_checkpoints(self, rows: Iterable[Tuple[str, int, int, str, str]]):
+        """Grava (caminho, tamanho, mtime_ns, nome do documento, hash) de cada arquivo processado"""
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO ingest_files (path, size_bytes, mtime_ns, filename, digest, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET size_bytes = excluded.size_bytes, mtime_ns = excluded.mtime_ns, "
+                "filename = excluded.filename, digest = excluded.digest, checked_at = excluded.checked_at",
+                [(*row, now) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def next_job_due(self) -> Optional[float]:
+        """Horário (time.time) do próximo job ativo, ou None se não houver"""
+        placeholders = ','.join('?' * len(ACTIVE_JOB_STATUSES))
+        row = self._connect().execute(
+            f"SELECT MIN(MAX(next_attempt_at, COALESCE(lease_until, 0))) FROM index_jobs "
+            f"WHERE status IN ({placeholders})", ACTIVE_JOB_STATUSES
+        ).fetchone()
+        return row[0]
+
+    def save_signature(self, filename: str, signature: bytes, buckets: Iterable[Tuple[int, int]],
+                       original_name: Optional[str] = None, replaces: Optional[str] = None):
+        """Grava a assinatura MinHash de um documento e os seus buckets LSH (band, bucket)"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO near_dup_signatures (filename, original_name, signature, replaces, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (filename, original_name, signature, replaces, time.strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            conn.execute("DELETE FROM near_dup_buckets WHERE filename = ?", (filename,))
+            conn.executemany("INSERT OR IGNORE INTO near_dup_buckets (band, bucket, filename) VALUES (?, ?, ?)",
+                             [(band, bucket, filename) for band, bucket in buckets])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def near_dup_candidates(self, filename: str, buckets: Iterable[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        """
+        Documentos que compartilham ao menos um bucket LSH, indexados ou com indexação em andamento.
+
+        A busca usa a chave primária (band, bucket), então o custo depende do tamanho dos
+        buckets e não do tamanho do corpus.
+        """
+        pairs = list(buckets)
+        if not pairs:
+            return []
+        matches = ' OR '.join('(b.band = ? AND b.bucket = ?)' for _ in pairs)
+        statuses = ','.join('?' * len(ACTIVE_JOB_STATUSES))
+        rows = self._connect().execute(
+            f"SELECT DISTINCT s.filename, s.original_name, s.signature, "
+            f"EXISTS (SELECT 1 FROM documents d WHERE d.filename = s.filename) AS indexed "
+            f"FROM near_dup_buckets b JOIN near_dup_signatures s ON s.filename = b.filename "
+            f"WHERE ({matches}) AND b.filename != ? "
+            f"AND (EXISTS (SELECT 1 FROM documents d WHERE d.filename = b.filename) "
+            f"OR EXISTS (SELECT 1 FROM index_jobs j WHERE j.filename = b.filename AND j.status IN ({statuses})))",
+            (*(value for pair in pairs for value in pair), filename, *ACTIVE_JOB_STATUSES)
+        )
+        return [dict(row) for row in rows]
+
+    def take_replacement(self, filename: str) -> Optional[str]:
+        """O documento que `filename` substitui (política "replace"), consumido uma única vez"""
+        conn = self._connect()
+        row = conn.execute("SELECT replaces FROM near_dup_signatures WHERE filename = ?", (filename,)).fetchone()
+        if not row or not row['replaces']:
+            return None
+        conn.execute("UPDATE near_dup_signatures SET replaces = NULL WHERE filename = ?", (filename,))
+        return row['replaces']
+
+    def remove_document(self, filename: str):
+        """Apaga o registro de um documento removido do store, com a sua assinatura"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("DELETE FROM documents WHERE filename = ?", (filename,)).rowcount:
+                self._bump_version(conn)
+            conn.execute("DELETE FROM near_dup_signatures WHERE filename = ?", (filename,))
+            conn.execute("DELETE FROM near_dup_buckets WHERE filename = ?", (filename,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+registry = DocumentRegistry(REGISTRY_PATH, legacy_config_path=CONFIG_PATH)
@@ -0,0 +1,427 @@
+import asyncio
+import hashlib
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Any, AsyncGenerator, List, Optional
+
+from google.genai import types
+
+from rag_agent.tools import get_client, api_key, STORE_NAME
+from rag_agent.tools.admission import BACKGROUND, INTERACTIVE, admit
+from rag_agent.tools.metrics import record, span
+from rag_agent.tools.registry import digest_from_filename, registry
+from rag_agent.tools.spool import upload_source
+from rag_agent.tools.store_resolver import invalidate_store, resolve_store, resolved_store
+
+# file_search: FileSearch hospedada no Gemini; local: índice em processo (local_index.py)
+RETRIEVAL_BACKEND = os.getenv('RETRIEVAL_BACKEND', 'file_search')
+SEARCH_MODEL = 'gemini-2.5-flash'
+UPLOAD_POLL_INTERVAL = float(os.getenv('UPLOAD_POLL_INTERVAL', '3'))
+# Quantidade de file search stores (shards); novos documentos são distribuídos pelo hash do conteúdo
+STORE_SHARDS = int(os.getenv('STORE_SHARDS', '1'))
+# Stores consultados em uma mesma chamada de busca; os grupos são consultados em paralelo
+SHARD_GROUP_SIZE = int(os.getenv('SHARD_GROUP_SIZE', '5'))
+ANSWER_SEPARATOR = "\n\n"
+
+
+def file_search_config(store_names, system_instruction: Optional[str] = None) -> types.GenerateContentConfig:
+    if isinstance(store_names, str):
+        store_names = [store_names]
+    return types.GenerateContentConfig(
+        system_instruction=system_instruction,
+        tools=[types.Tool(
+            file_search=types.FileSearch(
+                file_search_store_names=list(store_names)
+            )
+        )]
+    )
+
+
+def extract_sources(grounding) -> list:
+    """
+    Extrai os títulos dos documentos que aterraram a resposta, sem duplicatas.
+
+    Quando há grounding supports, só os chunks citados por algum trecho da resposta contam;
+    os demais foram recuperados mas não usados. Sem supports, vale a lista de chunks.
+    """
+    if not grounding or not grounding.grounding_chunks:
+        return []
+    chunks = grounding.grounding_chunks
+    cited = sorted({i for support in grounding.grounding_supports or []
+                    for i in support.grounding_chunk_indices or [] if 0 <= i < len(chunks)})
+    if cited:
+        chunks = [chunks[i] for i in cited]
+    sources = [
+        c.retrieved_context.title
+        for c in chunks
+        if getattr(c, 'retrieved_context', None) and getattr(c.retrieved_context, 'title', None)
+    ]
+    return list(dict.fromkeys(sources))
+
+
+def shard_display_names(count: int = STORE_SHARDS) -> List[str]:
+    """O primeiro shard é o próprio STORE_NAME, então instalações sem shards continuam iguais"""
+    return [STORE_NAME] + [f"{STORE_NAME}-shard-{i}" for i in range(1, max(1, count))]
+
+
+def is_own_shard(display_name: str) -> bool:
+    """Se o shard pertence ao STORE_NAME atual (o registro pode ter shards de outros nomes)"""
+    return display_name == STORE_NAME or display_name.startswith(f"{STORE_NAME}-shard-")
+
+
+def assign_shard(digest: str, display_names: List[str]) -> str:
+    """
+    Escolhe o shard de um documento por rendezvous hashing: ao acrescentar shards,
+    só a fração de novos documentos que cabe ao shard novo muda de destino.
+    """
+    return max(display_names,
+               key=lambda name: hashlib.blake2b(f"{name}:{digest}".encode('utf-8'), digest_size=8).digest())
+
+
+def merge_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Junta as respostas de vários grupos de shards em uma só.
+
+    Respostas sem grounding são descartadas (o grupo não tinha documentos relevantes); as
+    demais são concatenadas, da mais para a menos aterrada. Os grounding chunks são unidos e
+    os índices e offsets dos grounding supports ajustados para a resposta combinada.
+    """
+    grounded = [r for r in results if r["grounding_metadata"] and r["grounding_metadata"].grounding_chunks]
+    if not grounded:
+        return results[0]
+    if len(grounded) == 1:
+        return grounded[0]
+    grounded.sort(key=lambda r: len(r["grounding_metadata"].grounding_chunks), reverse=True)
+
+    answers, chunks, supports = [], [], []
+    byte_offset = 0
+    for result in grounded:
+        metadata = result["grounding_metadata"]
+        for support in metadata.grounding_supports or []:
+            segment = support.segment
+            if segment is not None:
+                segment = segment.model_copy(update={
+                    "start_index": (segment.start_index or 0) + byte_offset,
+                    "end_index": (segment.end_index or 0) + byte_offset,
+                })
+            supports.append(support.model_copy(update={
+                "segment": segment,
+                "grounding_chunk_indices": [i + len(chunks) for i in support.grounding_chunk_indices or []],
+            }))
+        chunks.extend(metadata.grounding_chunks)
+        answers.append(result["answer"])
+        byte_offset += len((result["answer"] + ANSWER_SEPARATOR).encode('utf-8'))
+
+    sources = [source for result in grounded for source in result["sources"]]
+    return {
+        "answer": ANSWER_SEPARATOR.join(answers),
+        "sources": list(dict.fromkeys(sources)),
+        "grounding_metadata": types.GroundingMetadata(grounding_chunks=chunks, grounding_supports=supports or None)
+    }
+
+
+class RetrievalBackend(ABC):
+    """
+    Interface entre as tools (`index_uploaded_file`, `search_documents`) e o mecanismo de busca.
+
+    As respostas de busca seguem sempre o formato {"answer", "sources", "grounding_metadata"},
+    independente de onde os documentos estão indexados. Um backend implementa ao menos
+    `current_store`, `ensure_store`, `submit_document` e `search`.
+    """
+
+    name = "base"
+
+    def ready_error(self) -> Optional[str]:
+        """Mensagem de erro caso o backend não possa ser usado (e.g., sem API key)"""
+        return None
+
+    @abstractmethod
+    def current_store(self) -> Optional[str]:
+        """Nome do store já configurado, sem chamadas remotas"""
+
+    @abstractmethod
+    async def ensure_store(self) -> str:
+        """Retorna o store, criando-o caso necessário"""
+
+    async def store_for_document(self, filename: str) -> str:
+        """Store onde um novo documento deve ser indexado"""
+        return await self.ensure_store()
+
+    @abstractmethod
+    async def submit_document(self, filename: str, file_data: bytes, mime_type: str,
+                              store_name: str) -> Dict[str, Any]:
+        """
+        Inicia a indexação de um documento sem aguardar o processamento (usado pela fila de jobs).
+
+        Returns:
+            Um dicionario com status ("success", "pending" ou "error"), message, operation_name
+            e document_name (nome do recurso no store, se já conhecido); com "pending", o
+            andamento é consultado em `check_operation`
+        """
+
+    async def check_operation(self, operation_name: str) -> Dict[str, Any]:
+        """Estado de uma indexação iniciada por `submit_document`: {"done", "error", "document_name"}"""
+        return {"done": True, "error": None, "document_name": None}
+
+    async def delete_document(self, document: Dict[str, Any]) -> bool:
+        """
+        Remove um documento do store; False se o backend não suporta remoção.
+
+        Args:
+            document: o registro do documento (ver `DocumentRegistry.get_document`)
+        """
+        return False
+
+    @abstractmethod
+    async def search(self, query: str, store_name: str,
+                     system_instruction: Optional[str] = None) -> Dict[str, Any]:
+        """Busca nos documentos do store: {"answer", "sources", "grounding_metadata"}"""
+
+    async def stream(self, query: str, store_name: str,
+                     system_instruction: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Produz {"type": "partial", "text": ...} a cada trecho da resposta e um
+        {"type": "final", "answer", "sources", "grounding_metadata"} ao final.
+        Backends sem streaming entregam apenas o "final".
+        """
+        result = await self.search(query, store_name, system_instruction)
+        yield {"type": "final", **result}
+
+
+class FileSearchBackend(RetrievalBackend):
+    """
+    Backend padrão, usando os file search stores do Gemini.
+
+    Com STORE_SHARDS > 1 os documentos são distribuídos entre vários stores e a busca
+    consulta todos eles em paralelo, em grupos de SHARD_GROUP_SIZE stores por chamada.
+    O layout fica no registro (tabela `shards`) e só cresce, então aumentar STORE_SHARDS
+    não exige reindexar: os documentos existentes continuam no store registrado.
+    """
+
+    name = "file_search"
+
+    def __init__(self, shards: int = STORE_SHARDS, group_size: int = SHARD_GROUP_SIZE):
+        self.shards = max(1, shards)
+        self.group_size = max(1, group_size)
+        self._layout: Optional[List[str]] = None
+
+    def shard_layout(self) -> List[str]:
+        """Display names dos shards deste STORE_NAME, na ordem em que foram adicionados"""
+        if self._layout is None:
+            layout = registry.ensure_shards(shard_display_names(self.shards))
+            primary = resolved_store(STORE_NAME)
+            if primary and registry.shard_store(STORE_NAME) != primary:
+                # Store principal resolvido antes de existir o layout
+                registry.set_shard_store(STORE_NAME, primary)
+            self._layout = [shard["display_name"] for shard in layout if is_own_shard(shard["display_name"])]
+        return self._layout
+
+    async def load_layout(self) -> List[str]:
+        """`shard_layout` fora do event loop na primeira chamada, que grava o layout no registro"""
+        if self._layout is None:
+            return await asyncio.to_thread(self.shard_layout)
+        return self._layout
+
+    def search_stores(self, store_name: str) -> List[str]:
+        """Stores consultados na busca: o informado e os shards já criados"""
+        stores = [store_name]
+        if self.shards > 1 or len(self.shard_layout()) > 1:
+            stores += [resolved_store(name) for name in self.shard_layout()]
+        return list(dict.fromkeys(store for store in stores if store))
+
+    def _groups(self, store_name: str) -> List[List[str]]:
+        stores = self.search_stores(store_name)
+        return [stores[i:i + self.group_size] for i in range(0, len(stores), self.group_size)]
+
+    def ready_error(self) -> Optional[str]:
+        if not api_key:
+            return "Neither FILE_SEARCH_API_KEY nor GOOGLE_API_KEY found in environment"
+        return None
+
+    def current_store(self) -> Optional[str]:
+        primary = registry.store_name
+        if primary:
+            return primary
+        # Com shards, os primeiros documentos podem ter ido só para outros shards: a busca
+        # parte de qualquer shard com store, e `search_stores` acrescenta os demais
+        for shard in registry.shard_layout():
+            if shard["store_name"] and is_own_shard(shard["display_name"]):
+                return shard["store_name"]
+        return None
+
+    async def ensure_store(self) -> str:
+        return await resolve_store()
+
+    async def store_for_document(self, filename: str) -> str:
+        layout = await self.load_layout()
+        if len(layout) == 1:
+            return await resolve_store()
+        return await resolve_store(assign_shard(digest_from_filename(filename), layout))
+
+    async def submit_document(self, filename: str, file_data: bytes, mime_type: str,
+                              store_name: str) -> Dict[str, Any]:
+        try:
+            async with upload_source(file_data, filename) as source:
+                upload_op = await start_upload(store_name, source, filename, mime_type)
+        except Exception:
+            # O store pode ter sido removido, a próxima resolução valida novamente
+            invalidate_store(store_name=store_name)
+            raise
+        return {
+            "status": "success" if upload_op.done else "pending",
+            "message": f"Uploaded '{filename}'",
+            "operation_name": getattr(upload_op, 'name', None),
+            "document_name": operation_document_name(upload_op)
+        }
+
+    async def check_operation(self, operation_name: str) -> Dict[str, Any]:
+        upload_op = await get_operation(types.UploadToFileSearchStoreOperation(name=operation_name))
+        error = getattr(upload_op, 'error', None)
+        return {
+            "done": bool(upload_op.done),
+            "error": str(error) if error else None,
+            "document_name": operation_document_name(upload_op)
+        }
+
+    async def delete_document(self, document: Dict[str, Any]) -> bool:
+        document_name = document.get("document_name")
+        if not document_name and document.get("operation_name"):
+            # Documentos registrados antes da coluna `document_name`: o nome vem da operação de upload
+            operation = await get_operation(types.UploadToFileSearchStoreOperation(name=document["operation_name"]))
+            document_name = operation_document_name(operation)
+        if not document_name:
+            return False
+        async with admit(BACKGROUND, fail_fast=False):
+            await get_client().aio.file_search_stores.documents.delete(name=document_name, config={'force': True})
+        return True
+
+    async def search(self, query: str, store_name: str,
+                     system_instruction: Optional[str] = None) -> Dict[str, Any]:
+        await self.load_layout()
+        groups = self._groups(store_name)
+        if len(groups) == 1:
+            return await self._search_group(query, groups[0], system_instruction)
+        results = await asyncio.gather(*(self._search_group(query, group, system_instruction) for group in groups))
+        return merge_results(list(results))
+
+    async def _search_group(self, query: str, store_names: List[str],
+                            system_instruction: Optional[str] = None) -> Dict[str, Any]:
+        async with admit(INTERACTIVE):
+            with span("generate_content"):
+                response = await get_client().aio.models.generate_content(
+                    model=SEARCH_MODEL,
+                    contents=query,
+                    config=file_search_config(store_names, system_instruction)
+                )
+        with span("grounding_extraction"):
+            grounding = response.candidates[0].grounding_metadata if response.candidates else None
+            sources = extract_sources(grounding)
+        return {
+            "answer": response.text or "",
+            "sources": sources,
+            "grounding_metadata": grounding
+        }
+
+    async def stream(self, query: str, store_name: str,
+                     system_instruction: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        await self.load_layout()
+        groups = self._groups(store_name)
+        if len(groups) > 1:
+            # Respostas de vários grupos só podem ser combinadas quando completas
+            async for item in super().stream(query, store_name, system_instruction):
+                yield item
+            return
+
+        answer_parts = []
+        grounding = None
+        # A vaga fica ocupada até o fim do stream, já que a conexão continua em uso
+        async with admit(INTERACTIVE):
+            # O span cobre apenas a geração; o tempo do consumidor entre trechos fica de fora
+            started = time.perf_counter()
+            generating = 0.0
+            stream = await get_client().aio.models.generate_content_stream(
+                model=SEARCH_MODEL,
+                contents=query,
+                config=file_search_config(groups[0], system_instruction)
+            )
+            stream_iter = stream.__aiter__()
+            while True:
+                try:
+                    chunk = await stream_iter.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    generating += time.perf_counter() - started
+                if chunk.candidates and chunk.candidates[0].grounding_metadata:
+                    grounding = chunk.candidates[0].grounding_metadata
+                if chunk.text:
+                    answer_parts.append(chunk.text)
+                    yield {"type": "partial", "text": chunk.text}
+                started = time.perf_counter()
+            record("generate_content", generating)
+
+        with span("grounding_extraction"):
+            sources = extract_sources(grounding)
+        yield {
+            "type": "final",
+            "answer": "".join(answer_parts),
+            "sources": sources,
+            "grounding_metadata": grounding
+        }
+
+
+async def start_upload(store_name: str, file, display_name: str, mime_type: str):
+    """
+    Envia o arquivo para o file search store e retorna a operação, sem aguardar o processamento
+    (o polling fica com a fila de jobs, ver `index_jobs.py`).
+
+    A chamada passa pelo controle de admissão com prioridade BACKGROUND, então as buscas
+    passam na frente, e é recusada se a fila estiver cheia (AdmissionRejected).
+
+    Args:
+        file: caminho ou objeto de arquivo aberto (e.g., o retornado por `upload_source`)
+    """
+    async with admit(BACKGROUND):
+        with span("upload"):
+            return await get_client().aio.file_search_stores.upload_to_file_search_store(
+                file_search_store_name=store_name,
+                file=file,
+                config={'display_name': display_name, 'mime_type': mime_type}
+            )
+
+
+def operation_document_name(operation) -> Optional[str]:
+    """Nome do documento criado por uma operação de upload concluída"""
+    response = getattr(operation, 'response', None)
+    return getattr(response, 'document_name', None) if response else None
+
+
+async def get_operation(operation):
+    """Consulta o estado de uma operação; o polling de um upload já enviado nunca é recusado"""
+    async with admit(BACKGROUND, fail_fast=False):
+        with span("upload_poll"):
+            return await get_client().aio.operations.get(operation)
+
+
+_backend: Optional[RetrievalBackend] = None
+
+
+def get_backend() -> RetrievalBackend:
+    """Retorna o backend configurado em RETRIEVAL_BACKEND (criado na primeira chamada)"""
+    global _backend
+    if _backend is None:
+        if RETRIEVAL_BACKEND == 'local':
+            from rag_agent.tools.local_index import LocalBackend
+            _backend = LocalBackend()
+        elif RETRIEVAL_BACKEND == 'file_search':
+            _backend = FileSearchBackend()
+        else:
+            raise ValueError(f"Unknown RETRIEVAL_BACKEND: {RETRIEVAL_BACKEND}")
+    return _backend
+
+
+def set_backend(backend: RetrievalBackend):
+    """Substitui o backend em uso (e.g., em testes ou benchmarks)"""
+    global _backend
+    _backend = backend
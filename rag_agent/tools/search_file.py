@@ -1,44 +1,138 @@
+import asyncio
 
-import json
-from typing import Dict, Any
-from google.genai import types
+from typing import Dict, Any, AsyncGenerator, Optional
 from google.adk.tools import FunctionTool, ToolContext
 
-from rag_agent.tools import CONFIG_PATH, client, api_key
-
-
-def load_file_store_config() -> Dict[str, Any]:
-    """Carrega as informações do storage"""
+from rag_agent.tools import metrics
+from rag_agent.tools.admission import AdmissionRejected
+from rag_agent.tools.answer_cache import answer_cache
+from rag_agent.tools.registry import registry
+from rag_agent.tools.retrieval import get_backend
+from rag_agent.tools.single_flight import search_flight
+from rag_agent.tools.speculation import speculative_searches
+
+BUSY_MESSAGE = "O serviço de busca está ocupado no momento. Tente novamente em alguns segundos."
+# Acrescentada a uma resposta cujo stream falhou depois de alguns trechos
+INTERRUPTED_MESSAGE = "(A resposta foi interrompida por uma falha na busca e pode estar incompleta. Tente novamente.)"
+
+
+async def stream_search(query: str, system_instruction: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Versão em streaming da busca (no backend FileSearch, via `generate_content_stream`).
+
+    Produz {"type": "partial", "text": ...} a cada trecho recebido e, ao final, um único
+    {"type": "final", ...} com a resposta completa, as fontes e o grounding_metadata.
+    Respostas em cache são entregues diretamente como "final", assim como a resposta de
+    uma busca idêntica que já está em andamento (ver `single_flight.py`).
+    """
+    backend = get_backend()
+    store_name = backend.current_store()
+    error = backend.ready_error() or (None if store_name else "No file store configured")
+
+    if error:
+        yield {
+            "type": "final",
+            "status": "error",
+            "message": error,
+            "answer": "",
+            "sources": [],
+            "query": query,
+            "grounding_metadata": None
+        }
+        return
+
+    version = await asyncio.to_thread(registry.version) + (":styled" if system_instruction else "")
+    cached = await answer_cache.get(query, store_name, version)
+    if cached is not None:
+        print(f"[FileSearch] Cache hit for query: {query}")
+        metrics.count("answer_cache", result="hit")
+        yield {
+            "type": "final",
+            "status": "success",
+            "answer": cached["answer"],
+            "sources": cached["sources"],
+            "query": query,
+            "cached": True,
+            "grounding_metadata": None
+        }
+        return
 
-    if not CONFIG_PATH.exists():
-        return {
-            'error': True,
-            'message': 'No file store configured. Please run setup_file_store.py first.'
+    metrics.count("answer_cache", result="miss")
+    print(f"[FileSearch] Streaming search in store: {store_name}")
+    answer_parts = []
+    key = answer_cache.make_key(query, store_name, version)
+    try:
+        shared, result = await search_flight.join(key)
+        if not shared:
+            with search_flight.lead(key) as flight:
+                async for item in backend.stream(query, store_name, system_instruction):
+                    if item["type"] == "partial":
+                        answer_parts.append(item["text"])
+                        yield item
+                    else:
+                        result = item
+                await answer_cache.put(query, store_name, version, {"answer": result["answer"], "sources": result["sources"]})
+                flight.set_result(result)
+    except AdmissionRejected as e:
+        print(f"[FileSearch] Busy: {e}")
+        yield {
+            "type": "final",
+            "status": "busy",
+            "message": str(e),
+            "answer": "",
+            "sources": [],
+            "query": query,
+            "grounding_metadata": None
         }
+        return
+    except Exception as e:
+        error_msg = f"Search failed: {str(e)}"
+        print(f"[FileSearch] Error: {error_msg}")
+        # O texto já recebido vai como "answer" de um resultado com erro, para quem já exibiu
+        # os trechos; ele nunca entra no cache, que só recebe o stream completo
+        yield {
+            "type": "final",
+            "status": "error",
+            "message": error_msg,
+            "answer": "".join(answer_parts),
+            "sources": [],
+            "query": query,
+            "grounding_metadata": None
+        }
+        return
 
-    with open(CONFIG_PATH, 'r') as f:
-        return json.load(f)
+    answer = result["answer"]
+    sources = result["sources"]
+    print(f"[FileSearch] Found {len(sources)} source(s)" + (" (shared with a concurrent search)" if shared else ""))
 
+    yield {
+        "type": "final",
+        "status": "success",
+        "answer": answer,
+        "sources": sources,
+        "query": query,
+        "cached": False,
+        "grounding_metadata": result["grounding_metadata"]
+    }
 
-def search_documents(query: str, tool_context: ToolContext) -> Dict[str, Any]:
-    config = load_file_store_config()
 
-    if config.get('error'):
-        return {
-            "status": "error",
-            "message": config['message'],
-            "answer": "",
-            "sources": [],
-            "query": query
-        }
+async def run_search(query: str) -> Dict[str, Any]:
+    """
+    Executa a busca (com o cache de respostas e o single-flight) sem tocar no estado da sessão.
+
+    É o que a tool `search_documents` executa, e também o que o orquestrador inicia de forma
+    especulativa (ver `speculation.py`). Erros viram respostas com status "error" ou "busy".
 
-    store_name = config.get('file_search_store_name')
-    indexed_files = config.get('uploaded_files', [])
+    Returns:
+        Um dicionario contendo status, answer, sources, query e cached
+    """
+    backend = get_backend()
+    store_name = backend.current_store()
 
     if not store_name:
         return {
             "status": "error",
-            "message": "File store name not found in configuration",
+            "message": "No file store configured. Please upload and index a document first.",
             "answer": "",
             "sources": [],
             "query": query
@@ -46,54 +140,61 @@ def search_documents(query: str, tool_context: ToolContext) -> Dict[str, Any]:
 
     try:
 
-        if not api_key:
+        if backend.ready_error():
             return {
                 "status": "error",
-                "message": "Neither FILE_SEARCH_API_KEY nor GOOGLE_API_KEY found in environment",
+                "message": backend.ready_error(),
                 "answer": "",
                 "sources": [],
                 "query": query
             }
 
 
+        version = await asyncio.to_thread(registry.version)
+        cached = await answer_cache.get(query, store_name, version)
+        if cached is not None:
+            print(f"[FileSearch] Cache hit for query: {query}")
+            metrics.count("answer_cache", result="hit")
+            return {
+                "status": "success",
+                "answer": cached["answer"],
+                "sources": cached["sources"],
+                "query": query,
+                "cached": True
+            }
+
+        metrics.count("answer_cache", result="miss")
         print(f"[FileSearch] Searching in store: {store_name}")
         print(f"[FileSearch] Query: {query}")
 
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=query,
-            config=types.GenerateContentConfig(
-                tools=[types.Tool(
-                    file_search=types.FileSearch(
-                        file_search_store_names=[store_name]
-                    )
-                )]
-            )
-        )
-
-        sources = []
-        if response.candidates and response.candidates[0].grounding_metadata:
-            grounding = response.candidates[0].grounding_metadata
-            sources = [
-                c.retrieved_context.title
-                for c in grounding.grounding_chunks
-                if hasattr(c, 'retrieved_context') and hasattr(c.retrieved_context, 'title')
-            ]
-
-        print(f"[FileSearch] Found {len(sources)} source(s)")
+        async def search():
+            result = await backend.search(query, store_name)
+            await answer_cache.put(query, store_name, version, {"answer": result["answer"], "sources": result["sources"]})
+            return result
 
-        tool_context.state['last_search'] = {
-            "query": query,
-            "found_sources": len(sources),
-            "indexed_files": indexed_files
-        }
+        # Perguntas idênticas simultâneas compartilham a mesma chamada
+        result, shared = await search_flight.do(answer_cache.make_key(query, store_name, version), search)
+        sources = result["sources"]
+
+        print(f"[FileSearch] Found {len(sources)} source(s)" + (" (shared with a concurrent search)" if shared else ""))
 
         return {
             "status": "success",
-            "answer": response.text,
-            "sources": list(set(sources)),  # Remove duplicates
+            "answer": result["answer"],
+            "sources": sources,
             "query": query,
-            "indexed_files": indexed_files
+            "cached": False
+        }
+
+    except AdmissionRejected as e:
+        # Fila saturada (e.g., durante uma indexação em massa): responde na hora em vez de esperar
+        print(f"[FileSearch] Busy: {e}")
+        return {
+            "status": "busy",
+            "message": str(e),
+            "answer": "",
+            "sources": [],
+            "query": query
         }
 
     except Exception as e:
@@ -109,4 +210,37 @@ def search_documents(query: str, tool_context: ToolContext) -> Dict[str, Any]:
         }
 
 
-search_tool = FunctionTool(search_documents)
\ No newline at end of file
+async def search_documents(query: str, tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Responde à pergunta com base nos documentos indexados.
+
+    A resposta traz apenas as fontes que fundamentaram a resposta, nunca a lista de
+    documentos do store, e o estado da sessão recebe um resumo de tamanho fixo.
+    Se o orquestrador já iniciou a busca pela mesma pergunta, aguarda essa busca.
+
+    Args:
+        query: a pergunta do usuário
+        tool_context: o contexto da ferramenta
+
+    Returns:
+        Um dicionario contendo status, answer, sources (documentos usados na resposta) e query
+    """
+    speculation = speculative_searches.take(tool_context.invocation_id, query)
+    if speculation is not None:
+        print(f"[FileSearch] Using speculative search for query: {query}")
+        result = dict(await speculation, query=query)
+    else:
+        result = await run_search(query)
+
+    cached = result.pop("cached", None)
+    if result["status"] == "success":
+        tool_context.state['last_search'] = {
+            "query": query,
+            "found_sources": len(result["sources"]),
+            "cached": cached,
+            "speculative": speculation is not None
+        }
+    return result
+
+
+search_tool = FunctionTool(search_documents)
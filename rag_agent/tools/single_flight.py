@@ -0,0 +1,94 @@
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from rag_agent.tools.metrics import count
+
+
+class FlightAbandoned(Exception):
+    """O chamador que executava a chamada compartilhada desistiu antes do resultado"""
+
+
+class SingleFlight:
+    """
+    Junta chamadas simultâneas com a mesma chave em uma única execução.
+
+    O primeiro chamador executa a chamada; os que chegam enquanto ela está em andamento
+    aguardam o mesmo resultado (ou a mesma exceção) em vez de repetir as chamadas remotas.
+    Nada fica guardado depois que a chamada termina: o cache de resultados é outra camada.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    def in_flight(self, key: str) -> Optional[asyncio.Future]:
+        """A chamada em andamento para a chave no event loop atual, se houver"""
+        future = self._calls.get(key)
+        if future is None or future.done() or future.get_loop() is not asyncio.get_running_loop():
+            return None
+        return future
+
+    async def join(self, key: str) -> Tuple[bool, Any]:
+        """
+        Aguarda a chamada em andamento para a chave.
+
+        Returns:
+            (True, resultado) se havia uma chamada e ela terminou, (False, None) caso contrário
+        """
+        future = self.in_flight(key)
+        if future is None:
+            return False, None
+        try:
+            # shield: cancelar um dos que aguardam não cancela a chamada dos demais
+            result = await asyncio.shield(future)
+        except FlightAbandoned:
+            count("single_flight", group=self.name, result="abandoned")
+            return False, None
+        count("single_flight", group=self.name, result="shared")
+        return True, result
+
+    @contextmanager
+    def lead(self, key: str):
+        """
+        Registra o chamador atual como o responsável pela chave; o resultado é entregue com
+        `future.set_result`. Se o bloco terminar sem resultado, os que aguardam são liberados.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        count("single_flight", group=self.name, result="leader")
+        try:
+            yield future
+        except BaseException as e:
+            if not future.done():
+                if isinstance(e, Exception):
+                    future.set_exception(e)
+                else:
+                    future.set_exception(FlightAbandoned())
+            raise
+        finally:
+            if not future.done():
+                future.set_exception(FlightAbandoned())
+            # Marca a exceção como consultada, já que pode não haver ninguém aguardando
+            future.exception()
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Executa `fn` uma única vez por chave entre chamadas simultâneas.
+
+        Returns:
+            (resultado, compartilhado), onde compartilhado indica que o resultado veio de outro chamador
+        """
+        joined, result = await self.join(key)
+        if joined:
+            return result, True
+        with self.lead(key) as future:
+            result = await fn()
+            future.set_result(result)
+        return result, False
+
+
+search_flight = SingleFlight("search")
+index_flight = SingleFlight("index")
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import re
+import time
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from rag_agent.tools.metrics import count, record
+
+# Inicia a busca pelo texto do usuário enquanto o SearchAgent ainda planeja a chamada da tool.
+# Desativado por padrão: cada busca especulativa desperdiçada é uma chamada paga ao modelo, então
+# a ativação deve ser justificada pelas taxas de acerto e desperdício (`stats()` e métricas)
+SPECULATIVE_SEARCH = os.getenv('SPECULATIVE_SEARCH', 'false').lower() in ('1', 'true', 'yes')
+# Similaridade mínima (Jaccard das palavras) para a consulta da tool aproveitar a busca especulativa
+SPECULATION_MIN_SIMILARITY = float(os.getenv('SPECULATION_MIN_SIMILARITY', '0.8'))
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def query_terms(query: str) -> frozenset:
+    """Palavras da consulta sem acentos, caixa e pontuação"""
+    text = unicodedata.normalize('NFKD', query.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return frozenset(_WORD_RE.findall(text))
+
+
+def similarity(a: str, b: str) -> float:
+    terms_a, terms_b = query_terms(a), query_terms(b)
+    if not terms_a or not terms_b:
+        return 1.0 if terms_a == terms_b else 0.0
+    return len(terms_a & terms_b) / len(terms_a | terms_b)
+
+
+class _Speculation:
+    def __init__(self, query: str, task: asyncio.Task):
+        self.query = query
+        self.task = task
+        self.started = time.perf_counter()
+
+
+class SpeculativeSearches:
+    """
+    Buscas iniciadas antes de o agente pedir, uma por invocação.
+
+    O orquestrador chama `start` assim que a mensagem é roteada para a busca; a tool chama
+    `take` com a consulta que o agente escolheu. Se as consultas forem iguais ou quase
+    iguais, a tool aguarda a busca já em andamento; senão ela é cancelada. O que não foi
+    usado é cancelado em `finish`. Mensagens que não parecem perguntas (`worth_speculating`)
+    não iniciam busca. As taxas de acerto e desperdício ficam em `stats()`.
+    """
+
+    def __init__(self, min_similarity: float = SPECULATION_MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self._pending: Dict[str, _Speculation] = {}
+        self._stats = {"started": 0, "hit": 0, "mismatch": 0, "unused": 0, "skipped": 0}
+
+    def worth_speculating(self, query: str, matched_phrases: bool) -> bool:
+        """
+        Só perguntas sobre o conteúdo justificam a chamada antecipada: mensagens com frases
+        de busca ("o que", "resuma") ou terminadas em "?". Conversa ("obrigado", "oi") fica de
+        fora e o agente decide sozinho se busca.
+        """
+        if matched_phrases or query.rstrip().endswith("?"):
+            return True
+        self._stats["skipped"] += 1
+        count("speculation", result="skipped")
+        return False
+
+    def start(self, key: str, query: str, fn: Callable[[], Awaitable[Any]]):
+        """Inicia `fn` em segundo plano para a invocação `key`"""
+        self.finish(key)
+        self._pending[key] = _Speculation(query, asyncio.get_running_loop().create_task(fn()))
+        self._stats["started"] += 1
+        count("speculation", result="started")
+
+    def take(self, key: str, query: str) -> Optional[asyncio.Task]:
+        """
+        Retorna a busca especulativa da invocação se ela servir para `query`; caso contrário
+        a cancela e retorna None. Cada busca é entregue no máximo uma vez.
+        """
+        speculation = self._pending.pop(key, None)
+        if speculation is None:
+            return None
+        if similarity(speculation.query, query) < self.min_similarity:
+            speculation.task.cancel()
+            self._stats["mismatch"] += 1
+            count("speculation", result="mismatch")
+            return None
+        self._stats["hit"] += 1
+        count("speculation", result="hit")
+        # Quanto a busca já tinha andado quando a tool pediu: o tempo economizado (no máximo a busca inteira)
+        record("speculation_head_start", time.perf_counter() - speculation.started)
+        return speculation.task
+
+    def finish(self, key: str):
+        """Cancela a busca da invocação que não foi pedida pelo agente"""
+        speculation = self._pending.pop(key, None)
+        if speculation is None:
+            return
+        speculation.task.cancel()
+        self._stats["unused"] += 1
+        count("speculation", result="unused")
+
+    def stats(self) -> Dict[str, Any]:
+        """Contagens e as taxas de acerto (buscas aproveitadas) e desperdício (canceladas)"""
+        started = self._stats["started"]
+        wasted = self._stats["mismatch"] + self._stats["unused"]
+        return {
+            **self._stats,
+            "pending": len(self._pending),
+            "hit_rate": round(self._stats["hit"] / started, 3) if started else 0.0,
+            "waste_rate": round(wasted / started, 3) if started else 0.0,
+        }
+
+
+speculative_searches = SpeculativeSearches()
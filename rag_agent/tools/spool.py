@@ -0,0 +1,102 @@
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from rag_agent.tools.metrics import span
+
+# memory: envia direto do buffer em memória; spool: sempre grava em disco;
+# auto: usa o disco apenas para payloads acima de SPOOL_THRESHOLD
+UPLOAD_MODE = os.getenv('UPLOAD_MODE', 'auto')
+SPOOL_DIR = Path(os.getenv('SPOOL_DIR', Path(tempfile.gettempdir()) / "rag_uploads"))
+SPOOL_THRESHOLD = int(os.getenv('SPOOL_THRESHOLD', str(64 * 1024 * 1024)))
+SPOOL_MAX_BYTES = int(os.getenv('SPOOL_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))
+SPOOL_MAX_AGE = float(os.getenv('SPOOL_MAX_AGE', '3600'))
+
+# Serializa a reserva de espaço, para que gravações simultâneas respeitem SPOOL_MAX_BYTES
+_reserve_lock = threading.Lock()
+
+
+def cleanup_spool() -> int:
+    """
+    Remove os arquivos do spool com mais de SPOOL_MAX_AGE segundos, esquecidos por
+    processos interrompidos. Arquivos mais novos podem estar em uso por outro upload
+    e nunca são removidos aqui; o dono apaga o seu ao final do upload.
+
+    Returns:
+        O total de bytes ocupados no spool após a limpeza
+    """
+    if not SPOOL_DIR.exists():
+        return 0
+
+    now = time.time()
+    total = 0
+    for path in SPOOL_DIR.iterdir():
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if now - stat.st_mtime > SPOOL_MAX_AGE:
+            path.unlink(missing_ok=True)
+        else:
+            total += stat.st_size
+    return total
+
+
+def _spool_write(file_data: bytes, filename: str):
+    """
+    Grava o conteúdo em um arquivo próprio do spool (nome único, mesmo entre tarefas e
+    processos) e o retorna aberto, posicionado no início; None se o spool estiver cheio.
+    """
+    with _reserve_lock:
+        if cleanup_spool() + len(file_data) > SPOOL_MAX_BYTES:
+            return None
+        SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+        spool_file = tempfile.NamedTemporaryFile(mode='w+b', dir=SPOOL_DIR, prefix='upload_',
+                                                 suffix=Path(filename).suffix, delete=False)
+        # Já ocupa o tamanho final, então a próxima reserva o contabiliza
+        spool_file.truncate(len(file_data))
+    try:
+        spool_file.write(file_data)
+        spool_file.flush()
+        spool_file.seek(0)
+    except Exception:
+        spool_file.close()
+        Path(spool_file.name).unlink(missing_ok=True)
+        raise
+    return spool_file
+
+
+@asynccontextmanager
+async def upload_source(file_data: bytes, filename: str):
+    """
+    Fornece um objeto de arquivo para o upload e limpa o que foi criado ao final.
+
+    No modo em memória o SDK lê direto do buffer recebido (sem cópia para disco).
+    No spool o conteúdo é gravado uma vez em um arquivo comum em SPOOL_DIR (sem mmap),
+    que o SDK lê em partes e que é removido após o upload; se o spool estiver cheio,
+    o upload volta a usar a memória.
+    """
+    use_spool = UPLOAD_MODE == 'spool' or (UPLOAD_MODE == 'auto' and len(file_data) > SPOOL_THRESHOLD)
+
+    source = None
+    if use_spool:
+        with span("spool_write"):
+            source = await asyncio.to_thread(_spool_write, file_data, filename)
+        if source is None:
+            print(f"[Spool] Spool full, uploading {filename} from memory")
+
+    if source is None:
+        yield io.BytesIO(file_data)
+        return
+
+    try:
+        # O SDK espera um io.IOBase: o arquivo em si, não o wrapper do tempfile
+        yield source.file
+    finally:
+        source.close()
+        Path(source.name).unlink(missing_ok=True)
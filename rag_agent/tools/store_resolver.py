@@ -0,0 +1,115 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from rag_agent.tools import get_client, STORE_NAME
+from rag_agent.tools.admission import admit
+from rag_agent.tools.metrics import span
+from rag_agent.tools.registry import registry
+
+# Nome do store já validado neste processo, por display_name
+_resolved: Dict[str, str] = {}
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def _lookup_or_create(display_name: str) -> str:
+    """Procura o store pelo display_name e cria um novo caso não exista"""
+    async with admit(fail_fast=False):
+        async for store in await get_client().aio.file_search_stores.list():
+            if store.display_name == display_name:
+                print(f"Found existing store at {store.name}")
+                print(f"Total docs: {store.active_documents_count}")
+                return store.name
+
+    print("Store not found. Creating new store...")
+    async with admit(fail_fast=False):
+        file_search_store = await get_client().aio.file_search_stores.create(config={'display_name': display_name})
+    print(f"Store created: {file_search_store.name}")
+    return file_search_store.name
+
+
+async def _is_valid(store_name: str) -> bool:
+    """Confere com um único `get` se o store ainda existe"""
+    try:
+        async with admit(fail_fast=False):
+            await get_client().aio.file_search_stores.get(name=store_name)
+        return True
+    except Exception as e:
+        print(f"[StoreResolver] Store {store_name} failed validation: {e}")
+        return False
+
+
+def _recorded_store(display_name: str):
+    """Retorna (store registrado, store válido para este display_name) sem chamadas remotas"""
+    if display_name == STORE_NAME:
+        # Store principal, registrado nas settings desde antes dos shards
+        recorded = registry.store_name
+        if registry.get_setting('file_search_store_display_name') in (None, display_name):
+            return recorded, recorded
+        return recorded, None
+    recorded = registry.shard_store(display_name)
+    return recorded, recorded
+
+
+def _record_store(display_name: str, store_name: str):
+    """Grava o store resolvido no registro; escritas, então executado fora do event loop"""
+    if not registry.get_setting('created_at'):
+        registry.set_setting('created_at', time.strftime('%Y-%m-%d %H:%M:%S'))
+    if display_name == STORE_NAME:
+        registry.set_setting('file_search_store_name', store_name)
+        registry.set_setting('file_search_store_display_name', display_name)
+    registry.set_shard_store(display_name, store_name)
+
+
+async def resolve_store(display_name: Optional[str] = None) -> str:
+    """
+    Retorna o nome do file search store com o display_name informado (STORE_NAME por padrão,
+    ou o display_name de um shard).
+
+    O resultado fica em cache no processo e no registro. Um nome vindo do registro é
+    validado com um `get`; só quando a validação falha o store é procurado novamente
+    (list) ou criado. Chamadas concorrentes compartilham a mesma resolução.
+    """
+    display_name = display_name or STORE_NAME
+    if display_name in _resolved:
+        return _resolved[display_name]
+
+    lock = _locks.setdefault(display_name, asyncio.Lock())
+    async with lock:
+        if display_name in _resolved:
+            return _resolved[display_name]
+
+        with span("store_resolution"):
+            previous, store_name = _recorded_store(display_name)
+            if store_name and not await _is_valid(store_name):
+                store_name = None
+
+            if not store_name:
+                store_name = await _lookup_or_create(display_name)
+                if previous and previous != store_name:
+                    # Os documentos registrados pertenciam ao store anterior
+                    print(f"[StoreResolver] Store changed from {previous} to {store_name}, clearing its documents")
+                    await asyncio.to_thread(registry.clear_documents, previous)
+                await asyncio.to_thread(_record_store, display_name, store_name)
+
+        _resolved[display_name] = store_name
+        return store_name
+
+
+def resolved_store(display_name: Optional[str] = None) -> Optional[str]:
+    """Nome do store já conhecido (no processo ou no registro), sem chamadas remotas"""
+    display_name = display_name or STORE_NAME
+    return _resolved.get(display_name) or _recorded_store(display_name)[1]
+
+
+def invalidate_store(display_name: Optional[str] = None, store_name: Optional[str] = None):
+    """
+    Descarta o nome em cache no processo, a próxima resolução valida o store novamente.
+    Com `store_name`, descarta o display_name que resolvia para aquele store.
+    """
+    if store_name is not None:
+        for name, resolved in list(_resolved.items()):
+            if resolved == store_name:
+                _resolved.pop(name, None)
+        return
+    _resolved.pop(display_name or STORE_NAME, None)
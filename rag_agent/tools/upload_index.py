@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, Any, Optional
+
+from google.genai import types
+
+from rag_agent.tools.blob_store import blob_store
+from rag_agent.tools.metrics import span
+
+# Algoritmo usado no nome dos documentos. O padrão (md5) mantém os nomes já registrados;
+# novas instalações podem usar blake2b, que é mais rápido em payloads grandes.
+FILENAME_HASH = os.getenv('FILENAME_HASH', 'md5')
+HASH_CHUNK_SIZE = 1024 * 1024
+# Payloads maiores que isso são processados fora do event loop
+HASH_OFFLOAD_THRESHOLD = int(os.getenv('HASH_OFFLOAD_THRESHOLD', str(256 * 1024)))
+
+# Sessões anteriores guardavam o índice inteiro nesta chave; hoje cada entrada tem a sua própria
+# chave (UPLOAD_INDEX_PREFIX + entry_key), então a escrita de um upload novo não cresce com o índice
+UPLOAD_INDEX_KEY = 'upload_index'
+UPLOAD_INDEX_PREFIX = UPLOAD_INDEX_KEY + ':'
+# Texto que substitui um `inline_data` movido para o armazenamento de blobs
+UPLOAD_REF_PREFIX = '[upload-ref] '
+
+EXT_MAP = {
+    'application/pdf': 'pdf',
+    'application/msword': 'doc',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 'docx',
+    'text/plain': 'txt',
+    'text/markdown': 'md',
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+}
+
+
+def content_digest(file_data: bytes, algorithm: str = FILENAME_HASH) -> str:
+    """Calcula o hash do conteúdo em blocos, sem copiar o buffer"""
+    if algorithm == 'blake2b':
+        hasher = hashlib.blake2b(digest_size=16)
+    else:
+        hasher = hashlib.new(algorithm)
+
+    with span("hashing"):
+        view = memoryview(file_data)
+        for offset in range(0, len(view), HASH_CHUNK_SIZE):
+            hasher.update(view[offset:offset + HASH_CHUNK_SIZE])
+        return hasher.hexdigest()
+
+
+def extension_for_mime(mime_type: str) -> str:
+    if '/' in mime_type:
+        mime_ext = mime_type.split('/')[-1]
+        if mime_ext in ['pdf', 'png', 'jpg', 'jpeg', 'txt', 'md']:
+            return mime_ext
+        return EXT_MAP.get(mime_type, mime_ext)
+    return EXT_MAP.get(mime_type, 'bin')
+
+
+def filename_from_digest(digest: str, mime_type: str) -> str:
+    """Monta o nome "doc_<12 primeiros caracteres do hash>.<ext>" """
+    return f"doc_{digest[:12]}.{extension_for_mime(mime_type)}"
+
+
+async def digest_async(file_data: bytes) -> str:
+    if len(file_data) > HASH_OFFLOAD_THRESHOLD:
+        return await asyncio.to_thread(content_digest, file_data)
+    return content_digest(file_data)
+
+
+def entry_key(event_id: str, part_index: int) -> str:
+    return f"{event_id}:{part_index}"
+
+
+async def build_event_entries(event) -> Dict[str, Dict[str, Any]]:
+    """
+    Calcula as entradas do índice de uploads para os `inline_data` de um evento.
+
+    Cada entrada guarda apenas metadados (nome gerado, hash, mime, tamanho) e a posição
+    do payload no histórico, para que as tools não precisem recalcular o hash a cada turno.
+    """
+    entries = {}
+    if not (event.content and event.content.parts):
+        return entries
+
+    for idx, part in enumerate(event.content.parts):
+        reference = parse_reference(part)
+        if reference:
+            # Payload já movido para o armazenamento de blobs, o hash está na referência
+            entries[entry_key(event.id, idx)] = {**reference, "event_id": event.id, "part_index": idx}
+            continue
+        if not part.inline_data or part.inline_data.data is None:
+            continue
+        file_data = part.inline_data.data
+        mime_type = part.inline_data.mime_type
+        digest = await digest_async(file_data)
+        entries[entry_key(event.id, idx)] = {
+            "filename": filename_from_digest(digest, mime_type),
+            "digest": digest,
+            "mime_type": mime_type,
+            "size": len(file_data),
+            "event_id": event.id,
+            "part_index": idx,
+            "display_name": getattr(part.inline_data, 'display_name', None),
+        }
+    return entries
+
+
+def get_upload_index(state) -> Dict[str, Dict[str, Any]]:
+    """Todas as entradas do índice, por `entry_key`"""
+    index = dict(state.get(UPLOAD_INDEX_KEY) or {})
+    for key in state:
+        if key.startswith(UPLOAD_INDEX_PREFIX):
+            index[key[len(UPLOAD_INDEX_PREFIX):]] = state[key]
+    return index
+
+
+def upload_index_delta(entries: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """O `state_delta` que grava apenas as entradas informadas, cada uma na sua chave"""
+    return {UPLOAD_INDEX_PREFIX + key: entry for key, entry in entries.items()}
+
+
+def reference_part(entry: Dict[str, Any], tier: str) -> types.Part:
+    """Parte de texto leve que substitui o payload no evento, com os metadados da entrada"""
+    reference = {
+        "filename": entry["filename"],
+        "digest": entry["digest"],
+        "mime_type": entry["mime_type"],
+        "size": entry["size"],
+        "display_name": entry.get("display_name"),
+        "tier": tier,
+    }
+    return types.Part(text=UPLOAD_REF_PREFIX + json.dumps(reference))
+
+
+def parse_reference(part) -> Optional[Dict[str, Any]]:
+    if not (part.text and part.text.startswith(UPLOAD_REF_PREFIX)):
+        return None
+    try:
+        return json.loads(part.text[len(UPLOAD_REF_PREFIX):])
+    except ValueError:
+        return None
+
+
+def is_upload_part(part) -> bool:
+    """Upload inline ou referência a um upload já movido para o armazenamento de blobs"""
+    return bool(part.inline_data) or parse_reference(part) is not None
+
+
+async def load_upload(entry: Dict[str, Any], session, load_artifact=None) -> Optional[types.Blob]:
+    """
+    Carrega o conteúdo de uma entrada do índice apenas quando necessário.
+
+    Uploads inline são lidos do histórico; referências são lidas do armazenamento
+    de blobs local ou do serviço de artefatos (`load_artifact`, e.g. do ToolContext).
+    """
+    tier = entry.get("tier")
+    if tier == "local":
+        data = await asyncio.to_thread(blob_store.get, entry["digest"])
+        return types.Blob(data=data, mime_type=entry["mime_type"]) if data is not None else None
+    if tier == "artifact":
+        if load_artifact is None:
+            return None
+        part = await load_artifact(entry["filename"])
+        return part.inline_data if part and part.inline_data else None
+    return find_inline_data(session, entry) if session else None
+
+
+def find_inline_data(session, entry: Dict[str, Any]):
+    """Localiza o `inline_data` referenciado por uma entrada do índice"""
+    for event in reversed(session.events):
+        if event.id == entry["event_id"]:
+            parts = event.content.parts if event.content else None
+            if parts and entry["part_index"] < len(parts):
+                return parts[entry["part_index"]].inline_data
+            return None
+    return None
+
+
+def find_entry(state, filename: str) -> Optional[Dict[str, Any]]:
+    for entry in get_upload_index(state).values():
+        if entry["filename"] == filename:
+            return entry
+    return None
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types
+
+from rag_agent.tools.blob_store import blob_store
+from rag_agent.tools.metrics import count, span
+from rag_agent.tools.registry import registry
+from rag_agent.tools.upload_index import digest_async, filename_from_digest, reference_part
+
+# local: armazenamento local endereçado por hash (BLOB_DIR); artifact: serviço de artefatos do ADK;
+# off: mantém os bytes no evento da sessão
+UPLOAD_BLOB_TIER = os.getenv('UPLOAD_BLOB_TIER', 'local')
+# Uploads da sessão sem uso (gravação ou leitura) há mais que isso são apagados de BLOB_DIR;
+# 0 desativa a limpeza
+UPLOAD_BLOB_TTL = float(os.getenv('UPLOAD_BLOB_TTL', str(7 * 24 * 3600)))
+# Intervalo mínimo entre duas varreduras de BLOB_DIR
+UPLOAD_BLOB_SWEEP_INTERVAL = float(os.getenv('UPLOAD_BLOB_SWEEP_INTERVAL', '3600'))
+
+_last_sweep = 0.0
+_sweep_task: Optional[asyncio.Task] = None
+
+ArtifactSaver = Callable[[str, types.Part], Awaitable[None]]
+
+
+def artifact_saver(invocation_context) -> Optional[ArtifactSaver]:
+    """Grava no serviço de artefatos da invocação, uma versão por conteúdo"""
+    service = getattr(invocation_context, 'artifact_service', None)
+    if service is None:
+        return None
+    scope = {
+        "app_name": invocation_context.app_name,
+        "user_id": invocation_context.user_id,
+        "session_id": invocation_context.session.id,
+    }
+
+    async def save(filename: str, part: types.Part):
+        # O nome já é derivado do hash, então uma versão existente tem o mesmo conteúdo
+        if await service.list_versions(filename=filename, **scope):
+            return
+        await service.save_artifact(filename=filename, artifact=part, **scope)
+
+    return save
+
+
+async def spill_inline_parts(content: types.Content, save_artifact: Optional[ArtifactSaver] = None) -> int:
+    """
+    Move os `inline_data` de uma mensagem para o armazenamento de blobs e troca cada
+    parte por uma referência (ver `upload_index.reference_part`), alterando `content`.
+
+    Returns:
+        Quantidade de partes movidas
+    """
+    if UPLOAD_BLOB_TIER == 'off' or not (content and content.parts):
+        return 0
+
+    spilled = 0
+    for idx, part in enumerate(content.parts):
+        if not part.inline_data or part.inline_data.data is None:
+            continue
+        file_data = part.inline_data.data
+        mime_type = part.inline_data.mime_type
+        digest = await digest_async(file_data)
+        entry = {
+            "filename": filename_from_digest(digest, mime_type),
+            "digest": digest,
+            "mime_type": mime_type,
+            "size": len(file_data),
+            "display_name": getattr(part.inline_data, 'display_name', None),
+        }
+
+        with span("blob_spill"):
+            if UPLOAD_BLOB_TIER == 'artifact' and save_artifact is not None:
+                await save_artifact(entry["filename"], types.Part(inline_data=part.inline_data))
+                tier = "artifact"
+            else:
+                await asyncio.to_thread(blob_store.put, digest, file_data)
+                tier = "local"
+
+        content.parts[idx] = reference_part(entry, tier)
+        if tier == "local":
+            schedule_sweep()
+        spilled += 1
+        print(f"[UploadSpill] Moved {entry['filename']} ({entry['size']} bytes) to {tier} blob storage")
+    return spilled
+
+
+def _sweep_blobs() -> int:
+    # Blobs de jobs ainda em andamento são mantidos, mesmo que antigos
+    removed = blob_store.sweep(UPLOAD_BLOB_TTL, keep=registry.digest_in_use)
+    if removed:
+        print(f"[UploadSpill] Removed {removed} upload(s) unused for more than {UPLOAD_BLOB_TTL:.0f}s")
+    count("blob_sweep", result="removed" if removed else "empty")
+    return removed
+
+
+def schedule_sweep():
+    """
+    Apaga em segundo plano os uploads abandonados (ver UPLOAD_BLOB_TTL), no máximo uma vez
+    a cada UPLOAD_BLOB_SWEEP_INTERVAL. Sem isso, os uploads de sessões encerradas ficariam
+    em BLOB_DIR para sempre: só os blobs gravados pelos jobs são apagados após a indexação.
+    """
+    global _last_sweep, _sweep_task
+    now = time.monotonic()
+    if UPLOAD_BLOB_TTL <= 0 or (_last_sweep and now - _last_sweep < UPLOAD_BLOB_SWEEP_INTERVAL):
+        return
+    if _sweep_task is not None and not _sweep_task.done():
+        return
+    _last_sweep = now
+    _sweep_task = asyncio.ensure_future(asyncio.to_thread(_sweep_blobs))
+
+
+class UploadSpillPlugin(BasePlugin):
+    """
+    Move os uploads para o armazenamento de blobs antes da mensagem do usuário ser gravada
+    na sessão, então o histórico (e o banco, em serviços de sessão persistentes) guarda
+    apenas a referência com os metadados.
+    """
+
+    def __init__(self, name: str = "upload_spill"):
+        super().__init__(name=name)
+
+    async def on_user_message_callback(self, *, invocation_context, user_message: types.Content):
+        if UPLOAD_BLOB_TIER == 'off' or not user_message or not user_message.parts:
+            return None
+        if not any(part.inline_data for part in user_message.parts):
+            return None
+        # Nova lista de partes, sem copiar os bytes da mensagem original
+        content = types.Content(role=user_message.role, parts=list(user_message.parts))
+        await spill_inline_parts(content, artifact_saver(invocation_context))
+        return content